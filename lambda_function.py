@@ -1,6 +1,46 @@
-from src.rh_portfolio_to_sheets import export_rh_portfolio_to_sheets
+from src.constants.aws import (
+    LAMBDA_EVENT_ACCOUNTS,
+    LAMBDA_EVENT_ARCHIVE_SNAPSHOTS,
+    LAMBDA_EVENT_CACHE_FOR_PRICES_ONLY,
+    LAMBDA_EVENT_DIVERSITY_SCOPE,
+    LAMBDA_EVENT_INCREMENTAL,
+    LAMBDA_EVENT_MAX_CONCURRENT_ACCOUNTS,
+    LAMBDA_EVENT_PRICES_ONLY,
+    LAMBDA_EVENT_SINKS,
+)
+from src.constants.pipeline import DEFAULT_MAX_CONCURRENT_ACCOUNTS, DiversityScope
+from src.constants.sinks import DEFAULT_OUTPUT_SINKS
 
 
 def lambda_handler(event, context):
     print("Running lambda function")
-    export_rh_portfolio_to_sheets(is_live=True, write_mock=False)
+    # Deferred, so loading the handler module doesn't import pandas and the API clients
+    from src.external_services.robinhood import load_accounts
+    from src.rh_portfolio_to_sheets import export_accounts_to_sheets, export_rh_portfolio_to_sheets
+
+    event = event or {}
+    export_options = dict(
+        incremental=event.get(LAMBDA_EVENT_INCREMENTAL, False),
+        diversity_scope=DiversityScope(
+            event.get(LAMBDA_EVENT_DIVERSITY_SCOPE, DiversityScope.TAB.value)
+        ),
+        # Off by default: Lambda's local storage doesn't outlive the execution environment
+        archive_snapshots=event.get(LAMBDA_EVENT_ARCHIVE_SNAPSHOTS, False),
+        sinks=event.get(LAMBDA_EVENT_SINKS, DEFAULT_OUTPUT_SINKS),
+        # Prices-only exports read the portfolio cached by an earlier full export with cache_for_prices_only.
+        # The default local storage is the execution environment's /tmp, which is lost on a cold start and
+        # isn't shared between concurrent environments, so RH_LOCAL_STORAGE_DIR must point to persistent
+        # storage, e.g. an EFS mount, for both the caching and the prices-only invocations.
+        prices_only=event.get(LAMBDA_EVENT_PRICES_ONLY, False),
+        cache_for_prices_only=event.get(LAMBDA_EVENT_CACHE_FOR_PRICES_ONLY, False),
+    )
+    if event.get(LAMBDA_EVENT_ACCOUNTS):
+        export_accounts_to_sheets(
+            load_accounts(event[LAMBDA_EVENT_ACCOUNTS]),
+            max_concurrent_accounts=event.get(
+                LAMBDA_EVENT_MAX_CONCURRENT_ACCOUNTS, DEFAULT_MAX_CONCURRENT_ACCOUNTS
+            ),
+            **export_options,
+        )
+    else:
+        export_rh_portfolio_to_sheets(is_live=True, write_mock=False, **export_options)
@@ -1,5 +1,16 @@
 import argparse
-from src.rh_portfolio_to_sheets import export_rh_portfolio_to_sheets
+import json
+import os
+import tempfile
+from src.constants.cassette import DEFAULT_CASSETTE_PATH, CassetteMode
+from src.constants.pipeline import (
+    DEFAULT_MAX_CONCURRENT_ACCOUNTS,
+    DEFAULT_MAX_STAGE_WORKERS,
+    DiversityScope,
+)
+from src.constants.sinks import DEFAULT_OUTPUT_SINKS, OutputSinkType
+from src.constants.storage import LOCAL_STORAGE_DIR_ENV_VAR
+from src.external_services.cassette import use_cassette
 
 def scratchpad():
     print("Executing scratchpad code.")
@@ -29,9 +40,126 @@ if __name__ == "__main__":
         action="store_true",
         default=False,
     )
+    parser.add_argument(
+        "--max-workers",
+        help="Maximum number of pipeline stages to run concurrently",
+        type=int,
+        default=DEFAULT_MAX_STAGE_WORKERS,
+    )
+    parser.add_argument(
+        "-i",
+        "--incremental",
+        help="Only write cells that changed since the last run",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--diversity-scope",
+        help="Compute diversity relative to each tab or to the whole portfolio",
+        choices=[scope.value for scope in DiversityScope],
+        default=DiversityScope.TAB.value,
+    )
+    parser.add_argument(
+        "--no-archive",
+        help="Don't append the exported portfolios to the local snapshot archive",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--prices-only",
+        help="Only refresh the prices of the holdings cached by the last full export, "
+        "writing just the columns that depend on them",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--cache-for-prices-only",
+        help="Cache the exported portfolio in the local storage directory for later --prices-only runs",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--sinks",
+        help="Where to write the portfolios. Several sinks are written concurrently. "
+        "File sinks write to the local storage directory.",
+        nargs="+",
+        choices=[sink.value for sink in OutputSinkType],
+        default=[sink.value for sink in DEFAULT_OUTPUT_SINKS],
+    )
+    parser.add_argument(
+        "--accounts",
+        help="Export every account in a JSON file listing each account's name, email, password, "
+        "otp_key and spreadsheet_name",
+        metavar="ACCOUNTS_FILE",
+    )
+    parser.add_argument(
+        "--max-concurrent-accounts",
+        help="Maximum number of accounts to export concurrently",
+        type=int,
+        default=DEFAULT_MAX_CONCURRENT_ACCOUNTS,
+    )
+    cassette_group = parser.add_mutually_exclusive_group()
+    cassette_group.add_argument(
+        "--record",
+        help="Record every Robinhood and Google Sheets call to a cassette file",
+        nargs="?",
+        const=DEFAULT_CASSETTE_PATH,
+        metavar="CASSETTE",
+    )
+    cassette_group.add_argument(
+        "--replay",
+        help="Serve every Robinhood and Google Sheets call from a recorded cassette, without network access",
+        nargs="?",
+        const=DEFAULT_CASSETTE_PATH,
+        metavar="CASSETTE",
+    )
     args = parser.parse_args()
 
-    if not args.scratchpad:
-        export_rh_portfolio_to_sheets(args.live, args.write_mock)
-    else:
+    # Imported once the arguments are parsed, so --help and invalid arguments don't wait for pandas
+    from src.external_services.robinhood import load_accounts
+    from src.rh_portfolio_to_sheets import export_accounts_to_sheets, export_rh_portfolio_to_sheets
+
+    if args.scratchpad:
         scratchpad()
+    elif args.accounts:
+        with open(args.accounts) as accounts_file:
+            accounts = load_accounts(json.load(accounts_file))
+        export_accounts_to_sheets(
+            accounts,
+            max_concurrent_accounts=args.max_concurrent_accounts,
+            max_workers=args.max_workers,
+            incremental=args.incremental,
+            diversity_scope=DiversityScope(args.diversity_scope),
+            archive_snapshots=not args.no_archive,
+            sinks=args.sinks,
+            prices_only=args.prices_only,
+            cache_for_prices_only=args.cache_for_prices_only,
+        )
+    elif args.record or args.replay:
+        # Start from empty local caches so the recorded and replayed runs make the same calls
+        os.environ[LOCAL_STORAGE_DIR_ENV_VAR] = tempfile.mkdtemp(prefix="rh_cassette_")
+        cassette_mode = CassetteMode.RECORD if args.record else CassetteMode.REPLAY
+        with use_cassette(args.record or args.replay, cassette_mode):
+            export_rh_portfolio_to_sheets(
+                True,
+                False,
+                max_workers=args.max_workers,
+                incremental=args.incremental,
+                diversity_scope=DiversityScope(args.diversity_scope),
+                archive_snapshots=not args.no_archive,
+                sinks=args.sinks,
+                prices_only=args.prices_only,
+                cache_for_prices_only=args.cache_for_prices_only,
+            )
+    else:
+        export_rh_portfolio_to_sheets(
+            args.live,
+            args.write_mock,
+            max_workers=args.max_workers,
+            incremental=args.incremental,
+            diversity_scope=DiversityScope(args.diversity_scope),
+            archive_snapshots=not args.no_archive,
+            sinks=args.sinks,
+            prices_only=args.prices_only,
+            cache_for_prices_only=args.cache_for_prices_only,
+        )
@@ -1,9 +1,25 @@
 
-import boto3
 import base64
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 
-from src.constants.aws import KMS, KMS_PLAINTEXT, US_WEST_REGION
+from src.constants.aws import (
+    CREDENTIALS_TTL_ENV_VAR,
+    DEFAULT_CREDENTIALS_TTL_SECONDS,
+    ENCRYPTED_VALUE_MIN_LENGTH,
+    KMS,
+    KMS_PLAINTEXT,
+    MAX_CONCURRENT_DECRYPTIONS,
+    US_WEST_REGION,
+)
 from src.constants.common import UTF_8
+from src.lazy_import import LazyModule
+
+boto3 = LazyModule("boto3")
 
 
 def is_base64(s: str):
@@ -16,10 +32,120 @@ def is_base64(s: str):
         return False
 
 
+def is_encrypted(value: str) -> bool:
+    """Check if a secret looks like a base64-encoded KMS ciphertext rather than plain text."""
+    return is_base64(value) and len(value) > ENCRYPTED_VALUE_MIN_LENGTH
+
+
+class DecryptionBackend(ABC):
+    @abstractmethod
+    def decrypt(self, encrypted_value: str) -> str:
+        pass
+
+
+class KmsDecryptionBackend(DecryptionBackend):
+    """
+    Decrypts base64-encoded KMS ciphertexts. The boto3 client is built once and shared between threads.
+    """
+
+    def __init__(self, region_name: str = US_WEST_REGION):
+        self.region_name = region_name
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                self._client = boto3.client(KMS, region_name=self.region_name)
+            return self._client
+
+    def decrypt(self, encrypted_value: str) -> str:
+        return self.client.decrypt(CiphertextBlob=base64.b64decode(encrypted_value))[
+            KMS_PLAINTEXT
+        ].decode(UTF_8)
+
+
+class LocalDecryptionBackend(DecryptionBackend):
+    """
+    Stand-in backend for tests and local runs: looks ciphertexts up in a dictionary and
+    otherwise treats them as base64-encoded plain text.
+    """
+
+    def __init__(self, plaintexts: Optional[Dict[str, str]] = None):
+        self.plaintexts = plaintexts or {}
+        self.decrypt_calls = 0
+
+    def decrypt(self, encrypted_value: str) -> str:
+        self.decrypt_calls += 1
+        if encrypted_value in self.plaintexts:
+            return self.plaintexts[encrypted_value]
+        return base64.b64decode(encrypted_value).decode(UTF_8)
+
+
+class CredentialsProvider:
+    """
+    Decrypts secrets concurrently and keeps the plaintext in process memory for a TTL,
+    so warm Lambda invocations skip KMS entirely.
+    """
+
+    def __init__(
+        self,
+        backend: Optional[DecryptionBackend] = None,
+        ttl_seconds: Optional[float] = None,
+    ):
+        self.backend = backend or KmsDecryptionBackend()
+        if ttl_seconds is None:
+            ttl_seconds = float(
+                os.getenv(CREDENTIALS_TTL_ENV_VAR, DEFAULT_CREDENTIALS_TTL_SECONDS)
+            )
+        self.ttl_seconds = ttl_seconds
+        self._cache: Dict[str, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def _get_cached(self, encrypted_value: str) -> Optional[str]:
+        with self._lock:
+            cached = self._cache.get(encrypted_value)
+        if cached and time.monotonic() < cached[1]:
+            return cached[0]
+        return None
+
+    def resolve(self, secret_values: List[str]) -> List[str]:
+        """
+        Resolve a list of secrets to plain text, preserving order.
+        Plain text values are returned as they are; encrypted ones are decrypted in parallel unless cached.
+        """
+        resolved: List[Optional[str]] = []
+        to_decrypt = {}
+        for index, secret_value in enumerate(secret_values):
+            if not is_encrypted(secret_value):
+                resolved.append(secret_value)
+                continue
+            cached = self._get_cached(secret_value)
+            resolved.append(cached)
+            if cached is None:
+                to_decrypt.setdefault(secret_value, []).append(index)
+
+        if to_decrypt:
+            print(f"Decrypting {len(to_decrypt)} encrypted value(s)")
+            with ThreadPoolExecutor(
+                max_workers=min(len(to_decrypt), MAX_CONCURRENT_DECRYPTIONS)
+            ) as executor:
+                plaintexts = dict(
+                    zip(to_decrypt, executor.map(self.backend.decrypt, to_decrypt))
+                )
+            expires_at = time.monotonic() + self.ttl_seconds
+            with self._lock:
+                for encrypted_value, plaintext in plaintexts.items():
+                    self._cache[encrypted_value] = (plaintext, expires_at)
+            for encrypted_value, indexes in to_decrypt.items():
+                for index in indexes:
+                    resolved[index] = plaintexts[encrypted_value]
+            print("Decryption successful")
+
+        return resolved
+
+
 def decrypt_kms_value(encrypted_value):
     """Decrypt a base64-encoded KMS-encrypted value using AWS KMS."""
-    kms_client = boto3.client(KMS, region_name=US_WEST_REGION)
-    decrypted_value = kms_client.decrypt(
-        CiphertextBlob=base64.b64decode(encrypted_value)
-    )[KMS_PLAINTEXT].decode(UTF_8)
-    return decrypted_value
+    return KmsDecryptionBackend().decrypt(encrypted_value)
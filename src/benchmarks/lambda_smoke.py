@@ -0,0 +1,122 @@
+"""
+Lambda smoke run: replays a synthetic portfolio through lambda_handler in a fresh interpreter set up like the
+Lambda runtime, i.e. with AWS_LAMBDA_FUNCTION_NAME set, RH_LOCAL_STORAGE_DIR unset and the code root as the
+working directory. Fails when the run writes under the code root, which is read-only on Lambda, or when a local
+store opens outside the temporary directory. Run it from a read-only checkout to reproduce Lambda's filesystem exactly.
+
+Usage: python -m src.benchmarks.lambda_smoke [--positions N] [--dividends N] [--event JSON]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from typing import Any, Dict, Set, Tuple
+
+from src.benchmarks.startup_benchmark import REPO_ROOT
+from src.benchmarks.synthetic_portfolio import build_synthetic_cassette
+from src.constants.aws import LAMBDA_FUNCTION_NAME_ENV_VAR
+from src.constants.benchmarks import (
+    LAMBDA_SMOKE_DIVIDENDS,
+    LAMBDA_SMOKE_FUNCTION_NAME,
+    LAMBDA_SMOKE_POSITIONS,
+)
+from src.constants.storage import LOCAL_STORAGE_DIR_ENV_VAR
+
+LAMBDA_RUN_SCRIPT = """
+import json, sys
+from src.constants.cassette import CassetteMode
+from src.external_services.cassette import use_cassette
+from src.local_storage.dividend_store import DividendStore
+from src.local_storage.fundamentals_cache import FundamentalsCache
+from src.local_storage.instrument_index import InstrumentIndex
+from src.local_storage.session_store import LocalFileSessionStore
+from src.local_storage.storage_paths import get_storage_root
+import lambda_function
+
+with use_cassette({cassette_path!r}, CassetteMode.REPLAY):
+    lambda_function.lambda_handler(json.loads({event!r}), None)
+stores = {{
+    "dividend_store": DividendStore().path,
+    "fundamentals_cache": FundamentalsCache().path,
+    "instrument_index": InstrumentIndex().path,
+    "session_store": LocalFileSessionStore().directory,
+}}
+print(json.dumps({{"storage_root": get_storage_root(), "stores": stores}}))
+"""
+
+
+def list_files(root: str) -> Set[Tuple[str, float]]:
+    """
+    Every file under a directory with its modification time, so files written by a run can be told apart.
+    """
+    return {
+        (os.path.join(directory, file_name), os.path.getmtime(os.path.join(directory, file_name)))
+        for directory, _, files in os.walk(root)
+        for file_name in files
+    }
+
+
+def run_lambda_smoke(positions: int, dividends: int, event: Dict[str, Any], seed: int = 0) -> Dict[str, Any]:
+    """
+    Run the handler once on a synthetic portfolio the way Lambda would.
+    :return: Dictionary with the storage root, the path of each local store, the files written under the
+             code root and whether the run passed
+    """
+    with tempfile.TemporaryDirectory(prefix="rh_lambda_smoke_") as directory:
+        cassette_path = os.path.join(directory, "synthetic_portfolio.json.gz")
+        build_synthetic_cassette(cassette_path, positions, dividends, seed).save()
+        temp_dir = os.path.join(directory, "tmp")
+        os.makedirs(temp_dir)
+        env = {name: value for name, value in os.environ.items() if name != LOCAL_STORAGE_DIR_ENV_VAR}
+        env.update({LAMBDA_FUNCTION_NAME_ENV_VAR: LAMBDA_SMOKE_FUNCTION_NAME, "TMPDIR": temp_dir})
+
+        files_before = list_files(REPO_ROOT)
+        result = subprocess.run(
+            [
+                sys.executable,
+                "-B",
+                "-W",
+                "ignore",
+                "-c",
+                LAMBDA_RUN_SCRIPT.format(cassette_path=cassette_path, event=json.dumps(event)),
+            ],
+            cwd=REPO_ROOT,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        written = sorted(path for path, _ in list_files(REPO_ROOT) - files_before)
+        if result.returncode != 0:
+            print(result.stdout[-2000:], result.stderr[-4000:], sep="\n")
+            return {"written": written, "passed": False}
+
+        smoke = json.loads(result.stdout.strip().splitlines()[-1])
+        smoke["written"] = written
+        smoke["passed"] = (
+            not written
+            and os.path.realpath(smoke["storage_root"]).startswith(os.path.realpath(temp_dir))
+            and all(path.startswith(smoke["storage_root"]) for path in smoke["stores"].values())
+        )
+        return smoke
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--positions", type=int, default=LAMBDA_SMOKE_POSITIONS)
+    parser.add_argument("--dividends", type=int, default=LAMBDA_SMOKE_DIVIDENDS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--event", help="Lambda event as JSON", default="{}")
+    args = parser.parse_args()
+
+    smoke = run_lambda_smoke(args.positions, args.dividends, json.loads(args.event), args.seed)
+    if "storage_root" in smoke:
+        print(f"Local storage root: {smoke['storage_root']}")
+        for store, path in smoke["stores"].items():
+            print(f"{store:20} {path}")
+    for path in smoke["written"]:
+        print(f"Written under the code root: {path}")
+    print("OK" if smoke["passed"] else "FAIL")
+    sys.exit(0 if smoke["passed"] else 1)
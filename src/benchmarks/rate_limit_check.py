@@ -0,0 +1,195 @@
+"""
+Rate limiter check: sends requests through the RateLimitedAdapter to a local fake API that answers with
+scripted 429 (with Retry-After) and 503 responses, and checks that idempotent requests back off and retry,
+that POSTs aren't retried after a server error, and that a throttled response lowers the adaptive rate.
+
+Usage: python -m src.benchmarks.rate_limit_check
+"""
+
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+import requests
+
+from src.constants.benchmarks import (
+    RATE_LIMIT_CHECK_BASE_BACKOFF_SECONDS,
+    RATE_LIMIT_CHECK_MAX_RETRIES,
+    RATE_LIMIT_CHECK_RETRY_AFTER_SECONDS,
+)
+from src.constants.rate_limit import RETRY_AFTER_HEADER, THROTTLED_STATUS_CODE, RateLimitSettings
+from src.external_services.rate_limiter import AdaptiveRateLimiter, install_rate_limiting
+
+SERVICE_UNAVAILABLE_STATUS_CODE = 503
+OK_STATUS_CODE = 200
+
+# A scripted response: status code and headers
+FakeResponse = Tuple[int, Dict[str, str]]
+
+
+class FakeApiServer(ThreadingHTTPServer):
+    """
+    Local HTTP server answering each path with its scripted responses in order, then with 200 once they run out.
+    Records the method, path and arrival time of every request.
+    """
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FakeApiHandler)
+        self.scripts: Dict[str, List[FakeResponse]] = {}
+        self.received: List[Tuple[str, str, float]] = []
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/"
+
+    def next_response(self, method: str, path: str) -> FakeResponse:
+        with self.lock:
+            self.received.append((method, path, time.monotonic()))
+            script = self.scripts.get(path)
+            return script.pop(0) if script else (OK_STATUS_CODE, {})
+
+
+class FakeApiHandler(BaseHTTPRequestHandler):
+    server: FakeApiServer
+
+    def respond(self) -> None:
+        content_length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(content_length)
+        status, headers = self.server.next_response(self.command, self.path)
+        body = b"{}"
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = respond
+    do_POST = respond
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+@contextmanager
+def run_fake_api() -> Iterator[FakeApiServer]:
+    server = FakeApiServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def create_rate_limited_session(url: str) -> Tuple["requests.Session", AdaptiveRateLimiter]:
+    """
+    Session sending every request to the fake API through its own rate limiter with short backoffs.
+    """
+    rate_limiter = AdaptiveRateLimiter(
+        RateLimitSettings(
+            base_backoff=RATE_LIMIT_CHECK_BASE_BACKOFF_SECONDS,
+            max_retries=RATE_LIMIT_CHECK_MAX_RETRIES,
+        )
+    )
+    session = requests.Session()
+    # Requests to the local server must not go through a proxy from the environment
+    session.trust_env = False
+    install_rate_limiting(session, url, rate_limiter)
+    return session, rate_limiter
+
+
+def check_get_retries_with_backoff(server: FakeApiServer) -> Dict[str, Any]:
+    """
+    A GET answered with 429 and then 503 is retried until it succeeds, waiting at least the Retry-After.
+    """
+    retry_after = RATE_LIMIT_CHECK_RETRY_AFTER_SECONDS
+    server.scripts["/quotes/"] = [
+        (THROTTLED_STATUS_CODE, {RETRY_AFTER_HEADER: str(retry_after)}),
+        (SERVICE_UNAVAILABLE_STATUS_CODE, {}),
+    ]
+    session, _ = create_rate_limited_session(server.url)
+    response = session.get(server.url + "quotes/")
+    arrivals = [arrived_at for _, path, arrived_at in server.received if path == "/quotes/"]
+    waited = arrivals[1] - arrivals[0] if len(arrivals) > 1 else 0.0
+    return {
+        "status": response.status_code,
+        "requests": len(arrivals),
+        "waited_after_429": round(waited, 3),
+        "passed": response.status_code == OK_STATUS_CODE and len(arrivals) == 3 and waited >= retry_after,
+    }
+
+
+def check_post_not_retried_after_server_error(server: FakeApiServer) -> Dict[str, Any]:
+    """
+    A POST answered with 503 may have been processed, so the 503 is returned without sending it again.
+    A throttled POST was rejected unprocessed, so it is still retried.
+    """
+    server.scripts["/orders/"] = [(SERVICE_UNAVAILABLE_STATUS_CODE, {})]
+    server.scripts["/throttled_orders/"] = [(THROTTLED_STATUS_CODE, {RETRY_AFTER_HEADER: "0"})]
+    session, _ = create_rate_limited_session(server.url)
+    response = session.post(server.url + "orders/", json={})
+    throttled_response = session.post(server.url + "throttled_orders/", json={})
+    sent = [path for _, path, _ in server.received]
+    return {
+        "status": response.status_code,
+        "requests": sent.count("/orders/"),
+        "throttled_status": throttled_response.status_code,
+        "throttled_requests": sent.count("/throttled_orders/"),
+        "passed": response.status_code == SERVICE_UNAVAILABLE_STATUS_CODE
+        and sent.count("/orders/") == 1
+        and throttled_response.status_code == OK_STATUS_CODE
+        and sent.count("/throttled_orders/") == 2,
+    }
+
+
+def check_throttling_lowers_rate(server: FakeApiServer) -> Dict[str, Any]:
+    """
+    A 429 cuts the rate multiplicatively, and the following success only wins part of it back.
+    """
+    server.scripts["/instruments/"] = [(THROTTLED_STATUS_CODE, {RETRY_AFTER_HEADER: "0"})]
+    session, rate_limiter = create_rate_limited_session(server.url)
+    initial_rate = rate_limiter.rate
+    session.get(server.url + "instruments/")
+    settings = rate_limiter.settings
+    decreased_rate = max(settings.min_rate, initial_rate * settings.multiplicative_decrease)
+    expected_rate = min(settings.max_rate, decreased_rate + settings.additive_increase / decreased_rate)
+    return {
+        "initial_rate": initial_rate,
+        "rate": round(rate_limiter.rate, 3),
+        "passed": abs(rate_limiter.rate - expected_rate) < 1e-9 and rate_limiter.rate < initial_rate,
+    }
+
+
+CHECKS: Dict[str, Callable[[FakeApiServer], Dict[str, Any]]] = {
+    "get_retries_with_backoff": check_get_retries_with_backoff,
+    "post_not_retried_after_server_error": check_post_not_retried_after_server_error,
+    "throttling_lowers_rate": check_throttling_lowers_rate,
+}
+
+
+def run_rate_limit_checks() -> Dict[str, Dict[str, Any]]:
+    """
+    Run every check against its own fake API.
+    :return: Dictionary mapping check name to what it observed and whether it passed
+    """
+    results = {}
+    for name, check in CHECKS.items():
+        with run_fake_api() as server:
+            results[name] = check(server)
+    return results
+
+
+if __name__ == "__main__":
+    results = run_rate_limit_checks()
+    for name, result in results.items():
+        status = "OK" if result["passed"] else "FAIL"
+        details = ", ".join(f"{key} {value}" for key, value in result.items() if key != "passed")
+        print(f"{status:4} {name:40} {details}")
+    sys.exit(0 if all(result["passed"] for result in results.values()) else 1)
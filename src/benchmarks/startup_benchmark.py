@@ -0,0 +1,90 @@
+"""
+Startup benchmark: measures the import time of the entry points and every module under src,
+each in a fresh interpreter, and fails when a module goes over its budget or an entry point
+eagerly imports a dependency that should be deferred.
+
+Usage: python -m src.benchmarks.startup_benchmark [module ...]
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+from src.constants.benchmarks import (
+    DEFAULT_IMPORT_BUDGET_MS,
+    DEFERRED_MODULES,
+    ENTRY_POINT_MODULES,
+    IMPORT_BUDGETS_MS,
+    STARTUP_BENCHMARK_REPEATS,
+)
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MEASURE_IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+__import__({module!r})
+elapsed_ms = (time.perf_counter() - start) * 1000
+loaded = [name for name in {deferred!r} if name in sys.modules]
+print(json.dumps({{"elapsed_ms": elapsed_ms, "loaded": loaded}}))
+"""
+
+
+def discover_modules() -> List[str]:
+    """
+    List the entry points and all modules under src, in import notation.
+    """
+    modules = list(ENTRY_POINT_MODULES)
+    for directory, _, files in os.walk(os.path.join(REPO_ROOT, "src")):
+        for file_name in sorted(files):
+            if file_name.endswith(".py"):
+                relative_path = os.path.relpath(os.path.join(directory, file_name), REPO_ROOT)
+                modules.append(relative_path[: -len(".py")].replace(os.sep, "."))
+    return modules
+
+
+def measure_import(module: str, repeats: int = STARTUP_BENCHMARK_REPEATS) -> Tuple[float, List[str]]:
+    """
+    Import a module in fresh interpreters and return the median import time and the deferred
+    modules it pulled in.
+    """
+    timings, loaded = [], []
+    for _ in range(repeats):
+        result = subprocess.run(
+            [sys.executable, "-W", "ignore", "-c", MEASURE_IMPORT_SCRIPT.format(module=module, deferred=DEFERRED_MODULES)],
+            cwd=REPO_ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        measurement = json.loads(result.stdout.strip().splitlines()[-1])
+        timings.append(measurement["elapsed_ms"])
+        loaded = measurement["loaded"]
+    return statistics.median(timings), loaded
+
+
+def run_startup_benchmark(modules: List[str]) -> Dict[str, Dict]:
+    results = {}
+    for module in modules:
+        elapsed_ms, loaded = measure_import(module)
+        budget_ms = IMPORT_BUDGETS_MS.get(module, DEFAULT_IMPORT_BUDGET_MS)
+        eager_imports = loaded if module in ENTRY_POINT_MODULES else []
+        results[module] = {
+            "elapsed_ms": round(elapsed_ms, 1),
+            "budget_ms": budget_ms,
+            "eager_imports": eager_imports,
+            "passed": elapsed_ms <= budget_ms and not eager_imports,
+        }
+    return results
+
+
+if __name__ == "__main__":
+    results = run_startup_benchmark(sys.argv[1:] or discover_modules())
+    for module, result in results.items():
+        status = "OK" if result["passed"] else "FAIL"
+        eager = f" eagerly imports {result['eager_imports']}" if result["eager_imports"] else ""
+        print(f"{status:4} {module:55} {result['elapsed_ms']:8.1f} ms / {result['budget_ms']} ms{eager}")
+    sys.exit(0 if all(result["passed"] for result in results.values()) else 1)
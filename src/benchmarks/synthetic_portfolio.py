@@ -0,0 +1,303 @@
+"""
+Generator for realistic fake portfolios: holdings, fundamentals and dividend histories shaped like
+the Robinhood API responses. The data is written as a cassette, so the real pipeline can replay it
+through main.py --replay or the transform benchmarks without network access.
+
+Usage: python -m src.benchmarks.synthetic_portfolio [--positions N] [--dividends N] [--seed N] [--output PATH]
+"""
+
+import argparse
+import string
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from src.constants.benchmarks import (
+    DEFAULT_SYNTHETIC_DIVIDENDS,
+    DEFAULT_SYNTHETIC_POSITIONS,
+    MAX_SYNTHETIC_DIVIDENDS,
+    MAX_SYNTHETIC_POSITIONS,
+    SYNTHETIC_CASSETTE_PATH,
+    SYNTHETIC_DIVIDEND_PAGE_SIZE,
+    SYNTHETIC_DIVIDEND_YEARS,
+    SYNTHETIC_ETF_RATIO,
+)
+from src.constants.cassette import CassetteKeys, CassetteMode
+from src.constants.gsheets import (
+    DEFAULT_SPREADSHEET_NAME,
+    RH_CRYPTO_DUMP_SHEET_NAME,
+    RH_ETF_DUMP_SHEET_NAME,
+    RH_STOCK_DUMP_SHEET_NAME,
+)
+from src.constants.robinhood import (
+    CRYPTO_QUOTE_CURRENCY,
+    RobinhoodDividendStatus,
+    RobinhoodPaginationKeys,
+    RobinhoodProductTypes,
+)
+from src.external_services.cassette import Cassette, get_call_key
+from src.external_services.robinhood import get_batches, get_instrument_id, rh
+
+INSTRUMENT_URL_TEMPLATE = "https://api.robinhood.com/instruments/{}/"
+CRYPTO_CURRENCIES = {"BTC": "Bitcoin", "ETH": "Ethereum", "DOGE": "Dogecoin"}
+SECTORS = ["Technology", "Finance", "Energy", "Health Technology", "Consumer Non-Durables", "Utilities"]
+# Share of dividend records in each state. Records payable in the future are always pending.
+DIVIDEND_STATE_WEIGHTS = {
+    RobinhoodDividendStatus.PAID.value: 0.9,
+    RobinhoodDividendStatus.REINVESTED.value: 0.06,
+    RobinhoodDividendStatus.VOIDED.value: 0.02,
+    RobinhoodDividendStatus.PENDING.value: 0.02,
+}
+
+
+def generate_tickers(count: int) -> List[str]:
+    """
+    Unique four letter tickers: AAAA, AAAB, ...
+    """
+    letters = string.ascii_uppercase
+    return [
+        "".join(letters[(index // len(letters) ** power) % len(letters)] for power in (3, 2, 1, 0))
+        for index in range(count)
+    ]
+
+
+def generate_instruments(tickers: List[str], rng: np.random.Generator) -> Dict[str, str]:
+    return {
+        ticker: INSTRUMENT_URL_TEMPLATE.format(uuid.UUID(bytes=rng.bytes(16), version=4))
+        for ticker in tickers
+    }
+
+
+def generate_holdings(
+    tickers: List[str], instruments: Dict[str, str], rng: np.random.Generator
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Holdings in the shape of the responses build_stock_holdings reads.
+    :return: Open positions, their instruments and their quotes, in the order of the tickers
+    """
+    count = len(tickers)
+    prices = rng.lognormal(mean=4, sigma=1, size=count).round(2)
+    average_buy_prices = (prices * rng.uniform(0.5, 1.5, size=count)).round(2)
+    quantities = rng.lognormal(mean=2, sigma=1.5, size=count).round(6)
+    is_etf = rng.random(count) < SYNTHETIC_ETF_RATIO
+    has_extended_hours_trade = rng.random(count) < 0.3
+    positions, instrument_records, quotes = [], [], []
+    for index, ticker in enumerate(tickers):
+        positions.append(
+            {
+                "instrument": instruments[ticker],
+                "quantity": f"{quantities[index]:.6f}",
+                "average_buy_price": f"{average_buy_prices[index]:.4f}",
+            }
+        )
+        instrument_records.append(
+            {
+                "url": instruments[ticker],
+                "id": get_instrument_id(instruments[ticker]),
+                "symbol": ticker,
+                "simple_name": f"{ticker} {'ETF' if is_etf[index] else 'Inc'}",
+                "name": f"{ticker} {'Exchange Traded Fund' if is_etf[index] else 'Incorporated'}",
+                "type": (RobinhoodProductTypes.ETP if is_etf[index] else RobinhoodProductTypes.STOCK).value,
+            }
+        )
+        quotes.append(
+            {
+                "symbol": ticker,
+                "last_trade_price": f"{prices[index]:.4f}",
+                "last_extended_hours_trade_price": (
+                    f"{prices[index] * rng.uniform(0.98, 1.02):.4f}"
+                    if has_extended_hours_trade[index]
+                    else None
+                ),
+            }
+        )
+    return positions, instrument_records, quotes
+
+
+def generate_fundamentals(
+    tickers: List[str], instruments: Dict[str, str], rng: np.random.Generator
+) -> List[Dict[str, Any]]:
+    sectors = rng.choice(SECTORS, size=len(tickers))
+    return [
+        {
+            "symbol": ticker,
+            "instrument": instruments[ticker],
+            "description": f"{ticker} is a synthetic company used for benchmarking. " * 4,
+            "sector": sector,
+            "industry": f"{sector} Services",
+            "market_cap": f"{rng.lognormal(mean=22, sigma=2):.2f}",
+            "pe_ratio": f"{rng.uniform(5, 60):.6f}",
+            "dividend_yield": f"{rng.uniform(0, 8):.6f}",
+        }
+        for ticker, sector in zip(tickers, sectors)
+    ]
+
+
+def generate_crypto_positions(rng: np.random.Generator) -> List[Dict[str, Any]]:
+    positions = []
+    for code, name in CRYPTO_CURRENCIES.items():
+        quantity = rng.lognormal(mean=0, sigma=2)
+        positions.append(
+            {
+                "currency": {"code": code, "name": name},
+                "quantity_available": f"{quantity:.8f}",
+                "cost_bases": [
+                    {
+                        "direct_cost_basis": f"{quantity * rng.lognormal(mean=6, sigma=2):.2f}",
+                        "direct_quantity": f"{quantity:.8f}",
+                    }
+                ],
+            }
+        )
+    return positions
+
+
+def generate_crypto_currency_pairs() -> List[Dict[str, Any]]:
+    return [
+        {
+            "id": f"{code.lower()}-usd-pair",
+            "asset_currency": {"code": code, "name": name},
+            "quote_currency": {"code": CRYPTO_QUOTE_CURRENCY},
+            "symbol": f"{code}-{CRYPTO_QUOTE_CURRENCY}",
+        }
+        for code, name in CRYPTO_CURRENCIES.items()
+    ]
+
+
+def generate_crypto_quote(currency_pair: Dict[str, Any], rng: np.random.Generator) -> Dict[str, Any]:
+    return {
+        "id": currency_pair["id"],
+        "symbol": currency_pair["symbol"].replace("-", ""),
+        "mark_price": f"{rng.lognormal(mean=6, sigma=2):.6f}",
+    }
+
+
+def generate_dividends(
+    instruments: List[str], count: int, today: datetime, rng: np.random.Generator
+) -> List[Dict[str, Any]]:
+    """
+    Dividend records spread over the instruments and the last SYNTHETIC_DIVIDEND_YEARS years,
+    sorted newest first like the API returns them.
+    """
+    days_ago = np.sort(rng.integers(-30, SYNTHETIC_DIVIDEND_YEARS * 365, size=count))
+    owners = rng.integers(0, len(instruments), size=count)
+    rates = rng.uniform(0.01, 1.5, size=count).round(4)
+    positions = rng.lognormal(mean=2, sigma=1.5, size=count).round(6)
+    states = rng.choice(
+        list(DIVIDEND_STATE_WEIGHTS), size=count, p=list(DIVIDEND_STATE_WEIGHTS.values())
+    )
+    dividends = []
+    for index in range(count):
+        payable_date = today - timedelta(days=int(days_ago[index]))
+        # Dividends payable in the future are still pending
+        state = RobinhoodDividendStatus.PENDING.value if payable_date > today else states[index]
+        is_paid = state in (RobinhoodDividendStatus.PAID.value, RobinhoodDividendStatus.REINVESTED.value)
+        dividends.append(
+            {
+                "id": str(uuid.UUID(bytes=rng.bytes(16), version=4)),
+                "instrument": instruments[owners[index]],
+                "amount": f"{rates[index] * positions[index]:.2f}",
+                "rate": f"{rates[index]:.8f}",
+                "position": f"{positions[index]:.8f}",
+                "withholding": "0.00",
+                "record_date": (payable_date - timedelta(days=14)).date().isoformat(),
+                "payable_date": payable_date.date().isoformat(),
+                "paid_at": payable_date.strftime("%Y-%m-%dT%H:%M:%SZ") if is_paid else None,
+                "state": state,
+                "drip_enabled": bool(state == RobinhoodDividendStatus.REINVESTED.value),
+            }
+        )
+    return dividends
+
+
+def build_synthetic_cassette(
+    path: str,
+    positions: int = DEFAULT_SYNTHETIC_POSITIONS,
+    dividends: int = DEFAULT_SYNTHETIC_DIVIDENDS,
+    seed: int = 0,
+) -> Cassette:
+    """
+    Build a cassette serving a synthetic portfolio for every call the export pipeline makes.
+    :param path: Where the cassette will be saved
+    :param positions: Number of holdings, up to MAX_SYNTHETIC_POSITIONS
+    :param dividends: Number of dividend records, up to MAX_SYNTHETIC_DIVIDENDS
+    :param seed: Seed of the random generator, so the same arguments give the same portfolio
+    """
+    if not 0 < positions <= MAX_SYNTHETIC_POSITIONS:
+        raise ValueError(f"positions must be between 1 and {MAX_SYNTHETIC_POSITIONS}")
+    if not 0 <= dividends <= MAX_SYNTHETIC_DIVIDENDS:
+        raise ValueError(f"dividends must be between 0 and {MAX_SYNTHETIC_DIVIDENDS}")
+
+    rng = np.random.default_rng(seed)
+    today = datetime.now(timezone.utc).replace(hour=14, minute=0, second=0, microsecond=0)
+    tickers = generate_tickers(positions)
+    instruments = generate_instruments(tickers, rng)
+    dividend_records = generate_dividends(list(instruments.values()), dividends, today, rng)
+
+    interactions: Dict[str, List[Dict[str, Any]]] = {}
+
+    def add_interaction(call_name: str, arguments: Any, result: Any) -> None:
+        interactions.setdefault(call_name, []).append(
+            {CassetteKeys.KEY.value: get_call_key(arguments), CassetteKeys.RESULT.value: result}
+        )
+
+    add_interaction("robinhood.login", [[None], {}], None)
+    positions, instrument_records, quotes = generate_holdings(tickers, instruments, rng)
+    add_interaction("robinhood.get_open_stock_positions", [[], {}], positions)
+    # Batched the same way build_stock_holdings requests them
+    for records in get_batches(instrument_records):
+        instrument_ids = [record["id"] for record in records]
+        add_interaction("robinhood.get_instruments", [[instrument_ids], {}], records)
+    for records in get_batches(quotes):
+        symbols = [record["symbol"] for record in records]
+        add_interaction("robinhood.get_quotes", [[symbols], {}], records)
+    add_interaction(
+        "robinhood.get_fundamentals", [[tickers], {}], generate_fundamentals(tickers, instruments, rng)
+    )
+    add_interaction("robinhood.get_crypto_positions", [[], {}], generate_crypto_positions(rng))
+    currency_pairs = generate_crypto_currency_pairs()
+    add_interaction("robinhood.get_crypto_currency_pairs", [[], {}], currency_pairs)
+    for currency_pair in currency_pairs:
+        add_interaction(
+            "robinhood.get_crypto_quote", [[currency_pair["id"]], {}], generate_crypto_quote(currency_pair, rng)
+        )
+
+    dividends_url = rh.urls.dividends_url()
+    page_starts = range(0, max(len(dividend_records), 1), SYNTHETIC_DIVIDEND_PAGE_SIZE)
+    for page_number, start in enumerate(page_starts):
+        url = dividends_url if page_number == 0 else f"{dividends_url}?cursor={page_number}"
+        has_next = start + SYNTHETIC_DIVIDEND_PAGE_SIZE < len(dividend_records)
+        add_interaction(
+            "robinhood.request_get",
+            [[url], {}],
+            {
+                RobinhoodPaginationKeys.RESULTS.value: dividend_records[start : start + SYNTHETIC_DIVIDEND_PAGE_SIZE],
+                RobinhoodPaginationKeys.NEXT.value: f"{dividends_url}?cursor={page_number + 1}" if has_next else None,
+            },
+        )
+
+    add_interaction("sheets.authorize", [[], {}], None)
+    for sheet_id, worksheet_name in enumerate(
+        (RH_STOCK_DUMP_SHEET_NAME, RH_ETF_DUMP_SHEET_NAME, RH_CRYPTO_DUMP_SHEET_NAME)
+    ):
+        add_interaction(
+            "sheets.worksheet_by_title",
+            [[worksheet_name, DEFAULT_SPREADSHEET_NAME], {}],
+            {"sheet_id": sheet_id, "title": worksheet_name, "row_count": 1000, "column_count": 26},
+        )
+    add_interaction("sheets.batch_update", None, {"spreadsheetId": "synthetic"})
+
+    return Cassette(path, CassetteMode.RECORD, interactions)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--positions", type=int, default=DEFAULT_SYNTHETIC_POSITIONS)
+    parser.add_argument("--dividends", type=int, default=DEFAULT_SYNTHETIC_DIVIDENDS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=SYNTHETIC_CASSETTE_PATH)
+    args = parser.parse_args()
+
+    build_synthetic_cassette(args.output, args.positions, args.dividends, args.seed).save()
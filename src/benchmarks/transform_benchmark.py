@@ -0,0 +1,101 @@
+"""
+Transform benchmark: runs each pandas step of the export pipeline on a synthetic portfolio and reports
+its wall time and peak traced memory.
+
+Usage: python -m src.benchmarks.transform_benchmark [--positions N] [--dividends N] [--seed N]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable, List, Tuple
+from unittest import mock
+
+from src.benchmarks.synthetic_portfolio import build_synthetic_cassette
+from src.constants.additional_columns import CalculatedColumnManager
+from src.constants.benchmarks import DEFAULT_SYNTHETIC_DIVIDENDS, DEFAULT_SYNTHETIC_POSITIONS
+from src.constants.cassette import CassetteMode
+from src.constants.storage import LOCAL_STORAGE_DIR_ENV_VAR
+from src.external_services.cassette import use_cassette
+from src.rh_data_util import (
+    add_fundamentals_information,
+    add_latest_dividend_information,
+    get_dividend_history,
+    get_last_year_and_ytd_dividend,
+)
+from src.rh_portfolio_to_sheets import get_rh_portfolio_as_df, select_columns_to_export
+from src.run_cache import use_run_cache
+
+BYTES_IN_MEGABYTE = 1024 * 1024
+
+
+def measure(step: str, func: Callable[[], Any], results: List[Tuple[str, float, float]]) -> Any:
+    """
+    Run a step, recording its wall time in seconds and peak traced memory in megabytes.
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        return func()
+    finally:
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results.append((step, elapsed, peak / BYTES_IN_MEGABYTE))
+
+
+def run_transform_benchmark(positions: int, dividends: int, seed: int = 0) -> List[Tuple[str, float, float]]:
+    """
+    Benchmark the pipeline's transforms on a synthetic portfolio, each step on the output of the previous one.
+    Fetching is served from a synthetic cassette into empty local caches, so the fundamentals and
+    dividend history steps include their local cache writes but no network time.
+    :return: List of (step, seconds, peak megabytes)
+    """
+    results: List[Tuple[str, float, float]] = []
+    # The local storage directory is only overridden for the benchmark and restored once it returns
+    with tempfile.TemporaryDirectory(prefix="rh_benchmark_") as directory, mock.patch.dict(
+        os.environ, {LOCAL_STORAGE_DIR_ENV_VAR: directory}
+    ):
+        cassette_path = os.path.join(directory, "synthetic_portfolio.json.gz")
+        build_synthetic_cassette(cassette_path, positions, dividends, seed).save()
+
+        with use_cassette(cassette_path, CassetteMode.REPLAY), use_run_cache():
+            portfolio = measure("holdings ingestion", lambda: get_rh_portfolio_as_df(is_live=True), results)
+            portfolio = measure(
+                "add_fundamentals_information", lambda: add_fundamentals_information(portfolio), results
+            )
+            measure("dividend history sync and ingestion", get_dividend_history, results)
+            portfolio = measure(
+                "add_latest_dividend_information", lambda: add_latest_dividend_information(portfolio), results
+            )
+            dividend_totals = measure("get_last_year_and_ytd_dividend", get_last_year_and_ytd_dividend, results)
+
+        custom_columns = CalculatedColumnManager(portfolio)
+        measure("add_total_column", custom_columns.add_total_column, results)
+        measure("add_market_value_column", custom_columns.add_market_value_column, results)
+        measure("add_unrealized_pnl_column", custom_columns.add_unrealized_pnl_column, results)
+        measure("add_projected_dividend_column", custom_columns.add_projected_dividend_column, results)
+        measure(
+            "add_dividend_payout_columns",
+            lambda: custom_columns.add_dividend_payout_columns(dividend_totals),
+            results,
+        )
+        measure("add_diversity_column", custom_columns.add_diversity_column, results)
+        measure("select_columns_to_export", lambda: select_columns_to_export(custom_columns.portfolio), results)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--positions", type=int, default=DEFAULT_SYNTHETIC_POSITIONS)
+    parser.add_argument("--dividends", type=int, default=DEFAULT_SYNTHETIC_DIVIDENDS)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"Benchmarking transforms on {args.positions} positions and {args.dividends} dividend records")
+    results = run_transform_benchmark(args.positions, args.dividends, args.seed)
+    print(f"{'step':40} {'seconds':>10} {'peak MB':>10}")
+    for step, elapsed, peak in results:
+        print(f"{step:40} {elapsed:10.3f} {peak:10.1f}")
@@ -1,14 +1,18 @@
 from enum import Enum
 from collections import namedtuple
-from pandas import DataFrame
+from typing import Dict, Optional, Union
+from pandas import DataFrame, to_numeric
 
-from src.constants.common import DataFrameMergeType
+from src.constants.common import DataFrameMergeType, PANDAS_ERROR_COERCE
 from src.constants.robinhood import RobinhoodApiData as RhData, RobinhoodApiData
 
 ColumnNameDataType = namedtuple(
     "ColumnNameDataType", field_names=["name", "label", "type"]
 )
 
+# Pay date window, inclusive at both ends, whose dividend totals end up in column_name
+DividendWindow = namedtuple("DividendWindow", field_names=["column_name", "start", "end"])
+
 
 class ColumnNames(Enum):
     """
@@ -26,6 +30,12 @@ class ColumnNames(Enum):
         name="last_year_dvd", label="Last Year's DVD", type="float"
     )
     YTD_DVD = ColumnNameDataType(name="ytd_dvd", label="YTD DVD", type="float")
+    MARKET_VALUE = ColumnNameDataType(
+        name="market_value", label="Market Value", type="float"
+    )
+    UNREALIZED_PNL = ColumnNameDataType(
+        name="unrealized_pnl", label="Unrealized P&L", type="float"
+    )
 
 
 class CalculatedColumnManager:
@@ -44,28 +54,73 @@ class CalculatedColumnManager:
             len(self.portfolio.columns),
             ColumnNames.TOTAL.value.name,
             (
-                self.portfolio[RhData.AVG_BUY_PRICE.value.name].astype(
-                    RhData.AVG_BUY_PRICE.value.type
-                )
-                * self.portfolio[RhData.QUANTITY.value.name].astype(
-                    RhData.QUANTITY.value.type
-                )
+                self.portfolio[RhData.AVG_BUY_PRICE.value.name]
+                * self.portfolio[RhData.QUANTITY.value.name]
             ),
         )
 
-    def add_diversity_column(self) -> None:
+    def add_market_value_column(self) -> None:
         """
-        Function to calculate the portfolio's diversity.
+        Function to calculate the current value of a holding.
         """
         self.portfolio.insert(
             len(self.portfolio.columns),
-            ColumnNames.DIVERSITY.value.name,
+            ColumnNames.MARKET_VALUE.value.name,
+            (
+                self.portfolio[RhData.PRICE.value.name]
+                * self.portfolio[RhData.QUANTITY.value.name]
+            ),
+        )
+
+    def add_unrealized_pnl_column(self) -> None:
+        """
+        Function to calculate the unrealized profit or loss of a holding: its market value minus its total cost.
+        """
+        self.portfolio.insert(
+            len(self.portfolio.columns),
+            ColumnNames.UNREALIZED_PNL.value.name,
             (
-                self.portfolio[ColumnNames.TOTAL.value.name].astype(float)
-                / self.portfolio[ColumnNames.TOTAL.value.name].sum()
+                self.portfolio[ColumnNames.MARKET_VALUE.value.name]
+                - self.portfolio[ColumnNames.TOTAL.value.name]
             ),
         )
 
+    def update_price_columns(self, prices: Dict[str, Union[str, float]]) -> None:
+        """
+        Function to set the latest price of each holding and recalculate the columns derived from it.
+        Total and diversity are based on the average buy price, so they are left as they are.
+        :param prices: Dictionary mapping ticker to its latest price, as a number or as quoted by the API.
+                       Holdings missing from it keep their price.
+        """
+        price = RhData.PRICE.value.name
+        # Parsed like the ingested prices, so an unchanged quote gives exactly the same number
+        latest_prices = to_numeric(
+            self.portfolio[RhData.TICKER.value.name].map(prices), errors=PANDAS_ERROR_COERCE
+        )
+        self.portfolio[price] = latest_prices.fillna(self.portfolio[price])
+        if ColumnNames.MARKET_VALUE.value.name in self.portfolio.columns:
+            self.portfolio[ColumnNames.MARKET_VALUE.value.name] = (
+                self.portfolio[price] * self.portfolio[RhData.QUANTITY.value.name]
+            )
+        if ColumnNames.UNREALIZED_PNL.value.name in self.portfolio.columns:
+            self.portfolio[ColumnNames.UNREALIZED_PNL.value.name] = (
+                self.portfolio[ColumnNames.MARKET_VALUE.value.name]
+                - self.portfolio[ColumnNames.TOTAL.value.name]
+            )
+
+    def add_diversity_column(self, total: Optional[float] = None) -> None:
+        """
+        Function to calculate the portfolio's diversity.
+        :param total: Denominator for the diversity. Defaults to the total of this DataFrame's holdings.
+        """
+        if total is None:
+            total = self.portfolio[ColumnNames.TOTAL.value.name].sum()
+        self.portfolio.insert(
+            len(self.portfolio.columns),
+            ColumnNames.DIVERSITY.value.name,
+            (self.portfolio[ColumnNames.TOTAL.value.name] / total),
+        )
+
     def add_projected_dividend_column(self) -> None:
         """
         Function to calculate the projected dividend.
@@ -74,31 +129,21 @@ class CalculatedColumnManager:
             len(self.portfolio.columns),
             ColumnNames.PROJECTED_DVD.value.name,
             (
-                self.portfolio[RhData.DVD_RATE.value.name].astype(
-                    RhData.DVD_RATE.value.type
-                )
-                * self.portfolio[RhData.QUANTITY.value.name].astype(
-                    RhData.QUANTITY.value.type
-                )
+                self.portfolio[RhData.DVD_RATE.value.name]
+                * self.portfolio[RhData.QUANTITY.value.name]
             ),
         )
 
     def add_dividend_payout_columns(self, dividend_info: DataFrame) -> DataFrame:
         """
-        Function to calculate the total dividends paid out in the last year and YTD.
+        Function to add the total dividends paid out per window, e.g. in the last year and YTD.
+        :param dividend_info: Wide DataFrame with an instrument column and one column per dividend window
         """
+        window_columns = dividend_info.columns.drop(RobinhoodApiData.INSTRUMENT.value.name)
         self.portfolio = self.portfolio.merge(
-            dividend_info[
-                [RobinhoodApiData.INSTRUMENT.value.name, ColumnNames.LAST_YEAR_DVD.value.name, ColumnNames.YTD_DVD.value.name]
-            ],
+            dividend_info,
             how=DataFrameMergeType.LEFT.value,
             on=RobinhoodApiData.INSTRUMENT.value.name,
         )
-        self.portfolio[
-            [ColumnNames.LAST_YEAR_DVD.value.name, ColumnNames.YTD_DVD.value.name]
-        ] = self.portfolio[
-            [ColumnNames.LAST_YEAR_DVD.value.name, ColumnNames.YTD_DVD.value.name]
-        ].fillna(
-            0
-        )
+        self.portfolio[window_columns] = self.portfolio[window_columns].fillna(0)
         return self.portfolio
@@ -1,3 +1,22 @@
 KMS = "kms"
 KMS_PLAINTEXT = 'Plaintext'
 US_WEST_REGION = "us-west-1"
+# Set by the Lambda runtime
+LAMBDA_FUNCTION_NAME_ENV_VAR = "AWS_LAMBDA_FUNCTION_NAME"
+
+# Lambda event keys
+LAMBDA_EVENT_INCREMENTAL = "incremental"
+LAMBDA_EVENT_DIVERSITY_SCOPE = "diversity_scope"
+LAMBDA_EVENT_ARCHIVE_SNAPSHOTS = "archive_snapshots"
+LAMBDA_EVENT_ACCOUNTS = "accounts"
+LAMBDA_EVENT_MAX_CONCURRENT_ACCOUNTS = "max_concurrent_accounts"
+LAMBDA_EVENT_SINKS = "sinks"
+LAMBDA_EVENT_PRICES_ONLY = "prices_only"
+LAMBDA_EVENT_CACHE_FOR_PRICES_ONLY = "cache_for_prices_only"
+
+# Credentials decryption
+ENCRYPTED_VALUE_MIN_LENGTH = 16
+CREDENTIALS_TTL_ENV_VAR = "RH_CREDENTIALS_TTL_SECONDS"
+DEFAULT_CREDENTIALS_TTL_SECONDS = 3600
+# Multi-account exports decrypt three secrets per account, so KMS requests are capped rather than one thread each
+MAX_CONCURRENT_DECRYPTIONS = 8
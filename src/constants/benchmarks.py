@@ -0,0 +1,41 @@
+# Startup benchmark: import time budgets in milliseconds, measured in a fresh interpreter
+DEFAULT_IMPORT_BUDGET_MS = 1000
+IMPORT_BUDGETS_MS = {
+    "lambda_function": 200,
+    "main": 200,
+}
+STARTUP_BENCHMARK_REPEATS = 3
+
+# Modules that entry points must not import until a stage needs them
+DEFERRED_MODULES = (
+    "boto3",
+    "pygsheets",
+    "googleapiclient",
+    "robin_stocks",
+    "pandas",
+    "numpy",
+    "pyarrow",
+    "cryptography",
+    "sqlite3",
+)
+ENTRY_POINT_MODULES = ("lambda_function", "main")
+
+# Synthetic portfolio used by the transform benchmarks
+MAX_SYNTHETIC_POSITIONS = 10_000
+MAX_SYNTHETIC_DIVIDENDS = 1_000_000
+DEFAULT_SYNTHETIC_POSITIONS = 1_000
+DEFAULT_SYNTHETIC_DIVIDENDS = 100_000
+SYNTHETIC_DIVIDEND_YEARS = 10
+SYNTHETIC_DIVIDEND_PAGE_SIZE = 1_000
+SYNTHETIC_ETF_RATIO = 0.2
+SYNTHETIC_CASSETTE_PATH = "data/cassettes/synthetic_portfolio.json.gz"
+
+# Lambda smoke run: a small synthetic portfolio replayed through the handler as the Lambda runtime would run it
+LAMBDA_SMOKE_FUNCTION_NAME = "rh-portfolio-to-sheets-smoke"
+LAMBDA_SMOKE_POSITIONS = 50
+LAMBDA_SMOKE_DIVIDENDS = 1_000
+
+# Rate limiter check: retry behaviour against a local fake API, with backoffs short enough to run in seconds
+RATE_LIMIT_CHECK_RETRY_AFTER_SECONDS = 0.3
+RATE_LIMIT_CHECK_BASE_BACKOFF_SECONDS = 0.05
+RATE_LIMIT_CHECK_MAX_RETRIES = 3
@@ -0,0 +1,18 @@
+from enum import StrEnum
+
+# Record/replay of external service calls
+CASSETTE_FORMAT_VERSION = 3
+DEFAULT_CASSETTE_PATH = "data/cassettes/portfolio.json.gz"
+
+
+class CassetteMode(StrEnum):
+    RECORD = "record"
+    REPLAY = "replay"
+
+
+class CassetteKeys(StrEnum):
+    VERSION = "version"
+    RECORDED_AT = "recorded_at"
+    INTERACTIONS = "interactions"
+    KEY = "key"
+    RESULT = "result"
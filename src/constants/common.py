@@ -1,7 +1,10 @@
 from enum import StrEnum
 
 
+CATEGORY_DTYPE = "category"
 MONTHS_IN_QUARTER = 3
+NANOSECOND_DTYPE = "datetime64[ns]"
+FLOAT_DTYPE = "float64"
 PANDAS_ERROR_COERCE = "coerce"
 UTF_8 = 'utf-8'
 
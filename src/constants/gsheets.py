@@ -3,3 +3,18 @@ DEFAULT_SPREADSHEET_NAME = "RH_Sheets"
 RH_STOCK_DUMP_SHEET_NAME = "RH_stock_dump"
 RH_ETF_DUMP_SHEET_NAME = "RH_etf_dump"
 RH_CRYPTO_DUMP_SHEET_NAME = "RH_crypto_dump"
+
+# Sheets API request constants
+USER_ENTERED_VALUE_FIELD = "userEnteredValue"
+GRID_SIZE_FIELDS = "gridProperties.rowCount,gridProperties.columnCount"
+BATCH_UPDATE_RESPONSE_FIELDS = "spreadsheetId"
+# Text written for missing values, matching pygsheets' set_dataframe default
+SHEETS_NAN_VALUE = "NaN"
+# Incremental writes fall back to a full rewrite when more than this share of cells changed
+INCREMENTAL_FULL_REWRITE_RATIO = 0.5
+# Worksheets with at least this many rows are written in chunks of BULK_WRITE_CHUNK_ROWS rows, each in its own
+# request, so neither the payload nor the converted grid ever holds the whole frame
+BULK_WRITE_MIN_ROWS = 5_000
+BULK_WRITE_CHUNK_ROWS = 2_000
+# Chunks uploaded at the same time. Sheets' per-minute write quota is low, so chunks are sent one by one by default.
+DEFAULT_BULK_WRITE_PARALLEL_CHUNKS = 1
@@ -0,0 +1,12 @@
+# Connection pooling shared by the Robinhood and Google Sheets HTTP clients
+HTTP_PREFIXES = ("https://", "http://")
+# Hosts whose connection pools a session keeps: Robinhood's API, or Google's OAuth, Sheets and Drive hosts
+POOL_CONNECTIONS = 8
+# Connections kept alive per host, enough for every pipeline stage and account export in flight at once
+POOL_MAXSIZE = 16
+# Wait for a pooled connection instead of opening one that won't be kept, which caps connections per host
+POOL_BLOCK = True
+# Ask for kept-alive connections and compressed responses. Responses are decompressed transparently.
+TRANSPORT_HEADERS = {"Connection": "keep-alive", "Accept-Encoding": "gzip, deflate"}
+# Headers describing the encoded body, which no longer apply once the body is decompressed
+ENCODED_BODY_HEADERS = ("content-encoding", "content-length")
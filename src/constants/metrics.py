@@ -0,0 +1,35 @@
+from collections import namedtuple
+from enum import Enum, StrEnum
+
+# CloudWatch embedded metric format (EMF) settings
+METRICS_NAMESPACE = "RhPortfolioToSheets"
+METRICS_DIMENSION = "Pipeline"
+METRICS_ACCOUNT_DIMENSION = "Account"
+METRICS_PIPELINE_NAME = "export_rh_portfolio_to_sheets"
+PRICES_ONLY_PIPELINE_NAME = "refresh_rh_portfolio_prices"
+# Sub-stage names are appended to their parent stage's name with this separator
+STAGE_NAME_SEPARATOR = "."
+# API calls made outside of any tracked stage are attributed to this stage
+UNTRACKED_STAGE_NAME = "untracked"
+# Record property holding the raw per-stage values
+STAGES_PROPERTY = "stages"
+
+StageMetricType = namedtuple("StageMetricType", field_names=["name", "unit"])
+
+
+class StageMetric(Enum):
+    DURATION = StageMetricType(name="duration_ms", unit="Milliseconds")
+    ROWS = StageMetricType(name="rows", unit="Count")
+    API_CALLS = StageMetricType(name="api_calls", unit="Count")
+    PAYLOAD_BYTES = StageMetricType(name="payload_bytes", unit="Bytes")
+
+
+class EmfKeys(StrEnum):
+    AWS = "_aws"
+    TIMESTAMP = "Timestamp"
+    CLOUDWATCH_METRICS = "CloudWatchMetrics"
+    NAMESPACE = "Namespace"
+    DIMENSIONS = "Dimensions"
+    METRICS = "Metrics"
+    NAME = "Name"
+    UNIT = "Unit"
@@ -0,0 +1,31 @@
+from enum import StrEnum
+
+
+DEFAULT_MAX_STAGE_WORKERS = 4
+# Accounts exported at the same time in multi-account mode
+DEFAULT_MAX_CONCURRENT_ACCOUNTS = 2
+
+
+class DiversityScope(StrEnum):
+    """
+    Denominator used for the diversity column: the holdings of each tab, or the whole portfolio.
+    """
+
+    TAB = "tab"
+    PORTFOLIO = "portfolio"
+
+
+class PipelineStage(StrEnum):
+    LOGIN = "login"
+    PREPARE_OUTPUTS = "prepare_outputs"
+    HOLDINGS = "holdings"
+    ENRICHED_PORTFOLIO = "enriched_portfolio"
+    DIVIDEND_HISTORY = "dividend_history"
+    DIVIDEND_TOTALS = "dividend_totals"
+    STOCK_PORTFOLIO = "stock_portfolio"
+    ETF_PORTFOLIO = "etf_portfolio"
+    CRYPTO_HOLDINGS = "crypto_holdings"
+    CRYPTO_PORTFOLIO = "crypto_portfolio"
+    CACHE_PORTFOLIO = "cache_portfolio"
+    WRITE_OUTPUTS = "write_outputs"
+    ARCHIVE_SNAPSHOTS = "archive_snapshots"
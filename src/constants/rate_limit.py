@@ -0,0 +1,40 @@
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet
+
+# Client-side throttling of the Robinhood API
+ROBINHOOD_API_URL = "https://api.robinhood.com/"
+RETRY_AFTER_HEADER = "Retry-After"
+THROTTLED_STATUS_CODE = 429
+# Server errors worth retrying. Other errors won't go away by sending the same request again.
+RETRYABLE_SERVER_STATUS_CODES = frozenset({500, 502, 503, 504})
+# Methods retried after a server or connection error, since the request may have been processed.
+# Throttled requests were rejected before being processed, so they are retried whatever the method.
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+
+@dataclass(frozen=True)
+class RateLimitSettings:
+    """
+    Settings of the adaptive rate limiter. Rates are in requests per second.
+    The rate grows by additive_increase per second of successful requests, and is multiplied by
+    multiplicative_decrease whenever a request is throttled.
+    """
+
+    initial_rate: float = 5.0
+    min_rate: float = 0.5
+    max_rate: float = 20.0
+    burst: int = 5
+    additive_increase: float = 1.0
+    multiplicative_decrease: float = 0.5
+    max_retries: int = 5
+    base_backoff: float = 0.5
+    max_backoff: float = 30.0
+    default_endpoint_concurrency: int = 4
+    # Most requests in flight per endpoint, i.e. first path segment such as "quotes"
+    endpoint_concurrency: Dict[str, int] = field(
+        default_factory=lambda: {"oauth2": 1, "quotes": 2, "instruments": 2}
+    )
+    retryable_status_codes: FrozenSet[int] = RETRYABLE_SERVER_STATUS_CODES
+
+
+DEFAULT_RATE_LIMIT_SETTINGS = RateLimitSettings()
@@ -25,3 +25,22 @@ DIVIDEND_HEADERS = {
     ColumnNames.LAST_YEAR_DVD.value.name: ColumnNames.LAST_YEAR_DVD.value.label,
     ColumnNames.YTD_DVD.value.name: ColumnNames.YTD_DVD.value.label,
 }
+
+CRYPTO_SHEET_HEADERS = {
+    RobinhoodApiData.TICKER.value.name: RobinhoodApiData.TICKER.value.label,
+    RobinhoodApiData.NAME.value.name: RobinhoodApiData.NAME.value.label,
+    RobinhoodApiData.AVG_BUY_PRICE.value.name: RobinhoodApiData.AVG_BUY_PRICE.value.label,
+    RobinhoodApiData.QUANTITY.value.name: RobinhoodApiData.QUANTITY.value.label,
+    RobinhoodApiData.PRICE.value.name: RobinhoodApiData.PRICE.value.label,
+    ColumnNames.TOTAL.value.name: ColumnNames.TOTAL.value.label,
+    ColumnNames.MARKET_VALUE.value.name: ColumnNames.MARKET_VALUE.value.label,
+    ColumnNames.UNREALIZED_PNL.value.name: ColumnNames.UNREALIZED_PNL.value.label,
+}
+
+# Columns that move with the market, the only ones a price-only refresh writes.
+# Total and diversity are based on the average buy price, so they don't move.
+MARKET_HEADERS = {
+    RobinhoodApiData.PRICE.value.name: RobinhoodApiData.PRICE.value.label,
+    ColumnNames.MARKET_VALUE.value.name: ColumnNames.MARKET_VALUE.value.label,
+    ColumnNames.UNREALIZED_PNL.value.name: ColumnNames.UNREALIZED_PNL.value.label,
+}
@@ -1,11 +1,19 @@
 from enum import Enum, StrEnum
 from dataclasses import dataclass
 from collections import namedtuple
+from datetime import datetime
 
 # Environment variables
 RH_EMAIL_ENV_VAR = "RH_EMAIL"
 RH_PASSWORD_ENV_VAR = "RH_PASSWORD"
 RH_OTP_KEY_ENV_VAR = "RH_OTP_KEY"
+# Optional Fernet key used to encrypt cached sessions. Derived from the credentials when unset.
+RH_SESSION_KEY_ENV_VAR = "RH_SESSION_KEY"
+
+# OAuth settings used by the Robinhood web client
+RH_OAUTH_CLIENT_ID = "c82SH0WZOsabOXGP2sxqcj34FxkvfnWRZBKlBjFS"
+RH_OAUTH_SCOPE = "internal"
+RH_SESSION_EXPIRES_IN = 86400
 
 
 # RH ticker exceptions
@@ -26,6 +34,25 @@ class RobinhoodCredentials:
     otp_key: str
 
 
+@dataclass
+class RobinhoodAccount:
+    """
+    An account exported in multi-account mode, and the spreadsheet its portfolio is written to.
+    """
+
+    name: str
+    credentials: RobinhoodCredentials
+    spreadsheet_name: str
+
+
+class AccountConfigKeys(StrEnum):
+    NAME = "name"
+    EMAIL = "email"
+    PASSWORD = "password"
+    OTP_KEY = "otp_key"
+    SPREADSHEET_NAME = "spreadsheet_name"
+
+
 class RobinhoodDividendStatus(StrEnum):
     VOIDED = "voided"
     PENDING = "pending"
@@ -86,6 +113,12 @@ class RobinhoodApiData(Enum):
         type=str,
         category=RobinhoodCategories.PORTFOLIO.value,
     )
+    PRICE = RobinhoodDataType(
+        name="price",
+        label="Price",
+        type=float,
+        category=RobinhoodCategories.PORTFOLIO.value,
+    )
 
     # Fundamentals data
     DESCRIPTION = RobinhoodDataType(
@@ -123,13 +156,13 @@ class RobinhoodApiData(Enum):
     PAYABLE_DATE = RobinhoodDataType(
         name="payable_date",
         label="Dividend Date",
-        type=str,
+        type=datetime,
         category=RobinhoodCategories.DIVIDEND.value,
     )
     PAID_AT_DATE = RobinhoodDataType(
         name="paid_at",
         label="Paid At",
-        type=str,
+        type=datetime,
         category=RobinhoodCategories.DIVIDEND.value,
     )
     DVD_RATE = RobinhoodDataType(
@@ -158,6 +191,14 @@ class RobinhoodApiData(Enum):
     )
 
 
+# Fields ingested as pandas categoricals: a few distinct values repeated across many rows
+CATEGORICAL_API_FIELDS = {
+    RobinhoodApiData.INSTRUMENT.value.name,
+    RobinhoodApiData.TYPE.value.name,
+    RobinhoodApiData.DVD_STATUS.value.name,
+}
+
+
 class CryptoDataKeys(StrEnum):
     CURRENCY = "currency"
     TICKER_CODE = "code"
@@ -166,3 +207,71 @@ class CryptoDataKeys(StrEnum):
     COST_BASES = "cost_bases"
     DIRECT_COST_BASIS = "direct_cost_basis"
     DIRECT_QUANTITY = "direct_quantity"
+    ID = "id"
+    ASSET_CURRENCY = "asset_currency"
+    QUOTE_CURRENCY = "quote_currency"
+    MARK_PRICE = "mark_price"
+
+
+class RobinhoodPaginationKeys(StrEnum):
+    RESULTS = "results"
+    NEXT = "next"
+
+
+class RobinhoodPositionKeys(StrEnum):
+    INSTRUMENT = "instrument"
+    QUANTITY = "quantity"
+    AVERAGE_BUY_PRICE = "average_buy_price"
+
+
+class RobinhoodInstrumentKeys(StrEnum):
+    URL = "url"
+    ID = "id"
+    SYMBOL = "symbol"
+    SIMPLE_NAME = "simple_name"
+    NAME = "name"
+    TYPE = "type"
+
+
+class RobinhoodQuoteKeys(StrEnum):
+    SYMBOL = "symbol"
+    LAST_TRADE_PRICE = "last_trade_price"
+    LAST_EXTENDED_HOURS_TRADE_PRICE = "last_extended_hours_trade_price"
+
+
+# Most instrument ids or symbols sent in one instruments or quotes request, keeping URLs well under length limits
+MAX_SYMBOLS_PER_REQUEST = 50
+# Crypto holdings are valued in this currency, through the currency pair quoted in it
+CRYPTO_QUOTE_CURRENCY = "USD"
+# Crypto quotes are requested one pair at a time, so they are fetched concurrently
+MAX_CONCURRENT_CRYPTO_QUOTES = 4
+
+
+DIVIDEND_ID = "id"
+# Dividend states that may still change after they were first fetched
+OPEN_DIVIDEND_STATES = {RobinhoodDividendStatus.PENDING.value}
+# Dividend states counted towards the amount paid to date
+PAID_DIVIDEND_STATES = {RobinhoodDividendStatus.PAID.value, RobinhoodDividendStatus.REINVESTED.value}
+
+
+# Fundamentals cache time-to-live, in seconds. Fields not listed expire after the default TTL.
+SECONDS_IN_DAY = 24 * 60 * 60
+DEFAULT_FUNDAMENTALS_TTL = SECONDS_IN_DAY
+FUNDAMENTALS_FIELD_TTLS = {
+    RobinhoodApiData.INSTRUMENT.value.name: 7 * SECONDS_IN_DAY,
+    RobinhoodApiData.SYMBOL.value.name: 7 * SECONDS_IN_DAY,
+    RobinhoodApiData.DESCRIPTION.value.name: 7 * SECONDS_IN_DAY,
+    RobinhoodApiData.SECTOR.value.name: 7 * SECONDS_IN_DAY,
+    RobinhoodApiData.INDUSTRY.value.name: 7 * SECONDS_IN_DAY,
+}
+# Instruments rarely change, but symbols and names do after e.g. a rebrand, so index entries are refreshed monthly
+INSTRUMENT_INDEX_TTL = 30 * SECONDS_IN_DAY
+
+
+class RobinhoodSessionKeys(StrEnum):
+    ACCESS_TOKEN = "access_token"
+    REFRESH_TOKEN = "refresh_token"
+    TOKEN_TYPE = "token_type"
+    DEVICE_TOKEN = "device_token"
+    EXPIRES_IN = "expires_in"
+    EXPIRES_AT = "expires_at"
@@ -0,0 +1,17 @@
+from enum import StrEnum
+
+
+class OutputSinkType(StrEnum):
+    SHEETS = "sheets"
+    CSV = "csv"
+    PARQUET = "parquet"
+    SQLITE = "sqlite"
+
+
+DEFAULT_OUTPUT_SINKS = (OutputSinkType.SHEETS,)
+
+# File sinks write under the account's local storage directory, one file or table per worksheet
+EXPORTS_DIR_NAME = "exports"
+CSV_FILE_SUFFIX = ".csv"
+PARQUET_FILE_SUFFIX = ".parquet"
+SQLITE_EXPORT_FILE_NAME = "portfolio.sqlite"
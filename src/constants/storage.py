@@ -0,0 +1,38 @@
+from enum import StrEnum
+
+# Local on-disk storage used for caches and snapshots between runs
+LOCAL_STORAGE_DIR_ENV_VAR = "RH_LOCAL_STORAGE_DIR"
+DEFAULT_LOCAL_STORAGE_DIR = "data/cache"
+# On Lambda the task root is read-only, so the default moves under the temporary directory
+LAMBDA_LOCAL_STORAGE_DIR_NAME = "rh_cache"
+
+SHEET_SNAPSHOTS_DIR_NAME = "sheet_snapshots"
+DIVIDEND_STORE_FILE_NAME = "dividends.sqlite"
+FUNDAMENTALS_CACHE_FILE_NAME = "fundamentals.sqlite"
+INSTRUMENT_INDEX_FILE_NAME = "instruments.sqlite"
+SESSIONS_DIR_NAME = "sessions"
+# Data specific to one account lives under accounts/<namespace>/ when several accounts are exported
+ACCOUNTS_DIR_NAME = "accounts"
+
+# Append-only archive of exported portfolio frames, partitioned by portfolio and UTC date
+SNAPSHOT_ARCHIVE_DIR_NAME = "snapshot_archive"
+SNAPSHOT_PARTITION_PREFIX = "date="
+SNAPSHOT_FILE_SUFFIX = ".arrow"
+COMPACTED_SNAPSHOT_FILE_NAME = "compacted" + SNAPSHOT_FILE_SUFFIX
+# Column added to every archived row with the time the snapshot was taken
+SNAPSHOT_TIME_COLUMN = "snapshot_at"
+
+# Frames of the last full export, refreshed in place by price-only runs
+PORTFOLIO_CACHE_DIR_NAME = "portfolio_cache"
+PORTFOLIO_CACHE_FILE_SUFFIX = ".parquet"
+
+
+class SnapshotPortfolio(StrEnum):
+    STOCK = "stock"
+    ETF = "etf"
+    CRYPTO = "crypto"
+
+
+class CachedPortfolio(StrEnum):
+    ENRICHED = "enriched"
+    CRYPTO = "crypto"
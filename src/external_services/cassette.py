@@ -0,0 +1,169 @@
+"""
+Record/replay of external service calls. While a cassette is recording, every call made through a
+@recorded function is executed and its result stored; while it is replaying, results are served from
+the cassette and nothing goes over the network.
+"""
+
+import functools
+import gzip
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from src.constants.cassette import CASSETTE_FORMAT_VERSION, CassetteKeys, CassetteMode
+from src.constants.common import UTF_8
+from src.metrics import record_api_call
+
+
+class CassetteMissError(LookupError):
+    """
+    Raised when a replayed call was never recorded.
+    """
+
+
+class Cassette:
+    """
+    Recorded results of external calls, grouped by call name and matched on a hash of the call's arguments.
+    Calls with the same arguments are replayed in the order they were recorded, and the last one is
+    repeated once they run out, so the order of concurrent calls doesn't matter.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        mode: CassetteMode,
+        interactions: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+    ):
+        self.path = path
+        self.mode = mode
+        self.interactions = interactions or {}
+        self._replay_positions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str) -> "Cassette":
+        with gzip.open(path, "rt", encoding=UTF_8) as cassette_file:
+            data = json.load(cassette_file)
+        if data.get(CassetteKeys.VERSION) != CASSETTE_FORMAT_VERSION:
+            raise ValueError(
+                f"Cassette {path} has format version {data.get(CassetteKeys.VERSION)}, "
+                f"expected {CASSETTE_FORMAT_VERSION}. Record it again."
+            )
+        print(f"Replaying external calls from {path}, recorded at {data[CassetteKeys.RECORDED_AT]}")
+        return cls(path, CassetteMode.REPLAY, data[CassetteKeys.INTERACTIONS])
+
+    def save(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        data = {
+            CassetteKeys.VERSION.value: CASSETTE_FORMAT_VERSION,
+            CassetteKeys.RECORDED_AT.value: datetime.now(timezone.utc).isoformat(),
+            CassetteKeys.INTERACTIONS.value: self.interactions,
+        }
+        temp_path = self.path + ".tmp"
+        with gzip.open(temp_path, "wt", encoding=UTF_8) as cassette_file:
+            json.dump(data, cassette_file)
+        os.replace(temp_path, self.path)
+        recorded_calls = sum(len(calls) for calls in self.interactions.values())
+        print(f"Recorded {recorded_calls} external call(s) to {self.path}")
+
+    def play(self, call_name: str, key: str, call: Callable[[], Any], redact_result: bool = False) -> Any:
+        """
+        Run a call, or serve it from the cassette when replaying.
+        :param call_name: Name the call is recorded under
+        :param key: Hash of the call's arguments
+        :param call: Performs the real call
+        :param redact_result: Record None instead of the result, for results holding secrets
+        """
+        if self.mode == CassetteMode.REPLAY:
+            return self._replay(call_name, key)
+        result = call()
+        with self._lock:
+            self.interactions.setdefault(call_name, []).append(
+                {
+                    CassetteKeys.KEY.value: key,
+                    CassetteKeys.RESULT.value: None if redact_result else result,
+                }
+            )
+        return result
+
+    def _replay(self, call_name: str, key: str) -> Any:
+        with self._lock:
+            matches = [
+                interaction
+                for interaction in self.interactions.get(call_name, [])
+                if interaction[CassetteKeys.KEY] == key
+            ]
+            if not matches:
+                raise CassetteMissError(f"No recorded {call_name} call matches these arguments")
+            position_key = f"{call_name}:{key}"
+            position = self._replay_positions.get(position_key, 0)
+            self._replay_positions[position_key] = position + 1
+            return matches[min(position, len(matches) - 1)][CassetteKeys.RESULT]
+
+
+_active_cassette: Optional[Cassette] = None
+
+
+@contextmanager
+def use_cassette(path: str, mode: CassetteMode) -> Iterator[Cassette]:
+    """
+    Record or replay every @recorded call made inside the block. A recording is saved when the block exits.
+    """
+    global _active_cassette
+    cassette = Cassette.load(path) if mode == CassetteMode.REPLAY else Cassette(path, mode)
+    previous_cassette, _active_cassette = _active_cassette, cassette
+    try:
+        yield cassette
+        if mode == CassetteMode.RECORD:
+            cassette.save()
+    finally:
+        _active_cassette = previous_cassette
+
+
+def get_call_key(arguments: Any) -> str:
+    return hashlib.sha256(
+        json.dumps(arguments, sort_keys=True, default=str).encode(UTF_8)
+    ).hexdigest()
+
+
+def recorded(
+    call_name: str,
+    is_method: bool = False,
+    match_arguments: bool = True,
+    redact_result: bool = False,
+):
+    """
+    Decorator for functions that call an external service, so they can be recorded and replayed
+    and are counted in the run metrics. Results must be JSON serializable.
+    :param call_name: Name the calls are recorded under
+    :param is_method: Leave the instance out of the arguments the call is matched on
+    :param match_arguments: Match calls on their arguments. Disable for calls whose arguments vary between
+                            runs but whose results don't matter, e.g. writes.
+    :param redact_result: Don't store the result, for calls that return secrets such as session tokens
+    """
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            cassette = _active_cassette
+            key_args = args[1:] if is_method else args
+            if cassette is None:
+                result = func(*args, **kwargs)
+            else:
+                key = get_call_key([key_args, kwargs] if match_arguments else None)
+                result = cassette.play(
+                    call_name, key, lambda: func(*args, **kwargs), redact_result=redact_result
+                )
+            # Payload bytes are counted by the HTTP transport, which sees the actual request and response sizes
+            record_api_call()
+            return result
+
+        return wrapper
+
+    return decorator
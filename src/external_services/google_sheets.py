@@ -1,23 +1,336 @@
-import pygsheets
+import threading
 import pandas as pd
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextvars import copy_context
+from dataclasses import asdict, dataclass
+from functools import cache
+from typing import Any, Dict, List, Optional, Tuple
 
-from src.constants.gsheets import DEFAULT_SPREADSHEET_NAME, SHEETS_AUTHENTICATION_FILE
+from src.constants.gsheets import (
+    BATCH_UPDATE_RESPONSE_FIELDS,
+    BULK_WRITE_CHUNK_ROWS,
+    BULK_WRITE_MIN_ROWS,
+    DEFAULT_BULK_WRITE_PARALLEL_CHUNKS,
+    DEFAULT_SPREADSHEET_NAME,
+    INCREMENTAL_FULL_REWRITE_RATIO,
+    SHEETS_AUTHENTICATION_FILE,
+)
+from src.gsheets_util import (
+    build_clear_request,
+    build_resize_request,
+    build_update_cells_request,
+    dataframe_to_grid,
+    diff_grids,
+    iter_grid_chunks,
+    rows_to_grid,
+)
+from src.external_services.cassette import recorded
+from src.lazy_import import LazyModule
+from src.metrics import record_rows, track_stage
+from src.local_storage.sheet_snapshots import SheetSnapshotStore
 
+pygsheets = LazyModule("pygsheets")
+http_transport = LazyModule("src.external_services.http_transport")
 
-def write_to_sheets(
-    write_data: pd.DataFrame,
-    worksheet_name: str,
-    spreadsheet_name: str = DEFAULT_SPREADSHEET_NAME,
-):
-    # Login/Authenticate
-    print("Authenticating to Google Sheets")
-    gc = pygsheets.authorize(service_account_file=SHEETS_AUTHENTICATION_FILE)
 
-    print("Open sheet to edit")
-    sheet = gc.open(spreadsheet_name)
-    worksheet = sheet.worksheet_by_title(worksheet_name)
-    worksheet.clear()
+@dataclass
+class WorksheetInfo:
+    sheet_id: int
+    title: str
+    row_count: int
+    column_count: int
 
-    print("Writing to sheet")
-    worksheet.set_dataframe(write_data, (1, 1), copy_index=False, copy_head=True)
-    print("Updated Google sheet successfully")
+
+class SheetsWriter:
+    """
+    Google Sheets writer that authorizes once and caches spreadsheet and worksheet handles,
+    so several tabs can be replaced with a single batch update.
+    In incremental mode only the cells that differ from the last written snapshot are sent.
+    Other writes only drop the snapshots they make stale, so they never write to local storage.
+    """
+
+    def __init__(
+        self,
+        service_account_file: str = SHEETS_AUTHENTICATION_FILE,
+        incremental: bool = False,
+        snapshot_store: Optional[SheetSnapshotStore] = None,
+    ):
+        self.service_account_file = service_account_file
+        self.incremental = incremental
+        self._snapshot_store = snapshot_store
+        self._client = None
+        self._spreadsheets: Dict[str, "pygsheets.Spreadsheet"] = {}
+        self._worksheets: Dict[Tuple[str, str], WorksheetInfo] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def snapshot_store(self) -> SheetSnapshotStore:
+        if self._snapshot_store is None:
+            self._snapshot_store = SheetSnapshotStore()
+        return self._snapshot_store
+
+    def _save_snapshot(self, spreadsheet_name: str, worksheet: WorksheetInfo, grid: List[List[Dict[str, Any]]]) -> None:
+        """
+        Keep the grid written to a worksheet for the next incremental write. Outside of incremental mode,
+        any earlier snapshot is dropped instead, since it no longer matches the worksheet.
+        """
+        if self.incremental:
+            self.snapshot_store.save(spreadsheet_name, worksheet.sheet_id, grid)
+        else:
+            self.snapshot_store.delete(spreadsheet_name, worksheet.sheet_id)
+
+    @recorded("sheets.authorize", is_method=True, redact_result=True)
+    def authorize(self) -> "pygsheets.client.Client":
+        with self._lock:
+            if self._client is None:
+                print("Authenticating to Google Sheets")
+                # The Google API calls share one pooled, thread-safe transport instead of an httplib2.Http
+                self._client = pygsheets.authorize(
+                    service_account_file=self.service_account_file,
+                    http=http_transport.get_pooled_http(),
+                )
+            return self._client
+
+    def get_spreadsheet(self, spreadsheet_name: str) -> "pygsheets.Spreadsheet":
+        client = self._client or self.authorize()
+        with self._lock:
+            if spreadsheet_name not in self._spreadsheets:
+                print(f"Opening spreadsheet {spreadsheet_name}")
+                self._spreadsheets[spreadsheet_name] = client.open(spreadsheet_name)
+            return self._spreadsheets[spreadsheet_name]
+
+    @recorded("sheets.worksheet_by_title", is_method=True)
+    def fetch_worksheet_properties(self, worksheet_name: str, spreadsheet_name: str) -> Dict[str, Any]:
+        worksheet = self.get_spreadsheet(spreadsheet_name).worksheet_by_title(worksheet_name)
+        return asdict(
+            WorksheetInfo(
+                sheet_id=worksheet.id,
+                title=worksheet_name,
+                row_count=worksheet.rows,
+                column_count=worksheet.cols,
+            )
+        )
+
+    def get_worksheet(self, worksheet_name: str, spreadsheet_name: str) -> WorksheetInfo:
+        key = (spreadsheet_name, worksheet_name)
+        if key not in self._worksheets:
+            worksheet = WorksheetInfo(**self.fetch_worksheet_properties(worksheet_name, spreadsheet_name))
+            with self._lock:
+                self._worksheets.setdefault(key, worksheet)
+        return self._worksheets[key]
+
+    @recorded("sheets.batch_update", is_method=True, match_arguments=False)
+    def send_batch_update(self, requests: List[Dict[str, Any]], spreadsheet_name: str) -> Dict[str, Any]:
+        return self.get_spreadsheet(spreadsheet_name).custom_request(
+            requests, fields=BATCH_UPDATE_RESPONSE_FIELDS
+        )
+
+    def _build_write_requests(
+        self,
+        worksheet: WorksheetInfo,
+        grid: List[List[Dict[str, Any]]],
+        previous_grid: Optional[List[List[Dict[str, Any]]]],
+    ) -> List[Dict[str, Any]]:
+        """
+        Build the requests that make a worksheet show the given grid.
+        Returns an empty list when the worksheet already matches its last snapshot.
+        """
+        if self.incremental and previous_grid is not None:
+            changes = diff_grids(previous_grid, grid)
+            if not changes:
+                return []
+            changed_cells = sum(len(cells) for _, _, cells in changes)
+            total_cells = sum(len(row) for row in grid)
+            if changed_cells <= INCREMENTAL_FULL_REWRITE_RATIO * total_cells:
+                return [
+                    build_update_cells_request(worksheet.sheet_id, [cells], row_index, column_index)
+                    for row_index, column_index, cells in changes
+                ]
+        return [
+            build_clear_request(worksheet.sheet_id),
+            build_update_cells_request(worksheet.sheet_id, grid),
+        ]
+
+    def write_dataframes(
+        self,
+        frames: Dict[str, pd.DataFrame],
+        spreadsheet_name: str = DEFAULT_SPREADSHEET_NAME,
+    ) -> None:
+        """
+        Update several worksheets with one batch update request.
+        Worksheets of at least BULK_WRITE_MIN_ROWS rows are written separately, in chunks.
+        :param frames: Dictionary mapping worksheet name to the DataFrame written to it
+        :param spreadsheet_name: Name of the spreadsheet containing the worksheets
+        """
+        for worksheet_name, frame in frames.items():
+            if len(frame) >= BULK_WRITE_MIN_ROWS:
+                self.write_dataframe_in_chunks(worksheet_name, frame, spreadsheet_name)
+        frames = {
+            worksheet_name: frame
+            for worksheet_name, frame in frames.items()
+            if len(frame) < BULK_WRITE_MIN_ROWS
+        }
+        if not frames:
+            return
+
+        requests = []
+        resized = []
+        written = []
+        for worksheet_name, frame in frames.items():
+            with track_stage(worksheet_name):
+                worksheet = self.get_worksheet(worksheet_name, spreadsheet_name)
+                grid = dataframe_to_grid(frame)
+                previous_grid = (
+                    self.snapshot_store.load(spreadsheet_name, worksheet.sheet_id) if self.incremental else None
+                )
+                write_requests = self._build_write_requests(worksheet, grid, previous_grid)
+                record_rows(len(frame))
+            if not write_requests:
+                print(f"No changes in {worksheet_name}, skipping write")
+                continue
+
+            row_count = max(worksheet.row_count, len(grid))
+            column_count = max(worksheet.column_count, len(frame.columns))
+            if (row_count, column_count) != (worksheet.row_count, worksheet.column_count):
+                requests.append(build_resize_request(worksheet.sheet_id, row_count, column_count))
+                resized.append((worksheet, row_count, column_count))
+            requests.extend(write_requests)
+            written.append((worksheet, grid))
+
+        if not requests:
+            print("Google sheet is already up to date")
+            return
+
+        print(f"Writing {len(written)} worksheet(s) to sheet in one batch update")
+        with track_stage("batch_update"):
+            self.send_batch_update(requests, spreadsheet_name)
+        for worksheet, row_count, column_count in resized:
+            worksheet.row_count, worksheet.column_count = row_count, column_count
+        for worksheet, grid in written:
+            self._save_snapshot(spreadsheet_name, worksheet, grid)
+        print("Updated Google sheet successfully")
+
+    def write_columns(
+        self,
+        frames: Dict[str, pd.DataFrame],
+        columns: Dict[str, List[str]],
+        spreadsheet_name: str = DEFAULT_SPREADSHEET_NAME,
+    ) -> None:
+        """
+        Update some columns of several worksheets with one batch update request, leaving the other cells alone.
+        The worksheets must already have the frames' layout, i.e. the same columns and rows in the same order.
+        :param frames: Dictionary mapping worksheet name to its DataFrame
+        :param columns: Dictionary mapping worksheet name to the columns of its DataFrame to write
+        :param spreadsheet_name: Name of the spreadsheet containing the worksheets
+        """
+        requests = []
+        written = []
+        for worksheet_name, frame in frames.items():
+            column_names = [column for column in columns.get(worksheet_name, []) if column in frame.columns]
+            if not column_names:
+                continue
+            with track_stage(worksheet_name):
+                worksheet = self.get_worksheet(worksheet_name, spreadsheet_name)
+                updates = [
+                    (frame.columns.get_loc(column), rows_to_grid(frame[[column]])) for column in column_names
+                ]
+                # The header row is already there, so the values start on the second row
+                requests.extend(
+                    build_update_cells_request(worksheet.sheet_id, grid, 1, column_index)
+                    for column_index, grid in updates
+                )
+                record_rows(len(frame))
+            written.append((worksheet, updates))
+
+        if not requests:
+            print("No columns to update")
+            return
+
+        print(f"Updating {len(requests)} column(s) in {len(written)} worksheet(s) in one batch update")
+        with track_stage("batch_update"):
+            self.send_batch_update(requests, spreadsheet_name)
+        for worksheet, updates in written:
+            self._patch_snapshot(spreadsheet_name, worksheet, updates)
+        print("Updated Google sheet successfully")
+
+    def _patch_snapshot(
+        self,
+        spreadsheet_name: str,
+        worksheet: WorksheetInfo,
+        updates: List[Tuple[int, List[List[Dict[str, Any]]]]],
+    ) -> None:
+        """
+        Apply column updates to a worksheet's snapshot, so the next incremental write diffs against what
+        the worksheet shows. A snapshot that doesn't fit the updates, or any outside of incremental mode, is dropped instead.
+        """
+        grid = self.snapshot_store.load(spreadsheet_name, worksheet.sheet_id) if self.incremental else None
+        if grid is None:
+            self.snapshot_store.delete(spreadsheet_name, worksheet.sheet_id)
+            return
+        for column_index, column_grid in updates:
+            rows = grid[1:]
+            if len(rows) != len(column_grid) or any(len(row) <= column_index for row in rows):
+                self.snapshot_store.delete(spreadsheet_name, worksheet.sheet_id)
+                return
+            for row, (cell,) in zip(rows, column_grid):
+                row[column_index] = cell
+        self.snapshot_store.save(spreadsheet_name, worksheet.sheet_id, grid)
+
+    def write_dataframe_in_chunks(
+        self,
+        worksheet_name: str,
+        frame: pd.DataFrame,
+        spreadsheet_name: str = DEFAULT_SPREADSHEET_NAME,
+        chunk_rows: int = BULK_WRITE_CHUNK_ROWS,
+        max_parallel_chunks: int = DEFAULT_BULK_WRITE_PARALLEL_CHUNKS,
+    ) -> None:
+        """
+        Replace a large worksheet's contents chunk by chunk. The grid is cleared and resized to fit in one
+        request up front, then each chunk of rows is converted and sent in its own request, so at most
+        max_parallel_chunks + 1 chunks are held in memory. Numbers are sent as typed number values.
+        The worksheet's snapshot is dropped rather than kept in memory, so its next incremental write
+        is a full rewrite.
+        :param worksheet_name: Name of the worksheet
+        :param frame: DataFrame written to it
+        :param spreadsheet_name: Name of the spreadsheet containing the worksheet
+        :param chunk_rows: Rows sent per request
+        :param max_parallel_chunks: Chunks uploaded at the same time
+        """
+        with track_stage(worksheet_name):
+            worksheet = self.get_worksheet(worksheet_name, spreadsheet_name)
+            row_count = max(worksheet.row_count, len(frame) + 1)
+            column_count = max(worksheet.column_count, len(frame.columns))
+            prepare_requests = [build_clear_request(worksheet.sheet_id)]
+            if (row_count, column_count) != (worksheet.row_count, worksheet.column_count):
+                prepare_requests.insert(
+                    0, build_resize_request(worksheet.sheet_id, row_count, column_count)
+                )
+            self.send_batch_update(prepare_requests, spreadsheet_name)
+            worksheet.row_count, worksheet.column_count = row_count, column_count
+
+            print(f"Writing {len(frame)} rows to {worksheet_name} in chunks of {chunk_rows}")
+            with ThreadPoolExecutor(max_workers=max_parallel_chunks) as executor:
+                pending = set()
+                for row_index, grid in iter_grid_chunks(frame, chunk_rows):
+                    if len(pending) >= max_parallel_chunks:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            future.result()
+                    pending.add(
+                        executor.submit(
+                            copy_context().run,
+                            self.send_batch_update,
+                            [build_update_cells_request(worksheet.sheet_id, grid, row_index)],
+                            spreadsheet_name,
+                        )
+                    )
+                for future in wait(pending).done:
+                    future.result()
+            record_rows(len(frame))
+        self.snapshot_store.delete(spreadsheet_name, worksheet.sheet_id)
+        print(f"Updated {worksheet_name} successfully")
+
+
+@cache
+def get_sheets_writer(incremental: bool = False) -> SheetsWriter:
+    return SheetsWriter(incremental=incremental)
@@ -0,0 +1,137 @@
+"""
+Shared HTTP transport: requests sessions with sized keep-alive connection pools and gzip negotiation.
+Robinhood's sessions are configured in place, and the Google Sheets client gets an httplib2-compatible
+wrapper around a pooled session, so concurrent requests reuse warm TLS connections instead of
+opening a new one each.
+"""
+
+import socket
+import threading
+from functools import cache
+from typing import Any, Dict, Optional, Tuple
+
+import httplib2
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.constants.http_transport import (
+    ENCODED_BODY_HEADERS,
+    HTTP_PREFIXES,
+    POOL_BLOCK,
+    POOL_CONNECTIONS,
+    POOL_MAXSIZE,
+    TRANSPORT_HEADERS,
+)
+from src.metrics import record_payload_bytes
+
+_configure_lock = threading.Lock()
+
+
+class PooledAdapter(HTTPAdapter):
+    """
+    Transport adapter keeping up to POOL_MAXSIZE connections alive per host.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault("pool_connections", POOL_CONNECTIONS)
+        kwargs.setdefault("pool_maxsize", POOL_MAXSIZE)
+        kwargs.setdefault("pool_block", POOL_BLOCK)
+        super().__init__(**kwargs)
+
+    def send(self, request: "requests.PreparedRequest", stream: bool = False, **kwargs) -> "requests.Response":
+        response = super().send(request, stream=stream, **kwargs)
+        record_payload_bytes(get_request_bytes(request) + get_response_bytes(response, stream))
+        return response
+
+
+def get_request_bytes(request: "requests.PreparedRequest") -> int:
+    # Streamed bodies, e.g. file uploads, aren't counted
+    return len(request.body) if isinstance(request.body, (bytes, str)) else 0
+
+
+def get_response_bytes(response: "requests.Response", stream: bool) -> int:
+    """
+    Size of a response body: its Content-Length, which is the compressed size for gzipped responses,
+    or else the length of the body that was read. Streamed bodies aren't read just to count them.
+    """
+    content_length = response.headers.get("Content-Length")
+    if content_length and content_length.isdigit():
+        return int(content_length)
+    return 0 if stream else len(response.content)
+
+
+def configure_session(session: "requests.Session") -> "requests.Session":
+    """
+    Mount pooled adapters on a session and ask for kept-alive, compressed responses.
+    Adapters mounted on more specific URL prefixes, e.g. the rate limited one, keep precedence.
+    Does nothing if the session is already configured.
+    """
+    with _configure_lock:
+        if not all(isinstance(session.adapters.get(prefix), PooledAdapter) for prefix in HTTP_PREFIXES):
+            session.headers.update(TRANSPORT_HEADERS)
+            for prefix in HTTP_PREFIXES:
+                session.mount(prefix, PooledAdapter())
+    return session
+
+
+def create_session() -> "requests.Session":
+    return configure_session(requests.Session())
+
+
+class PooledHttp:
+    """
+    Stand-in for httplib2.Http that sends requests through a pooled requests session. Unlike httplib2.Http,
+    it is safe to share between threads. Errors are raised as the built-in exceptions the Google API client retries.
+    """
+
+    def __init__(self, session: Optional["requests.Session"] = None, timeout: Optional[float] = None):
+        self.session = session or create_session()
+        self.timeout = timeout
+        self.follow_redirects = True
+        self.redirect_codes = frozenset({300, 301, 302, 303, 307, 308})
+        # Connections are pooled by the session, not per Http object
+        self.connections: Dict[str, Any] = {}
+
+    def request(
+        self,
+        uri: str,
+        method: str = "GET",
+        body: Any = None,
+        headers: Optional[Dict[str, str]] = None,
+        redirections: int = httplib2.DEFAULT_MAX_REDIRECTS,
+        connection_type: Any = None,
+    ) -> Tuple["httplib2.Response", bytes]:
+        try:
+            response = self.session.request(
+                method,
+                uri,
+                data=body,
+                headers=headers,
+                timeout=self.timeout,
+                allow_redirects=self.follow_redirects and redirections > 0,
+            )
+        except requests.Timeout as error:
+            raise socket.timeout(str(error)) from error
+        except requests.ConnectionError as error:
+            raise ConnectionError(str(error)) from error
+
+        info = {
+            name.lower(): value
+            for name, value in response.headers.items()
+            if name.lower() not in ENCODED_BODY_HEADERS
+        }
+        info["status"] = str(response.status_code)
+        http_response = httplib2.Response(info)
+        http_response.reason = response.reason
+        return http_response, response.content
+
+    def close(self) -> None:
+        self.session.close()
+
+
+@cache
+def get_pooled_http() -> PooledHttp:
+    """
+    Pooled transport shared by every Google API client in the process.
+    """
+    return PooledHttp()
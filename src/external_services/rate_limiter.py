@@ -0,0 +1,188 @@
+"""
+Client-side throttling and retries for the Robinhood API. Every request sent through a session with the
+RateLimitedAdapter mounted waits for a token from a shared adaptive token bucket and for a free slot on
+its endpoint. Throttled and failed requests are retried with jittered exponential backoff.
+"""
+
+import random
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from functools import cache
+from typing import Dict, Iterator, Optional
+from urllib.parse import urlsplit
+
+import requests
+
+from src.constants.rate_limit import (
+    DEFAULT_RATE_LIMIT_SETTINGS,
+    IDEMPOTENT_METHODS,
+    RETRY_AFTER_HEADER,
+    ROBINHOOD_API_URL,
+    THROTTLED_STATUS_CODE,
+    RateLimitSettings,
+)
+from src.external_services.http_transport import PooledAdapter
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Seconds to wait according to a Retry-After header, given either as seconds or as an HTTP date.
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def get_backoff_delay(attempt: int, settings: RateLimitSettings, retry_after: Optional[float] = None) -> float:
+    """
+    Delay before retrying: exponential backoff with full jitter, but never shorter than the server asked for.
+    :param attempt: Number of the retry, starting at 0
+    """
+    delay = random.uniform(0, min(settings.max_backoff, settings.base_backoff * 2**attempt))
+    return max(delay, retry_after or 0.0)
+
+
+def get_endpoint(url: str) -> str:
+    """
+    Endpoint a request is capped under: the first segment of its path, e.g. "quotes".
+    """
+    return urlsplit(url).path.strip("/").split("/", 1)[0]
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket whose rate adapts to the server: it creeps up while requests succeed and is cut whenever
+    one is throttled (additive increase, multiplicative decrease), so it settles just under the real limit.
+    A throttled response also pauses every request until its Retry-After has passed.
+    """
+
+    def __init__(self, settings: RateLimitSettings = DEFAULT_RATE_LIMIT_SETTINGS):
+        self.settings = settings
+        self.rate = settings.initial_rate
+        self._tokens = float(settings.burst)
+        self._updated_at = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self._endpoint_slots: Dict[str, threading.BoundedSemaphore] = {}
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.settings.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def acquire(self) -> None:
+        """
+        Block until a request may be sent.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._paused_until and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = max(self._paused_until - now, (1 - self._tokens) / self.rate)
+            time.sleep(wait)
+
+    @contextmanager
+    def endpoint_slot(self, endpoint: str) -> Iterator[None]:
+        """
+        Hold one of the endpoint's concurrency slots for the duration of a request.
+        """
+        with self._lock:
+            if endpoint not in self._endpoint_slots:
+                limit = self.settings.endpoint_concurrency.get(
+                    endpoint, self.settings.default_endpoint_concurrency
+                )
+                self._endpoint_slots[endpoint] = threading.BoundedSemaphore(limit)
+            slot = self._endpoint_slots[endpoint]
+        with slot:
+            yield
+
+    def on_success(self) -> None:
+        with self._lock:
+            # Grows by additive_increase per second's worth of requests at the current rate
+            self.rate = min(self.settings.max_rate, self.rate + self.settings.additive_increase / self.rate)
+
+    def on_throttled(self, retry_after: Optional[float] = None) -> None:
+        with self._lock:
+            self.rate = max(self.settings.min_rate, self.rate * self.settings.multiplicative_decrease)
+            self._tokens = min(self._tokens, 0.0)
+            if retry_after:
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+
+
+class RateLimitedAdapter(PooledAdapter):
+    """
+    Pooled transport adapter sending each request through the rate limiter and retrying it when it is throttled,
+    hits a transient server error or fails to connect. Only idempotent requests are retried after server
+    and connection errors. The last response is returned once the retries run out.
+    """
+
+    def __init__(self, rate_limiter: AdaptiveRateLimiter, **kwargs):
+        super().__init__(**kwargs)
+        self.rate_limiter = rate_limiter
+
+    def send(self, request: "requests.PreparedRequest", **kwargs) -> "requests.Response":
+        settings = self.rate_limiter.settings
+        endpoint = get_endpoint(request.url)
+        is_idempotent = request.method in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire()
+            try:
+                with self.rate_limiter.endpoint_slot(endpoint):
+                    response = super().send(request, **kwargs)
+            except requests.ConnectionError:
+                if not is_idempotent or attempt >= settings.max_retries:
+                    raise
+                delay = get_backoff_delay(attempt, settings)
+                print(f"Connection to {endpoint} failed, retrying in {delay:.1f}s")
+            else:
+                is_throttled = response.status_code == THROTTLED_STATUS_CODE
+                is_server_error = is_idempotent and response.status_code in settings.retryable_status_codes
+                if not (is_throttled or is_server_error) or attempt >= settings.max_retries:
+                    if not is_throttled:
+                        self.rate_limiter.on_success()
+                    return response
+                retry_after = parse_retry_after(response.headers.get(RETRY_AFTER_HEADER))
+                if is_throttled:
+                    self.rate_limiter.on_throttled(retry_after)
+                delay = get_backoff_delay(attempt, settings, retry_after)
+                print(
+                    f"Robinhood returned {response.status_code} for {endpoint}, retrying in {delay:.1f}s "
+                    f"at {self.rate_limiter.rate:.1f} requests/s"
+                )
+                response.close()
+            time.sleep(delay)
+            attempt += 1
+
+
+@cache
+def get_rate_limiter() -> AdaptiveRateLimiter:
+    """
+    Rate limiter shared by every session in the process, since Robinhood's limits aren't per session.
+    """
+    return AdaptiveRateLimiter()
+
+
+def install_rate_limiting(
+    session: "requests.Session",
+    url_prefix: str = ROBINHOOD_API_URL,
+    rate_limiter: Optional[AdaptiveRateLimiter] = None,
+) -> None:
+    """
+    Send the session's requests to URLs under url_prefix through the rate limiter. Does nothing if the
+    session already has a rate limited adapter for that prefix.
+    :param rate_limiter: Defaults to the shared rate limiter
+    """
+    if not isinstance(session.adapters.get(url_prefix), RateLimitedAdapter):
+        session.mount(url_prefix, RateLimitedAdapter(rate_limiter or get_rate_limiter()))
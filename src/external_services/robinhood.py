@@ -1,23 +1,45 @@
 import os
-import robin_stocks.robinhood as rh
-import pyotp
-import time
 import json
-from typing import Dict, Any, List
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from typing import Dict, Any, Iterable, List, Optional
 from functools import cache
 
-from src.aws_utilities.kms_decryption import is_base64, decrypt_kms_value
-from src.constants.additional_columns import ColumnNames
+from src.aws_utilities.kms_decryption import CredentialsProvider
+from src.external_services.cassette import recorded
+from src.external_services.robinhood_accounts import get_current_account
+from src.external_services.robinhood_session import login_with_cached_session
+from src.lazy_import import LazyModule
+from src.local_storage.fundamentals_cache import FundamentalsCache
+from src.local_storage.instrument_index import InstrumentIndex
 from src.constants.robinhood import (
     RH_EMAIL_ENV_VAR,
     RH_PASSWORD_ENV_VAR,
     RH_OTP_KEY_ENV_VAR,
+    AccountConfigKeys,
+    RobinhoodAccount,
     RobinhoodCredentials,
     ACCOUNT_BUYING_POWER,
+    CRYPTO_QUOTE_CURRENCY,
+    MAX_CONCURRENT_CRYPTO_QUOTES,
+    MAX_SYMBOLS_PER_REQUEST,
     CryptoDataKeys,
     RobinhoodApiData,
+    RobinhoodInstrumentKeys,
+    RobinhoodPaginationKeys,
+    RobinhoodPositionKeys,
+    RobinhoodQuoteKeys,
 )
 
+rh = LazyModule("robin_stocks.robinhood")
+http_transport = LazyModule("src.external_services.http_transport")
+rate_limiter = LazyModule("src.external_services.rate_limiter")
+
+
+@cache
+def get_credentials_provider() -> CredentialsProvider:
+    return CredentialsProvider()
+
 
 def get_credentials() -> RobinhoodCredentials:
     print("Getting credentials from environment variables.")
@@ -25,49 +47,120 @@ def get_credentials() -> RobinhoodCredentials:
     rh_password = os.getenv(RH_PASSWORD_ENV_VAR)
     rh_otp_key = os.getenv(RH_OTP_KEY_ENV_VAR)
 
-    if not any([rh_email, rh_password, rh_otp_key]):
-        raise EnvironmentError(
-            f"Missing required environment variables: {[RH_EMAIL_ENV_VAR, RH_PASSWORD_ENV_VAR, RH_OTP_KEY_ENV_VAR]}"
+    # All three are needed to log in, so a partial configuration fails here rather than halfway through the login
+    required = {RH_EMAIL_ENV_VAR: rh_email, RH_PASSWORD_ENV_VAR: rh_password, RH_OTP_KEY_ENV_VAR: rh_otp_key}
+    missing = [name for name, value in required.items() if not value]
+    if missing:
+        raise EnvironmentError(f"Missing required environment variables: {missing}")
+
+    # Encrypted values are decrypted in one concurrent pass and cached across warm invocations
+    credentials = get_credentials_provider().resolve([rh_email, rh_password, rh_otp_key])
+    return RobinhoodCredentials(*credentials)
+
+
+def load_accounts(account_configs: List[Dict[str, str]]) -> List[RobinhoodAccount]:
+    """
+    Build the accounts of a multi-account export. The secrets of every account are decrypted in one concurrent pass.
+    :param account_configs: One dictionary per account with its name, email, password, OTP key and spreadsheet name.
+                            Secrets may be KMS-encrypted.
+    :return: List of accounts
+    """
+    secret_keys = [AccountConfigKeys.EMAIL, AccountConfigKeys.PASSWORD, AccountConfigKeys.OTP_KEY]
+    for config in account_configs:
+        missing = [key.value for key in AccountConfigKeys if not config.get(key)]
+        if missing:
+            raise ValueError(f"Account config {config.get(AccountConfigKeys.NAME)} is missing {missing}")
+    names = [config[AccountConfigKeys.NAME] for config in account_configs]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Account names must be unique: {names}")
+
+    secrets = get_credentials_provider().resolve(
+        [config[key] for config in account_configs for key in secret_keys]
+    )
+    return [
+        RobinhoodAccount(
+            name=config[AccountConfigKeys.NAME],
+            credentials=RobinhoodCredentials(*secrets[index * len(secret_keys) : (index + 1) * len(secret_keys)]),
+            spreadsheet_name=config[AccountConfigKeys.SPREADSHEET_NAME],
         )
+        for index, config in enumerate(account_configs)
+    ]
 
-    credentials = []
-    for secret_value in [rh_email, rh_password, rh_otp_key]:
-        if is_base64(secret_value) and len(secret_value) > 16:
-            # If the value appears to be base64-encoded (likely encrypted), decrypt it
-            print("Encrypted value detected, attempting to decrypt...")
-            decrypted_value = decrypt_kms_value(secret_value)
-            credentials.append(decrypted_value)
-            print(f"Decryption successful")
-        else:
-            # If it's not encrypted, just use the plain text value
-            credentials.append(secret_value)
 
-    return RobinhoodCredentials(*credentials)
+def login() -> Dict[str, Any]:
+    """
+    Log in the account active in the current context, or the one configured in environment variables.
+    Each account logs in once per process. Its requests go through pooled keep-alive connections
+    and are throttled by the shared rate limiter.
+    """
+    http_transport.configure_session(rh.helper.SESSION)
+    rate_limiter.install_rate_limiting(rh.helper.SESSION)
+    account = get_current_account()
+    return login_account(account.name if account else None)
 
 
 @cache
-def login() -> Dict[str, Any]:
-    credentials = get_credentials()
-    totp = pyotp.TOTP(credentials.otp_key).now()
-    print(f"OTP: {totp}")
+@recorded("robinhood.login", redact_result=True)
+def login_account(account_name: Optional[str]) -> Dict[str, Any]:
+    account = get_current_account()
+    credentials = account.credentials if account else get_credentials()
+    return login_with_cached_session(credentials)
+
+
+@recorded("robinhood.get_open_stock_positions")
+def fetch_positions() -> List[Optional[Dict[str, Any]]]:
+    return rh.account.get_open_stock_positions()
+
 
-    login_obj = rh.login(
-        credentials.email, credentials.password, mfa_code=totp, store_session=False
+@recorded("robinhood.get_instruments")
+def fetch_instruments(instrument_ids: List[str]) -> List[Optional[Dict[str, Any]]]:
+    return rh.helper.request_get(
+        rh.urls.instruments_url(), "pagination", {"ids": ",".join(instrument_ids)}
     )
 
-    return login_obj
+
+@recorded("robinhood.get_quotes")
+def fetch_quotes(symbols: List[str]) -> List[Optional[Dict[str, Any]]]:
+    return rh.stocks.get_quotes(symbols)
+
+
+@recorded("robinhood.get_fundamentals")
+def fetch_fundamentals(tickers: List[str]) -> List[Optional[Dict[str, Any]]]:
+    return rh.get_fundamentals(tickers)
+
+
+@recorded("robinhood.request_get")
+def fetch_page(url: str) -> Optional[Dict[str, Any]]:
+    return rh.helper.request_get(url)
+
+
+@recorded("robinhood.load_account_profile")
+def fetch_account_profile() -> Dict[str, Any]:
+    return rh.profiles.load_account_profile()
+
+
+@recorded("robinhood.get_crypto_positions")
+def fetch_crypto_positions() -> List[Dict[str, Any]]:
+    return rh.crypto.get_crypto_positions()
+
+
+@recorded("robinhood.get_crypto_currency_pairs")
+def fetch_crypto_currency_pairs() -> List[Dict[str, Any]]:
+    return rh.crypto.get_crypto_currency_pairs()
+
+
+@recorded("robinhood.get_crypto_quote")
+def fetch_crypto_quote(currency_pair_id: str) -> Optional[Dict[str, Any]]:
+    return rh.crypto.get_crypto_quote_from_id(currency_pair_id)
 
 
 def get_rh_portfolio(is_live=False, write_to_mock=False) -> Dict[str, Dict[str, Any]]:
     if is_live:
         login()
 
-        start = time.time()
         print("Sending request to get current portfolio.")
-        my_stocks = rh.build_holdings(with_dividends=True)
+        my_stocks = build_stock_holdings()
         print("Successfully retrieved current portfolio.")
-        end = time.time()
-        print(f"Time taken to fetch portfolio: {end - start} seconds")
 
         if write_to_mock:
             print("Writing portfolio to mock holdings file")
@@ -81,59 +174,205 @@ def get_rh_portfolio(is_live=False, write_to_mock=False) -> Dict[str, Dict[str,
         return portfolio
 
 
-def get_stock_fundamentals(tickers: List[str]) -> List[Dict[str, Any]]:
+def get_batches(items: List[Any], batch_size: int = MAX_SYMBOLS_PER_REQUEST) -> List[List[Any]]:
+    return [items[start : start + batch_size] for start in range(0, len(items), batch_size)]
+
+
+def get_instrument_id(instrument_url: str) -> str:
+    # Instrument URLs end with the instrument's id: https://api.robinhood.com/instruments/<id>/
+    return instrument_url.rstrip("/").rsplit("/", 1)[-1]
+
+
+def get_instruments(instrument_urls: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Resolve instrument URLs to their id, symbol, name and type through the local instrument index.
+    Instruments missing from the index are fetched in batched requests and added to it.
+    :param instrument_urls: Instrument URLs, e.g. of positions
+    :return: Dictionary mapping URL to its index entry, without URLs Robinhood doesn't know
+    """
+    instrument_index = InstrumentIndex()
+    instruments = instrument_index.get_by_urls(instrument_urls)
+    missing_urls = [url for url in dict.fromkeys(instrument_urls) if url not in instruments]
+    print(f"Instrument index hits: {len(instruments)}, misses: {len(missing_urls)}")
+
+    if missing_urls:
+        login()
+        instrument_ids = [get_instrument_id(url) for url in missing_urls]
+        instruments.update(
+            instrument_index.put(
+                instrument
+                for batch in get_batches(instrument_ids)
+                for instrument in fetch_instruments(batch) or []
+            )
+        )
+    return instruments
+
+
+def get_quotes(symbols: List[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Get the latest quotes of stock symbols in batched multi-symbol requests.
+    :return: Dictionary mapping symbol to its quote, without symbols Robinhood couldn't quote
+    """
+    return {
+        quote[RobinhoodQuoteKeys.SYMBOL]: quote
+        for batch in get_batches(list(dict.fromkeys(symbols)))
+        for quote in fetch_quotes(batch) or []
+        if quote
+    }
+
+
+def get_quote_price(quote: Dict[str, Any]) -> str:
+    # Same price as rh.build_holdings: the extended hours trade when there was one
+    return quote[RobinhoodQuoteKeys.LAST_EXTENDED_HOURS_TRADE_PRICE] or quote[RobinhoodQuoteKeys.LAST_TRADE_PRICE]
+
+
+def get_latest_prices(symbols: List[str]) -> Dict[str, str]:
+    """
+    Get the latest price of stock symbols, in as few requests as get_quotes.
+    :return: Dictionary mapping symbol to its price as quoted, without symbols Robinhood couldn't quote
+    """
     login()
-    fundamentals = rh.get_fundamentals(tickers)
-    return fundamentals
+    return {symbol: get_quote_price(quote) for symbol, quote in get_quotes(symbols).items()}
+
+
+def build_stock_holdings() -> Dict[str, Dict[str, Any]]:
+    """
+    Build the account's stock holdings in a fixed few round trips: the open positions in one paginated
+    request, then their quotes in batched multi-symbol requests. Instruments come from the local index,
+    so only ones never seen before are requested. Unlike rh.build_holdings, nothing is requested per position.
+    :return: Dictionary mapping ticker to its name, price, quantity, average buy price, type and instrument URL
+    """
+    positions = [position for position in fetch_positions() or [] if position]
+    instruments = get_instruments(
+        [position[RobinhoodPositionKeys.INSTRUMENT] for position in positions]
+    )
+    symbols = [
+        instruments[position[RobinhoodPositionKeys.INSTRUMENT]][RobinhoodInstrumentKeys.SYMBOL]
+        for position in positions
+        if position[RobinhoodPositionKeys.INSTRUMENT] in instruments
+    ]
+    quotes = get_quotes(symbols)
+
+    holdings = {}
+    for position in positions:
+        instrument_url = position[RobinhoodPositionKeys.INSTRUMENT]
+        instrument = instruments.get(instrument_url)
+        quote = instrument and quotes.get(instrument[RobinhoodInstrumentKeys.SYMBOL])
+        if not quote:
+            print(f"Skipping position in {instrument_url}: instrument or quote not found")
+            continue
+        holdings[instrument[RobinhoodInstrumentKeys.SYMBOL]] = {
+            RobinhoodApiData.NAME.value.name: instrument[RobinhoodInstrumentKeys.NAME],
+            RobinhoodApiData.PRICE.value.name: get_quote_price(quote),
+            RobinhoodApiData.QUANTITY.value.name: position[RobinhoodPositionKeys.QUANTITY],
+            RobinhoodApiData.AVG_BUY_PRICE.value.name: position[RobinhoodPositionKeys.AVERAGE_BUY_PRICE],
+            RobinhoodApiData.TYPE.value.name: instrument[RobinhoodInstrumentKeys.TYPE],
+            RobinhoodApiData.INSTRUMENT.value.name: instrument_url,
+        }
+    return holdings
 
 
-def get_dividends() -> List[Dict[str, Any]]:
+def get_stock_fundamentals(
+    tickers: List[str], fields: Optional[List[str]] = None
+) -> List[Dict[str, Any]]:
+    """
+    Get fundamentals for a list of tickers, serving fresh entries from the local cache and
+    fetching only missing or stale symbols in one batched request.
+    :param tickers: Ticker symbols
+    :param fields: Fundamentals fields needed by the caller. Staleness is judged on these fields only.
+    :return: List of fundamentals records
+    """
+    fundamentals_cache = FundamentalsCache()
+    fundamentals = fundamentals_cache.get_fresh(tickers, fields)
+    missing_tickers = [ticker for ticker in tickers if ticker not in fundamentals]
+    print(f"Fundamentals cache hits: {len(fundamentals)}, misses: {len(missing_tickers)}")
+
+    if missing_tickers:
+        login()
+        fetched = [record for record in fetch_fundamentals(missing_tickers) or [] if record]
+        fundamentals_cache.put(fetched)
+        for record in fetched:
+            fundamentals[record[RobinhoodApiData.SYMBOL.value.name]] = (
+                record if fields is None else {field: record.get(field) for field in fields}
+            )
+
+    return [fundamentals[ticker] for ticker in tickers if ticker in fundamentals]
+
+
+def get_dividends_since(cutoff_date: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Page through the account's dividends, newest first, stopping after the first page whose
+    records were all payable before cutoff_date.
+    :param cutoff_date: ISO date string. If None, or if the API doesn't return records newest first,
+                        the whole history is fetched.
+    :return: List of dividend records
+    """
     login()
-    dividends = rh.get_dividends()
+    dividends = []
+    url = rh.urls.dividends_url()
+    while url:
+        page = fetch_page(url)
+        if page is None:
+            raise ConnectionError(f"Failed to fetch dividends page {url}")
+        results = [record for record in page[RobinhoodPaginationKeys.RESULTS] if record]
+        dividends.extend(results)
+
+        payable_dates = [
+            record.get(RobinhoodApiData.PAYABLE_DATE.value.name) or "" for record in results
+        ]
+        is_newest_first = payable_dates == sorted(payable_dates, reverse=True)
+        if cutoff_date and results and is_newest_first and payable_dates[0] < cutoff_date:
+            break
+        url = page[RobinhoodPaginationKeys.NEXT]
+    print(f"Fetched {len(dividends)} dividend records")
     return dividends
 
 
 def get_available_cash() -> float:
     login()
-    account_profile = rh.profiles.load_account_profile()
+    account_profile = fetch_account_profile()
     buying_power = account_profile[ACCOUNT_BUYING_POWER]
     return buying_power
 
 
-def get_crypto_portfolio(is_live=False):
-    crypto_data = []
-    if is_live:
-        login()
-        print("Getting crypto portfolio.")
-        crypto_positions = rh.crypto.get_crypto_positions()
-
-        for position in crypto_positions:
-            # Extract relevant details
-            crypto_id = position[CryptoDataKeys.CURRENCY][CryptoDataKeys.TICKER_CODE]
-            name = position[CryptoDataKeys.CURRENCY][CryptoDataKeys.NAME]
-            quantity = float(position[CryptoDataKeys.QUANTITY])
-            average_buy_price = (
-                float(
-                    position[CryptoDataKeys.COST_BASES][0][
-                        CryptoDataKeys.DIRECT_COST_BASIS
-                    ]
-                )
-                / float(
-                    position[CryptoDataKeys.COST_BASES][0][
-                        CryptoDataKeys.DIRECT_QUANTITY
-                    ]
-                )
-                if position[CryptoDataKeys.COST_BASES]
-                else 0
-            )
+def get_crypto_positions(is_live=False) -> List[Dict[str, Any]]:
+    if not is_live:
+        return []
+    login()
+    print("Getting crypto portfolio.")
+    return [position for position in fetch_crypto_positions() or [] if position]
 
-            crypto_data.append(
-                {
-                    RobinhoodApiData.TICKER.value.label: crypto_id,
-                    RobinhoodApiData.NAME.value.label: name,
-                    RobinhoodApiData.AVG_BUY_PRICE.value.label: average_buy_price,
-                    RobinhoodApiData.QUANTITY.value.label: quantity,
-                    ColumnNames.TOTAL.value.label: quantity * average_buy_price,
-                }
-            )
-    return crypto_data
+
+def get_crypto_prices(currency_codes: Iterable[str]) -> Dict[str, float]:
+    """
+    Get the mark price of crypto currencies in CRYPTO_QUOTE_CURRENCY. Robinhood quotes one currency pair
+    per request, so the quotes are fetched concurrently, after a single request resolving every pair's id.
+    :param currency_codes: Crypto currency codes, e.g. BTC
+    :return: Dictionary mapping currency code to its price, without currencies that couldn't be quoted
+    """
+    currency_codes = list(dict.fromkeys(currency_codes))
+    if not currency_codes:
+        return {}
+    login()
+    currency_pair_ids = {
+        pair[CryptoDataKeys.ASSET_CURRENCY][CryptoDataKeys.TICKER_CODE]: pair[CryptoDataKeys.ID]
+        for pair in fetch_crypto_currency_pairs() or []
+        if pair and pair[CryptoDataKeys.QUOTE_CURRENCY][CryptoDataKeys.TICKER_CODE] == CRYPTO_QUOTE_CURRENCY
+    }
+    quoted_codes = [code for code in currency_codes if code in currency_pair_ids]
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_CRYPTO_QUOTES) as executor:
+        futures = {
+            code: executor.submit(copy_context().run, fetch_crypto_quote, currency_pair_ids[code])
+            for code in quoted_codes
+        }
+    quotes = {code: future.result() for code, future in futures.items()}
+
+    prices = {
+        code: float(quote[CryptoDataKeys.MARK_PRICE])
+        for code, quote in quotes.items()
+        if quote and quote.get(CryptoDataKeys.MARK_PRICE)
+    }
+    missing_codes = [code for code in currency_codes if code not in prices]
+    if missing_codes:
+        print(f"No {CRYPTO_QUOTE_CURRENCY} quote found for {', '.join(missing_codes)}")
+    return prices
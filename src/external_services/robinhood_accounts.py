@@ -0,0 +1,77 @@
+"""
+Per-account isolation for exporting several Robinhood accounts from one process.
+robin_stocks sends every request through one module-global session, so that session is replaced by a
+router that forwards each request to the session of the account active in the calling context.
+"""
+
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+from src.constants.robinhood import RobinhoodAccount
+from src.lazy_import import LazyModule
+from src.local_storage.storage_paths import use_storage_namespace
+
+rh = LazyModule("robin_stocks.robinhood")
+requests = LazyModule("requests")
+http_transport = LazyModule("src.external_services.http_transport")
+
+_current_account: ContextVar[Optional[RobinhoodAccount]] = ContextVar("current_account", default=None)
+# Sessions outlive a run, so warm invocations reuse each account's connection pool and tokens
+_account_sessions: Dict[str, "requests.Session"] = {}
+_routing_lock = threading.Lock()
+
+
+class AccountRoutedSession:
+    """
+    Stand-in for robin_stocks' global session. Attribute access, and therefore every request and header
+    update, goes to the session of the current account, or to the original global session outside of one.
+    """
+
+    def __init__(self, default_session: "requests.Session"):
+        self.default_session = default_session
+
+    def __getattr__(self, attribute: str):
+        account = _current_account.get()
+        session = _account_sessions[account.name] if account else self.default_session
+        return getattr(session, attribute)
+
+
+def install_account_routing() -> None:
+    with _routing_lock:
+        if not isinstance(rh.helper.SESSION, AccountRoutedSession):
+            rh.helper.SESSION = AccountRoutedSession(rh.helper.SESSION)
+
+
+def get_account_session(account: RobinhoodAccount) -> "requests.Session":
+    """
+    Get the account's own HTTP session, created on first use with robin_stocks' default headers.
+    """
+    with _routing_lock:
+        if account.name not in _account_sessions:
+            session = http_transport.create_session()
+            session.headers.update(rh.helper.SESSION.default_session.headers)
+            session.headers.pop("Authorization", None)
+            _account_sessions[account.name] = session
+        return _account_sessions[account.name]
+
+
+def get_current_account() -> Optional[RobinhoodAccount]:
+    return _current_account.get()
+
+
+@contextmanager
+def use_account(account: RobinhoodAccount) -> Iterator[None]:
+    """
+    Send the Robinhood requests made inside the block with the account's own session, and keep its
+    local data in its own storage namespace. Threads started inside the block must copy the context.
+    """
+    install_account_routing()
+    get_account_session(account)
+    token = _current_account.set(account)
+    try:
+        with use_storage_namespace(account.name):
+            yield
+    finally:
+        _current_account.reset(token)
@@ -0,0 +1,194 @@
+"""
+Robinhood session reuse: cached tokens are validated cheaply, refreshed with the refresh_token flow,
+and a full password + TOTP login only happens when neither works.
+"""
+
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import pyotp
+from cryptography.fernet import Fernet, InvalidToken
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+
+from src.constants.common import UTF_8
+from src.constants.robinhood import (
+    RH_OAUTH_CLIENT_ID,
+    RH_OAUTH_SCOPE,
+    RH_SESSION_EXPIRES_IN,
+    RH_SESSION_KEY_ENV_VAR,
+    RobinhoodCredentials,
+    RobinhoodSessionKeys,
+)
+from src.external_services.robinhood_accounts import get_current_account
+from src.lazy_import import LazyModule
+from src.local_storage.session_store import LocalFileSessionStore, SessionStore
+
+rh = LazyModule("robin_stocks.robinhood")
+
+KEY_DERIVATION_ITERATIONS = 200_000
+# The device token is injected into robin_stocks' login by swapping its generator, which is module-global
+_device_token_lock = threading.Lock()
+
+
+def get_session_key(credentials: RobinhoodCredentials) -> str:
+    """
+    Name under which an account's session is stored. Hashed so the store doesn't reveal the email.
+    """
+    return hashlib.sha256(credentials.email.encode(UTF_8)).hexdigest()
+
+
+def get_session_cipher(credentials: RobinhoodCredentials) -> Fernet:
+    """
+    Cipher for cached sessions: the key from RH_SESSION_KEY if set, otherwise one derived from the credentials.
+    """
+    configured_key = os.getenv(RH_SESSION_KEY_ENV_VAR)
+    if configured_key:
+        return Fernet(configured_key)
+    kdf = PBKDF2HMAC(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=credentials.email.encode(UTF_8),
+        iterations=KEY_DERIVATION_ITERATIONS,
+    )
+    secret = (credentials.password + credentials.otp_key).encode(UTF_8)
+    return Fernet(base64.urlsafe_b64encode(kdf.derive(secret)))
+
+
+def load_session(
+    store: SessionStore, key: str, cipher: Fernet
+) -> Optional[Dict[str, Any]]:
+    encrypted_session = store.load(key)
+    if encrypted_session is None:
+        return None
+    try:
+        return json.loads(cipher.decrypt(encrypted_session))
+    except (InvalidToken, ValueError):
+        print("Cached session could not be decrypted, discarding it.")
+        store.delete(key)
+        return None
+
+
+def save_session(
+    store: SessionStore, key: str, cipher: Fernet, session: Dict[str, Any]
+) -> None:
+    store.save(key, cipher.encrypt(json.dumps(session).encode(UTF_8)))
+
+
+def to_session(token_data: Dict[str, Any], device_token: str) -> Dict[str, Any]:
+    return {
+        RobinhoodSessionKeys.ACCESS_TOKEN: token_data[RobinhoodSessionKeys.ACCESS_TOKEN],
+        RobinhoodSessionKeys.REFRESH_TOKEN: token_data[RobinhoodSessionKeys.REFRESH_TOKEN],
+        RobinhoodSessionKeys.TOKEN_TYPE: token_data[RobinhoodSessionKeys.TOKEN_TYPE],
+        RobinhoodSessionKeys.DEVICE_TOKEN: device_token,
+        RobinhoodSessionKeys.EXPIRES_AT: time.time()
+        + float(token_data.get(RobinhoodSessionKeys.EXPIRES_IN, RH_SESSION_EXPIRES_IN)),
+    }
+
+
+def activate_session(session: Dict[str, Any]) -> bool:
+    """
+    Install a session's access token and check it with a single cheap request.
+    :return: True if the token is accepted
+    """
+    rh.helper.update_session(
+        "Authorization",
+        f"{session[RobinhoodSessionKeys.TOKEN_TYPE]} {session[RobinhoodSessionKeys.ACCESS_TOKEN]}",
+    )
+    rh.helper.set_login_state(True)
+    if time.time() < session.get(RobinhoodSessionKeys.EXPIRES_AT, 0):
+        response = rh.helper.request_get(
+            rh.urls.positions_url(), payload={"nonzero": "true"}, jsonify_data=False
+        )
+        if response is not None and response.status_code == 200:
+            return True
+    # Other accounts may be logged in through the same robin_stocks module, so only their own session is reset
+    if get_current_account() is None:
+        rh.helper.set_login_state(False)
+    rh.helper.update_session("Authorization", None)
+    return False
+
+
+def refresh_session(session: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Exchange a session's refresh token for a new access token.
+    :return: The refreshed session, or None if the refresh token was rejected
+    """
+    payload = {
+        "client_id": RH_OAUTH_CLIENT_ID,
+        "expires_in": RH_SESSION_EXPIRES_IN,
+        "grant_type": "refresh_token",
+        "refresh_token": session[RobinhoodSessionKeys.REFRESH_TOKEN],
+        "scope": RH_OAUTH_SCOPE,
+        "device_token": session[RobinhoodSessionKeys.DEVICE_TOKEN],
+    }
+    data = rh.helper.request_post(rh.urls.login_url(), payload)
+    if not data or RobinhoodSessionKeys.ACCESS_TOKEN not in data:
+        return None
+    refreshed = to_session(data, session[RobinhoodSessionKeys.DEVICE_TOKEN])
+    return refreshed if activate_session(refreshed) else None
+
+
+def login_with_password(
+    credentials: RobinhoodCredentials, device_token: str
+) -> Dict[str, Any]:
+    """
+    Full password + TOTP login. Reusing the stored device token keeps this a known device to Robinhood,
+    which avoids most verification workflows.
+    """
+    totp = pyotp.TOTP(credentials.otp_key).now()
+    with _device_token_lock:
+        generate_device_token = rh.authentication.generate_device_token
+        rh.authentication.generate_device_token = lambda: device_token
+        try:
+            token_data = rh.login(
+                credentials.email,
+                credentials.password,
+                mfa_code=totp,
+                store_session=False,
+            )
+        finally:
+            rh.authentication.generate_device_token = generate_device_token
+    return to_session(token_data, device_token)
+
+
+def login_with_cached_session(
+    credentials: RobinhoodCredentials, store: Optional[SessionStore] = None
+) -> Dict[str, Any]:
+    """
+    Log in reusing a cached session when possible.
+    Order of attempts: cached access token, refresh token, full login.
+    :param credentials: Account credentials, needed for the full login and to derive the cache key
+    :param store: Where encrypted sessions are kept. Defaults to local files.
+    :return: The active session
+    """
+    store = store or LocalFileSessionStore()
+    key = get_session_key(credentials)
+    cipher = get_session_cipher(credentials)
+
+    session = load_session(store, key, cipher)
+    if session:
+        if activate_session(session):
+            print("Logged in with cached Robinhood session")
+            return session
+        print("Cached access token is no longer valid, refreshing it")
+        refreshed = refresh_session(session)
+        if refreshed:
+            save_session(store, key, cipher, refreshed)
+            print("Logged in with refreshed Robinhood session")
+            return refreshed
+
+    device_token = (
+        session[RobinhoodSessionKeys.DEVICE_TOKEN]
+        if session
+        else rh.authentication.generate_device_token()
+    )
+    print("Logging in to Robinhood with credentials")
+    session = login_with_password(credentials, device_token)
+    save_session(store, key, cipher, session)
+    return session
@@ -0,0 +1,143 @@
+"""
+Helpers to turn DataFrames into Google Sheets API cell data and batch update requests.
+"""
+
+import math
+import numbers
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.constants.gsheets import (
+    GRID_SIZE_FIELDS,
+    SHEETS_NAN_VALUE,
+    USER_ENTERED_VALUE_FIELD,
+)
+
+# Strings Sheets would parse as numbers when entered by a user
+NUMERIC_STRING_PATTERN = re.compile(r"^[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$")
+
+
+def to_cell_value(value: Any) -> Dict[str, Any]:
+    """
+    Convert a single DataFrame value to a Sheets ExtendedValue, keeping numbers numeric.
+    """
+    if pd.api.types.is_scalar(value) and pd.isna(value):
+        return {"stringValue": SHEETS_NAN_VALUE}
+    if isinstance(value, (bool, np.bool_)):
+        return {"boolValue": bool(value)}
+    if isinstance(value, numbers.Number) and not isinstance(value, complex):
+        if math.isfinite(value):
+            return {"numberValue": float(value)}
+        return {"stringValue": str(value)}
+    text = str(value)
+    if NUMERIC_STRING_PATTERN.match(text.strip()):
+        return {"numberValue": float(text)}
+    return {"stringValue": text}
+
+
+def header_to_grid(frame: pd.DataFrame) -> List[List[Dict[str, Any]]]:
+    return [[{"stringValue": str(column)} for column in frame.columns]]
+
+
+def rows_to_grid(frame: pd.DataFrame) -> List[List[Dict[str, Any]]]:
+    return [[to_cell_value(value) for value in row] for row in frame.itertuples(index=False, name=None)]
+
+
+def dataframe_to_grid(frame: pd.DataFrame) -> List[List[Dict[str, Any]]]:
+    """
+    Convert a DataFrame, including its header row, to a grid of Sheets cell values.
+    """
+    return header_to_grid(frame) + rows_to_grid(frame)
+
+
+def iter_grid_chunks(
+    frame: pd.DataFrame, chunk_rows: int
+) -> Iterator[Tuple[int, List[List[Dict[str, Any]]]]]:
+    """
+    Convert a DataFrame to grids of at most chunk_rows data rows, one chunk at a time.
+    :return: Iterator of (row index in the worksheet, grid). The header row starts the first chunk.
+    """
+    for start in range(0, max(len(frame), 1), chunk_rows):
+        grid = rows_to_grid(frame.iloc[start : start + chunk_rows])
+        yield (0, header_to_grid(frame) + grid) if start == 0 else (start + 1, grid)
+
+
+def build_resize_request(sheet_id: int, row_count: int, column_count: int) -> Dict[str, Any]:
+    return {
+        "updateSheetProperties": {
+            "properties": {
+                "sheetId": sheet_id,
+                "gridProperties": {"rowCount": row_count, "columnCount": column_count},
+            },
+            "fields": GRID_SIZE_FIELDS,
+        }
+    }
+
+
+def build_clear_request(sheet_id: int) -> Dict[str, Any]:
+    return {
+        "updateCells": {
+            "range": {"sheetId": sheet_id},
+            "fields": USER_ENTERED_VALUE_FIELD,
+        }
+    }
+
+
+def diff_grids(
+    old_grid: List[List[Dict[str, Any]]], new_grid: List[List[Dict[str, Any]]]
+) -> List[Tuple[int, int, List[Optional[Dict[str, Any]]]]]:
+    """
+    Compute the cell-level differences between two grids.
+    :param old_grid: Grid last written to the worksheet
+    :param new_grid: Grid to be written
+    :return: List of (row index, column index, cells) runs of contiguous changed cells within a row.
+             Cells that only exist in the old grid are returned as None so they get cleared.
+    """
+    changes = []
+    for row_index in range(max(len(old_grid), len(new_grid))):
+        old_row = old_grid[row_index] if row_index < len(old_grid) else []
+        new_row = new_grid[row_index] if row_index < len(new_grid) else []
+        run_start, run = None, []
+        for column_index in range(max(len(old_row), len(new_row))):
+            old_cell = old_row[column_index] if column_index < len(old_row) else None
+            new_cell = new_row[column_index] if column_index < len(new_row) else None
+            if old_cell != new_cell:
+                if run_start is None:
+                    run_start = column_index
+                run.append(new_cell)
+            elif run_start is not None:
+                changes.append((row_index, run_start, run))
+                run_start, run = None, []
+        if run_start is not None:
+            changes.append((row_index, run_start, run))
+    return changes
+
+
+def build_update_cells_request(
+    sheet_id: int,
+    grid: List[List[Optional[Dict[str, Any]]]],
+    row_index: int = 0,
+    column_index: int = 0,
+) -> Dict[str, Any]:
+    return {
+        "updateCells": {
+            "start": {
+                "sheetId": sheet_id,
+                "rowIndex": row_index,
+                "columnIndex": column_index,
+            },
+            "rows": [
+                {
+                    "values": [
+                        {USER_ENTERED_VALUE_FIELD: cell} if cell is not None else {}
+                        for cell in row
+                    ]
+                }
+                for row in grid
+            ],
+            "fields": USER_ENTERED_VALUE_FIELD,
+        }
+    }
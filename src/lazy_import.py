@@ -0,0 +1,32 @@
+"""
+Deferred imports for heavy optional dependencies, so entry points start quickly and only pay for
+the libraries a run actually uses.
+"""
+
+import importlib
+import threading
+from types import ModuleType
+
+_import_lock = threading.RLock()
+
+
+class LazyModule(ModuleType):
+    """
+    Stand-in for a module that imports the real one on first attribute access. Thread-safe, since
+    pipeline stages may touch the same module concurrently.
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self._lazy_module = None
+
+    def _load(self) -> ModuleType:
+        if self._lazy_module is None:
+            with _import_lock:
+                if self._lazy_module is None:
+                    self._lazy_module = importlib.import_module(self.__name__)
+        return self._lazy_module
+
+    def __getattr__(self, attribute: str):
+        # Only called for attributes not set on the stand-in itself
+        return getattr(self._load(), attribute)
@@ -0,0 +1,73 @@
+"""
+Persistent on-disk ledger of the account's dividend records, so each run only fetches what's new.
+"""
+
+import json
+import os
+import sqlite3
+from contextlib import closing
+from typing import Any, Dict, Iterable, List, Optional
+
+from src.constants.robinhood import DIVIDEND_ID, OPEN_DIVIDEND_STATES, RobinhoodApiData
+from src.constants.storage import DIVIDEND_STORE_FILE_NAME
+from src.local_storage.storage_paths import get_account_storage_dir
+
+
+class DividendStore:
+    """
+    SQLite-backed dividend ledger keyed by dividend id. Raw API records are kept as JSON.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(get_account_storage_dir(), DIVIDEND_STORE_FILE_NAME)
+        with closing(sqlite3.connect(self.path)) as connection, connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS dividends ("
+                "id TEXT PRIMARY KEY, payable_date TEXT, state TEXT, record TEXT NOT NULL)"
+            )
+
+    def get_all(self) -> List[Dict[str, Any]]:
+        with closing(sqlite3.connect(self.path)) as connection:
+            rows = connection.execute("SELECT record FROM dividends").fetchall()
+        return [json.loads(record) for (record,) in rows]
+
+    def upsert(self, records: Iterable[Dict[str, Any]]) -> int:
+        """
+        Insert new records and replace existing ones with the same id.
+        :return: Number of records written
+        """
+        rows = [
+            (
+                record[DIVIDEND_ID],
+                record.get(RobinhoodApiData.PAYABLE_DATE.value.name),
+                record.get(RobinhoodApiData.DVD_STATUS.value.name),
+                json.dumps(record),
+            )
+            for record in records
+            if record
+        ]
+        with closing(sqlite3.connect(self.path)) as connection, connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO dividends (id, payable_date, state, record) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+        return len(rows)
+
+    def get_sync_cutoff(self) -> Optional[str]:
+        """
+        Get the payable date from which records have to be re-fetched: the stored high-water mark,
+        or the oldest open (pending) record if that is older, since its state may still change.
+        :return: ISO date string, or None if the store is empty and a full fetch is needed
+        """
+        placeholders = ",".join("?" for _ in OPEN_DIVIDEND_STATES)
+        with closing(sqlite3.connect(self.path)) as connection:
+            (high_water_mark,) = connection.execute(
+                "SELECT MAX(payable_date) FROM dividends"
+            ).fetchone()
+            (oldest_open,) = connection.execute(
+                f"SELECT MIN(payable_date) FROM dividends WHERE state IN ({placeholders})",
+                tuple(OPEN_DIVIDEND_STATES),
+            ).fetchone()
+        if high_water_mark is None:
+            return None
+        return min(high_water_mark, oldest_open) if oldest_open else high_water_mark
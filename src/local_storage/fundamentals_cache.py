@@ -0,0 +1,90 @@
+"""
+Persistent cache of instrument fundamentals with a separate time-to-live for each field.
+"""
+
+import json
+import os
+import sqlite3
+import time
+from contextlib import closing
+from typing import Any, Dict, Iterable, List, Optional
+
+from src.constants.robinhood import (
+    DEFAULT_FUNDAMENTALS_TTL,
+    FUNDAMENTALS_FIELD_TTLS,
+    RobinhoodApiData,
+)
+from src.constants.storage import FUNDAMENTALS_CACHE_FILE_NAME
+from src.local_storage.storage_paths import get_storage_dir
+
+
+class FundamentalsCache:
+    """
+    SQLite-backed fundamentals cache keyed by symbol. Every field is stored with the time it was fetched,
+    so a symbol is only stale once one of the fields asked for has outlived its TTL.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        field_ttls: Optional[Dict[str, float]] = None,
+        default_ttl: float = DEFAULT_FUNDAMENTALS_TTL,
+    ):
+        self.path = path or os.path.join(get_storage_dir(), FUNDAMENTALS_CACHE_FILE_NAME)
+        self.field_ttls = FUNDAMENTALS_FIELD_TTLS if field_ttls is None else field_ttls
+        self.default_ttl = default_ttl
+        with closing(sqlite3.connect(self.path)) as connection, connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS fundamentals ("
+                "symbol TEXT NOT NULL, field TEXT NOT NULL, value TEXT, fetched_at REAL NOT NULL, "
+                "PRIMARY KEY (symbol, field))"
+            )
+
+    def get_fresh(
+        self, symbols: Iterable[str], fields: Optional[List[str]] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Get the cached records that are still fresh for the requested fields.
+        :param symbols: Ticker symbols to look up
+        :param fields: Fields the caller needs. If None, every cached field must be fresh and is returned.
+        :return: Dictionary mapping symbol to its record, without the missing or stale symbols
+        """
+        symbols = list(symbols)
+        if not symbols:
+            return {}
+        placeholders = ",".join("?" for _ in symbols)
+        with closing(sqlite3.connect(self.path)) as connection:
+            rows = connection.execute(
+                f"SELECT symbol, field, value, fetched_at FROM fundamentals WHERE symbol IN ({placeholders})",
+                symbols,
+            ).fetchall()
+
+        now = time.time()
+        records: Dict[str, Dict[str, Any]] = {}
+        stale = set()
+        for symbol, field, value, fetched_at in rows:
+            if fields is not None and field not in fields:
+                continue
+            if now - fetched_at > self.field_ttls.get(field, self.default_ttl):
+                stale.add(symbol)
+            records.setdefault(symbol, {})[field] = json.loads(value)
+
+        return {
+            symbol: record
+            for symbol, record in records.items()
+            if symbol not in stale and (fields is None or all(field in record for field in fields))
+        }
+
+    def put(self, records: Iterable[Dict[str, Any]]) -> None:
+        now = time.time()
+        rows = [
+            (record[RobinhoodApiData.SYMBOL.value.name], field, json.dumps(value), now)
+            for record in records
+            if record
+            for field, value in record.items()
+        ]
+        with closing(sqlite3.connect(self.path)) as connection, connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO fundamentals (symbol, field, value, fetched_at) VALUES (?, ?, ?, ?)",
+                rows,
+            )
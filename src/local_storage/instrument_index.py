@@ -0,0 +1,99 @@
+"""
+Persistent index of Robinhood instruments, mapping instrument URL, id and symbol to each other.
+"""
+
+import os
+import sqlite3
+import time
+from contextlib import closing
+from typing import Any, Dict, Iterable, Optional
+
+from src.constants.robinhood import INSTRUMENT_INDEX_TTL, RobinhoodInstrumentKeys
+from src.constants.storage import INSTRUMENT_INDEX_FILE_NAME
+from src.local_storage.storage_paths import get_storage_dir
+
+# Columns of the index, in table order. Entries are returned as dictionaries with these keys.
+INDEX_COLUMNS = [
+    RobinhoodInstrumentKeys.URL.value,
+    RobinhoodInstrumentKeys.ID.value,
+    RobinhoodInstrumentKeys.SYMBOL.value,
+    RobinhoodInstrumentKeys.NAME.value,
+    RobinhoodInstrumentKeys.TYPE.value,
+]
+
+
+def to_index_entry(instrument: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Keep the fields of an instrument record that the index stores. The name is the simple name
+    when the instrument has one, like Robinhood shows it.
+    """
+    return {
+        RobinhoodInstrumentKeys.URL.value: instrument[RobinhoodInstrumentKeys.URL],
+        RobinhoodInstrumentKeys.ID.value: instrument[RobinhoodInstrumentKeys.ID],
+        RobinhoodInstrumentKeys.SYMBOL.value: instrument[RobinhoodInstrumentKeys.SYMBOL],
+        RobinhoodInstrumentKeys.NAME.value: instrument.get(RobinhoodInstrumentKeys.SIMPLE_NAME)
+        or instrument.get(RobinhoodInstrumentKeys.NAME),
+        RobinhoodInstrumentKeys.TYPE.value: instrument.get(RobinhoodInstrumentKeys.TYPE),
+    }
+
+
+class InstrumentIndex:
+    """
+    SQLite-backed instrument index keyed by instrument URL. Instruments are the same for every account,
+    so the index is shared between them. Entries are refreshed after max_age seconds, which picks up
+    symbol and name changes.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_age: float = INSTRUMENT_INDEX_TTL):
+        self.path = path or os.path.join(get_storage_dir(), INSTRUMENT_INDEX_FILE_NAME)
+        self.max_age = max_age
+        with closing(sqlite3.connect(self.path)) as connection, connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS instruments ("
+                "url TEXT PRIMARY KEY, id TEXT NOT NULL, symbol TEXT NOT NULL, name TEXT, type TEXT, "
+                "fetched_at REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS instruments_id ON instruments (id)")
+            connection.execute("CREATE INDEX IF NOT EXISTS instruments_symbol ON instruments (symbol)")
+
+    def _get_by(self, key: RobinhoodInstrumentKeys, values: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        values = list(dict.fromkeys(values))
+        if not values:
+            return {}
+        placeholders = ",".join("?" for _ in values)
+        with closing(sqlite3.connect(self.path)) as connection:
+            rows = connection.execute(
+                f"SELECT {', '.join(INDEX_COLUMNS)} FROM instruments "
+                f"WHERE {key.value} IN ({placeholders}) AND fetched_at >= ?",
+                values + [time.time() - self.max_age],
+            ).fetchall()
+        entries = [dict(zip(INDEX_COLUMNS, row)) for row in rows]
+        return {entry[key.value]: entry for entry in entries}
+
+    def get_by_urls(self, urls: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Look up fresh entries by instrument URL.
+        :return: Dictionary mapping URL to its entry, without the missing or stale URLs
+        """
+        return self._get_by(RobinhoodInstrumentKeys.URL, urls)
+
+    def get_by_ids(self, instrument_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        return self._get_by(RobinhoodInstrumentKeys.ID, instrument_ids)
+
+    def get_by_symbols(self, symbols: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        return self._get_by(RobinhoodInstrumentKeys.SYMBOL, symbols)
+
+    def put(self, instruments: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """
+        Add or refresh instruments from API instrument records.
+        :return: Dictionary mapping URL to the stored entry
+        """
+        entries = [to_index_entry(instrument) for instrument in instruments if instrument]
+        now = time.time()
+        with closing(sqlite3.connect(self.path)) as connection, connection:
+            connection.executemany(
+                f"INSERT OR REPLACE INTO instruments ({', '.join(INDEX_COLUMNS)}, fetched_at) "
+                f"VALUES ({', '.join('?' for _ in INDEX_COLUMNS)}, ?)",
+                [[entry[column] for column in INDEX_COLUMNS] + [now] for entry in entries],
+            )
+        return {entry[RobinhoodInstrumentKeys.URL.value]: entry for entry in entries}
@@ -0,0 +1,48 @@
+"""
+Local cache of the frames built by the last full export, so a price-only run can refresh them
+without fetching holdings, fundamentals or dividends again.
+"""
+
+import os
+from typing import Optional
+
+import pandas as pd
+
+from src.constants.storage import (
+    PORTFOLIO_CACHE_DIR_NAME,
+    PORTFOLIO_CACHE_FILE_SUFFIX,
+    CachedPortfolio,
+)
+from src.local_storage.storage_paths import get_account_storage_dir
+
+
+class PortfolioCache:
+    """
+    One Parquet file per cached frame, under the account's storage directory.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or get_account_storage_dir(PORTFOLIO_CACHE_DIR_NAME, create=False)
+
+    def _path(self, portfolio: CachedPortfolio) -> str:
+        return os.path.join(self.directory, portfolio.value + PORTFOLIO_CACHE_FILE_SUFFIX)
+
+    def is_cached(self, portfolio: CachedPortfolio) -> bool:
+        return os.path.isfile(self._path(portfolio))
+
+    def load(self, portfolio: CachedPortfolio) -> pd.DataFrame:
+        path = self._path(portfolio)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(
+                f"No cached {portfolio.value} portfolio in {self.directory}. "
+                "Run a full export with cache_for_prices_only first."
+            )
+        return pd.read_parquet(path)
+
+    def save(self, portfolio: CachedPortfolio, frame: pd.DataFrame) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(portfolio)
+        # Write to a temporary file first so a failed run never leaves a truncated frame
+        temp_path = path + ".tmp"
+        frame.to_parquet(temp_path, index=False)
+        os.replace(temp_path, path)
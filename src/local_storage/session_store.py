@@ -0,0 +1,58 @@
+"""
+Storage backends for encrypted Robinhood sessions, so tokens can be reused across runs.
+"""
+
+import os
+from abc import ABC, abstractmethod
+from typing import Optional
+
+from src.constants.storage import SESSIONS_DIR_NAME
+from src.local_storage.storage_paths import get_storage_dir, to_file_name
+
+
+class SessionStore(ABC):
+    """
+    Key-value store for encrypted session blobs. Implement this to share sessions through
+    a remote store (e.g. S3 or DynamoDB) between Lambda instances.
+    """
+
+    @abstractmethod
+    def load(self, key: str) -> Optional[bytes]:
+        pass
+
+    @abstractmethod
+    def save(self, key: str, value: bytes) -> None:
+        pass
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        pass
+
+
+class LocalFileSessionStore(SessionStore):
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or get_storage_dir(SESSIONS_DIR_NAME)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, to_file_name(key) + ".session")
+
+    def load(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        if not os.path.isfile(path):
+            return None
+        with open(path, "rb") as session_file:
+            return session_file.read()
+
+    def save(self, key: str, value: bytes) -> None:
+        path = self._path(key)
+        temp_path = path + ".tmp"
+        # Only the owner may read the session file
+        with open(os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "wb") as session_file:
+            session_file.write(value)
+        os.replace(temp_path, path)
+
+    def delete(self, key: str) -> None:
+        path = self._path(key)
+        if os.path.isfile(path):
+            os.remove(path)
@@ -0,0 +1,47 @@
+"""
+Local snapshots of the last grid written to each worksheet, used for incremental sheet updates.
+Snapshots belong to the account that wrote them, so accounts writing spreadsheets of the same name don't share them.
+"""
+
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+from src.constants.storage import SHEET_SNAPSHOTS_DIR_NAME
+from src.local_storage.storage_paths import get_account_storage_dir, to_file_name
+
+
+class SheetSnapshotStore:
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory
+
+    def _path(self, spreadsheet_name: str, sheet_id: int, create: bool = False) -> str:
+        # Resolved on every call, since one writer serves every account exported in the process.
+        # Only writing a snapshot creates the directory, so runs that just look for one leave storage untouched.
+        directory = self.directory or get_account_storage_dir(SHEET_SNAPSHOTS_DIR_NAME, create=create)
+        if create:
+            os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, to_file_name(spreadsheet_name, str(sheet_id)) + ".json")
+
+    def load(self, spreadsheet_name: str, sheet_id: int) -> Optional[List[List[Dict[str, Any]]]]:
+        """
+        Get the last grid written to a worksheet, or None if there is no snapshot.
+        """
+        path = self._path(spreadsheet_name, sheet_id)
+        if not os.path.isfile(path):
+            return None
+        with open(path, "r") as snapshot_file:
+            return json.load(snapshot_file)
+
+    def delete(self, spreadsheet_name: str, sheet_id: int) -> None:
+        path = self._path(spreadsheet_name, sheet_id)
+        if os.path.isfile(path):
+            os.remove(path)
+
+    def save(self, spreadsheet_name: str, sheet_id: int, grid: List[List[Dict[str, Any]]]) -> None:
+        path = self._path(spreadsheet_name, sheet_id, create=True)
+        # Write to a temporary file first so a failed run never leaves a truncated snapshot
+        temp_path = path + ".tmp"
+        with open(temp_path, "w") as snapshot_file:
+            json.dump(grid, snapshot_file)
+        os.replace(temp_path, path)
@@ -0,0 +1,229 @@
+"""
+Append-only archive of the exported portfolio frames, kept as uncompressed Arrow IPC files partitioned
+by portfolio and UTC date, so history survives the sheet being overwritten on every run.
+Reads memory-map the files and only materialize the requested columns and partitions.
+"""
+
+import os
+import uuid
+from datetime import date, datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from src.constants.additional_columns import ColumnNames
+from src.constants.robinhood import RobinhoodApiData
+from src.constants.storage import (
+    COMPACTED_SNAPSHOT_FILE_NAME,
+    SNAPSHOT_ARCHIVE_DIR_NAME,
+    SNAPSHOT_FILE_SUFFIX,
+    SNAPSHOT_PARTITION_PREFIX,
+    SNAPSHOT_TIME_COLUMN,
+)
+from src.lazy_import import LazyModule
+from src.local_storage.storage_paths import get_account_storage_dir
+
+pa = LazyModule("pyarrow")
+pa_dataset = LazyModule("pyarrow.dataset")
+pa_fs = LazyModule("pyarrow.fs")
+
+TICKER_COLUMN = RobinhoodApiData.TICKER.value.label
+# Columns returned by get_ticker_history unless others are asked for
+TICKER_HISTORY_COLUMNS = [
+    ColumnNames.TOTAL.value.label,
+    ColumnNames.DIVERSITY.value.label,
+    ColumnNames.PROJECTED_DVD.value.label,
+]
+
+
+def to_utc(moment: datetime) -> datetime:
+    """
+    Naive datetimes are taken to be in UTC.
+    """
+    return moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment.astimezone(timezone.utc)
+
+
+def to_archive_table(frame: pd.DataFrame, snapshot_at: datetime) -> "pa.Table":
+    """
+    Convert a frame to an Arrow table stamped with its snapshot time.
+    Categoricals are stored as plain values and pandas metadata is dropped, so snapshots taken on
+    different runs share a schema.
+    """
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    for index, field in enumerate(table.schema):
+        if pa.types.is_dictionary(field.type):
+            table = table.set_column(
+                index, field.name, table.column(index).cast(field.type.value_type)
+            )
+    table = table.append_column(
+        pa.field(SNAPSHOT_TIME_COLUMN, pa.timestamp("us", tz="UTC")),
+        pa.array([snapshot_at] * table.num_rows, type=pa.timestamp("us", tz="UTC")),
+    )
+    return table.replace_schema_metadata(None)
+
+
+def write_table(table: "pa.Table", path: str) -> None:
+    # Write to a temporary file first so readers never see a partial snapshot
+    temp_path = path + ".tmp"
+    with pa.OSFile(temp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(temp_path, path)
+
+
+def read_table(path: str) -> "pa.Table":
+    """
+    Memory-map an archived file. The table's buffers point into the mapping, so nothing is copied until used.
+    """
+    return pa.ipc.open_file(pa.memory_map(path)).read_all()
+
+
+def read_schema(path: str) -> "pa.Schema":
+    return pa.ipc.open_file(pa.memory_map(path)).schema
+
+
+class SnapshotArchive:
+    """
+    Every append writes one file per portfolio under <portfolio>/date=YYYY-MM-DD/. When the first snapshot
+    of a new day arrives, the files of earlier days are compacted into one file per day, which keeps
+    reads over long ranges to one file per day even with minute-level snapshots.
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or get_account_storage_dir(SNAPSHOT_ARCHIVE_DIR_NAME)
+
+    def _partition_dir(self, portfolio: str, day: date) -> str:
+        return os.path.join(self.directory, portfolio, f"{SNAPSHOT_PARTITION_PREFIX}{day.isoformat()}")
+
+    def _list_partitions(self, portfolio: str) -> List[Tuple[date, str]]:
+        """
+        List a portfolio's partitions as (day, directory), oldest first.
+        """
+        portfolio_dir = os.path.join(self.directory, portfolio)
+        if not os.path.isdir(portfolio_dir):
+            return []
+        return [
+            (date.fromisoformat(name[len(SNAPSHOT_PARTITION_PREFIX):]), os.path.join(portfolio_dir, name))
+            for name in sorted(os.listdir(portfolio_dir))
+            if name.startswith(SNAPSHOT_PARTITION_PREFIX)
+        ]
+
+    @staticmethod
+    def _list_files(partition_dir: str) -> List[str]:
+        return sorted(
+            os.path.abspath(os.path.join(partition_dir, name))
+            for name in os.listdir(partition_dir)
+            if name.endswith(SNAPSHOT_FILE_SUFFIX)
+        )
+
+    def append(self, frames: Dict[str, pd.DataFrame], snapshot_at: Optional[datetime] = None) -> None:
+        """
+        Archive a snapshot of several portfolios.
+        :param frames: Dictionary mapping portfolio name to its exported DataFrame
+        :param snapshot_at: Time of the snapshot. Defaults to now.
+        """
+        snapshot_at = to_utc(snapshot_at or datetime.now(timezone.utc))
+        for portfolio, frame in frames.items():
+            partition_dir = self._partition_dir(portfolio, snapshot_at.date())
+            is_new_partition = not os.path.isdir(partition_dir)
+            os.makedirs(partition_dir, exist_ok=True)
+            file_name = f"{snapshot_at.strftime('%H%M%S%f')}_{uuid.uuid4().hex[:8]}{SNAPSHOT_FILE_SUFFIX}"
+            write_table(to_archive_table(frame, snapshot_at), os.path.join(partition_dir, file_name))
+            if is_new_partition:
+                self.compact(portfolio, before=snapshot_at.date())
+        print(f"Archived snapshot of {len(frames)} portfolio(s) at {snapshot_at.isoformat()}")
+
+    def compact(self, portfolio: str, before: date) -> None:
+        """
+        Merge the files of each partition older than a day into a single file.
+        """
+        for day, partition_dir in self._list_partitions(portfolio):
+            if day >= before:
+                break
+            files = self._list_files(partition_dir)
+            if len(files) <= 1:
+                continue
+            compacted_path = os.path.abspath(os.path.join(partition_dir, COMPACTED_SNAPSHOT_FILE_NAME))
+            table = pa.concat_tables([read_table(path) for path in files], promote_options="default")
+            write_table(table.sort_by(SNAPSHOT_TIME_COLUMN), compacted_path)
+            for path in files:
+                if path != compacted_path:
+                    os.remove(path)
+            print(f"Compacted {len(files)} {portfolio} snapshot file(s) for {day.isoformat()}")
+
+    def read(
+        self,
+        portfolio: str,
+        start: datetime,
+        end: datetime,
+        columns: Optional[List[str]] = None,
+        tickers: Optional[List[str]] = None,
+    ) -> pd.DataFrame:
+        """
+        Read the archived rows of a portfolio with a snapshot time in [start, end].
+        Only the partitions in the range are opened, and only the requested columns are materialized.
+        :param portfolio: Portfolio name, e.g. a SnapshotPortfolio
+        :param start: Start of the range. Naive datetimes are taken to be in UTC.
+        :param end: End of the range, inclusive
+        :param columns: Columns to return besides the snapshot time. Defaults to all of them.
+                        Columns missing from every snapshot in the range come back as NaN.
+        :param tickers: Only return rows for these tickers
+        :return: DataFrame with a snapshot_at column and the requested columns
+        """
+        start, end = to_utc(start), to_utc(end)
+        files_by_day = [
+            self._list_files(partition_dir)
+            for day, partition_dir in self._list_partitions(portfolio)
+            if start.date() <= day <= end.date()
+        ]
+        files = [path for day_files in files_by_day for path in day_files]
+        requested_columns = None if columns is None else [SNAPSHOT_TIME_COLUMN] + list(columns)
+        if not files:
+            return pd.DataFrame(columns=requested_columns or [SNAPSHOT_TIME_COLUMN])
+
+        # A compacted day is one file holding the union of its schemas, but each file of a day not compacted yet,
+        # e.g. today, may add columns, so every file's schema is unified. Only the memory-mapped footers are read.
+        schema = pa.unify_schemas([read_schema(path) for path in files])
+        dataset = pa_dataset.dataset(
+            files, schema=schema, format="ipc", filesystem=pa_fs.LocalFileSystem(use_mmap=True)
+        )
+        time_column = pa_dataset.field(SNAPSHOT_TIME_COLUMN)
+        time_type = schema.field(SNAPSHOT_TIME_COLUMN).type
+        filter_expression = (time_column >= pa.scalar(start, type=time_type)) & (
+            time_column <= pa.scalar(end, type=time_type)
+        )
+        if tickers is not None:
+            filter_expression &= pa_dataset.field(TICKER_COLUMN).isin(tickers)
+
+        scanned_columns = (
+            None
+            if requested_columns is None
+            else [column for column in requested_columns if column in schema.names]
+        )
+        history = dataset.to_table(columns=scanned_columns, filter=filter_expression).to_pandas()
+        return history if requested_columns is None else history.reindex(columns=requested_columns)
+
+    def get_ticker_history(
+        self,
+        portfolio: str,
+        start: datetime,
+        end: datetime,
+        tickers: Optional[List[str]] = None,
+        columns: Optional[List[str]] = None,
+    ) -> pd.DataFrame:
+        """
+        Time series of per-ticker values, by default total value, diversity and projected dividends.
+        :return: DataFrame indexed by snapshot time and ticker
+        """
+        history = self.read(
+            portfolio, start, end, [TICKER_COLUMN] + (columns or TICKER_HISTORY_COLUMNS), tickers
+        )
+        return history.sort_values([SNAPSHOT_TIME_COLUMN, TICKER_COLUMN]).set_index(
+            [SNAPSHOT_TIME_COLUMN, TICKER_COLUMN]
+        )
+
+    def get_total_value_history(self, portfolio: str, start: datetime, end: datetime) -> pd.Series:
+        """
+        Total value of a portfolio at each snapshot in the range.
+        """
+        history = self.read(portfolio, start, end, [ColumnNames.TOTAL.value.label])
+        return history.groupby(SNAPSHOT_TIME_COLUMN)[ColumnNames.TOTAL.value.label].sum()
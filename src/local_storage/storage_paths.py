@@ -0,0 +1,74 @@
+import os
+import re
+import tempfile
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+from src.constants.aws import LAMBDA_FUNCTION_NAME_ENV_VAR
+from src.constants.storage import (
+    ACCOUNTS_DIR_NAME,
+    DEFAULT_LOCAL_STORAGE_DIR,
+    LAMBDA_LOCAL_STORAGE_DIR_NAME,
+    LOCAL_STORAGE_DIR_ENV_VAR,
+)
+
+_storage_namespace: ContextVar[Optional[str]] = ContextVar("storage_namespace", default=None)
+
+
+def get_storage_root() -> str:
+    """
+    Root of the local storage. Defaults to data/cache, or to a directory under /tmp on Lambda,
+    where the task root is read-only. It can be moved with the RH_LOCAL_STORAGE_DIR environment variable.
+    """
+    root = os.getenv(LOCAL_STORAGE_DIR_ENV_VAR)
+    if root:
+        return root
+    if os.getenv(LAMBDA_FUNCTION_NAME_ENV_VAR):
+        return os.path.join(tempfile.gettempdir(), LAMBDA_LOCAL_STORAGE_DIR_NAME)
+    return DEFAULT_LOCAL_STORAGE_DIR
+
+
+def get_storage_dir(*parts: str, create: bool = True) -> str:
+    """
+    Get (and create) a directory under the local storage root.
+    :param create: Boolean to control whether the directory is created, e.g. not when only looking for a file in it
+    """
+    path = os.path.join(get_storage_root(), *parts)
+    if create:
+        os.makedirs(path, exist_ok=True)
+    return path
+
+
+def get_storage_namespace() -> Optional[str]:
+    return _storage_namespace.get()
+
+
+@contextmanager
+def use_storage_namespace(namespace: str) -> Iterator[None]:
+    """
+    Keep account-specific data written inside the block apart from other accounts'.
+    """
+    token = _storage_namespace.set(namespace)
+    try:
+        yield
+    finally:
+        _storage_namespace.reset(token)
+
+
+def get_account_storage_dir(*parts: str, create: bool = True) -> str:
+    """
+    Like get_storage_dir, for data that belongs to one account. Outside of a storage namespace
+    this is the same as get_storage_dir, so single-account runs keep their existing layout.
+    """
+    namespace = get_storage_namespace()
+    if namespace is None:
+        return get_storage_dir(*parts, create=create)
+    return get_storage_dir(ACCOUNTS_DIR_NAME, to_file_name(namespace), *parts, create=create)
+
+
+def to_file_name(*parts: str) -> str:
+    """
+    Build a filesystem-safe file name out of arbitrary strings.
+    """
+    return "__".join(re.sub(r"[^A-Za-z0-9_.-]", "_", part) for part in parts)
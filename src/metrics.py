@@ -0,0 +1,159 @@
+"""
+Per-stage run metrics: duration, row counts, API call counts and payload bytes, emitted once per run
+as a single CloudWatch embedded metric format (EMF) JSON record.
+"""
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterator, Optional
+
+from src.constants.metrics import (
+    METRICS_ACCOUNT_DIMENSION,
+    METRICS_DIMENSION,
+    METRICS_NAMESPACE,
+    METRICS_PIPELINE_NAME,
+    STAGE_NAME_SEPARATOR,
+    STAGES_PROPERTY,
+    UNTRACKED_STAGE_NAME,
+    EmfKeys,
+    StageMetric,
+)
+
+
+@dataclass
+class StageMetrics:
+    duration_ms: float = 0.0
+    rows: Optional[int] = None
+    api_calls: int = 0
+    payload_bytes: int = 0
+
+
+class RunMetrics:
+    """
+    Metrics of one pipeline run, keyed by stage name. Safe to update from the stage worker threads.
+    """
+
+    def __init__(self, pipeline_name: str = METRICS_PIPELINE_NAME, account_name: Optional[str] = None):
+        self.pipeline_name = pipeline_name
+        self.account_name = account_name
+        self.stages: Dict[str, StageMetrics] = {}
+        self._lock = threading.Lock()
+
+    def update(self, stage_name: str, **increments: Any) -> None:
+        """
+        Add to a stage's metrics, creating the stage if needed. Row counts are summed too,
+        so a stage that runs more than once reports its total.
+        """
+        with self._lock:
+            stage = self.stages.setdefault(stage_name, StageMetrics())
+            for metric, value in increments.items():
+                setattr(stage, metric, (getattr(stage, metric) or 0) + value)
+
+    def to_emf_record(self) -> Dict[str, Any]:
+        """
+        Build the run's EMF record: one metric per stage and measurement, named <stage>.<measurement>,
+        plus the raw per-stage values under "stages" for log queries.
+        """
+        with self._lock:
+            stages = {name: asdict(stage) for name, stage in self.stages.items()}
+        record: Dict[str, Any] = {METRICS_DIMENSION: self.pipeline_name, STAGES_PROPERTY: stages}
+        dimensions = [METRICS_DIMENSION]
+        if self.account_name is not None:
+            record[METRICS_ACCOUNT_DIMENSION] = self.account_name
+            dimensions.append(METRICS_ACCOUNT_DIMENSION)
+        metric_definitions = []
+        for stage_name, values in stages.items():
+            for metric in StageMetric:
+                value = values[metric.value.name]
+                if value is None:
+                    continue
+                metric_name = f"{stage_name}{STAGE_NAME_SEPARATOR}{metric.value.name}"
+                record[metric_name] = round(value, 3) if isinstance(value, float) else value
+                metric_definitions.append(
+                    {EmfKeys.NAME.value: metric_name, EmfKeys.UNIT.value: metric.value.unit}
+                )
+        record[EmfKeys.AWS.value] = {
+            EmfKeys.TIMESTAMP.value: int(time.time() * 1000),
+            EmfKeys.CLOUDWATCH_METRICS.value: [
+                {
+                    EmfKeys.NAMESPACE.value: METRICS_NAMESPACE,
+                    EmfKeys.DIMENSIONS.value: [dimensions],
+                    EmfKeys.METRICS.value: metric_definitions,
+                }
+            ],
+        }
+        return record
+
+    def emit(self) -> None:
+        """
+        Print the EMF record as one line. On Lambda, CloudWatch Logs turns it into metrics.
+        """
+        print(json.dumps(self.to_emf_record()))
+
+
+# Context variables rather than globals, so accounts exported concurrently each collect their own run
+_current_run: ContextVar[Optional[RunMetrics]] = ContextVar("current_run", default=None)
+_current_stage: ContextVar[Optional[str]] = ContextVar("current_stage", default=None)
+
+
+@contextmanager
+def collect_run_metrics(
+    pipeline_name: str = METRICS_PIPELINE_NAME, account_name: Optional[str] = None
+) -> Iterator[RunMetrics]:
+    """
+    Collect the metrics of every stage tracked inside the block and emit them when it exits,
+    including when the run fails.
+    """
+    run_metrics = RunMetrics(pipeline_name, account_name)
+    token = _current_run.set(run_metrics)
+    try:
+        yield run_metrics
+    finally:
+        _current_run.reset(token)
+        run_metrics.emit()
+
+
+@contextmanager
+def track_stage(name: str) -> Iterator[None]:
+    """
+    Time a stage and attribute the API calls and rows recorded inside it to that stage.
+    A stage tracked inside another one is named <parent>.<name>, and its time also counts towards the parent.
+    """
+    run_metrics = _current_run.get()
+    if run_metrics is None:
+        yield
+        return
+    parent = _current_stage.get()
+    stage_name = f"{parent}{STAGE_NAME_SEPARATOR}{name}" if parent else name
+    token = _current_stage.set(stage_name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _current_stage.reset(token)
+        run_metrics.update(stage_name, duration_ms=(time.perf_counter() - start) * 1000)
+
+
+def record_rows(rows: int) -> None:
+    run_metrics = _current_run.get()
+    if run_metrics is not None:
+        run_metrics.update(_current_stage.get() or UNTRACKED_STAGE_NAME, rows=rows)
+
+
+def record_api_call() -> None:
+    run_metrics = _current_run.get()
+    if run_metrics is not None:
+        run_metrics.update(_current_stage.get() or UNTRACKED_STAGE_NAME, api_calls=1)
+
+
+def record_payload_bytes(payload_bytes: int) -> None:
+    """
+    Add the bytes sent and received by one HTTP request, as measured by the transport.
+    """
+    run_metrics = _current_run.get()
+    if run_metrics is not None:
+        run_metrics.update(_current_stage.get() or UNTRACKED_STAGE_NAME, payload_bytes=payload_bytes)
@@ -0,0 +1,180 @@
+"""
+Destinations for the exported portfolio frames. The pipeline hands its final frames to every selected sink
+at once; sinks share the same frames, so they must treat them as read-only.
+"""
+
+import os
+import sqlite3
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from contextvars import copy_context
+from typing import Dict, Iterable, List, Optional
+
+import pandas as pd
+
+from src.constants.gsheets import DEFAULT_SPREADSHEET_NAME
+from src.constants.sinks import (
+    CSV_FILE_SUFFIX,
+    EXPORTS_DIR_NAME,
+    PARQUET_FILE_SUFFIX,
+    SQLITE_EXPORT_FILE_NAME,
+    OutputSinkType,
+)
+from src.external_services.google_sheets import get_sheets_writer
+from src.local_storage.storage_paths import get_account_storage_dir, to_file_name
+from src.metrics import track_stage
+
+
+class OutputSink(ABC):
+    """
+    Receives the exported frames, keyed by worksheet name. Implement this to export somewhere new.
+    """
+
+    name: str
+
+    def prepare(self) -> None:
+        """
+        Get ready to write, e.g. authenticate. Runs before the frames are ready, so it overlaps the fetches.
+        """
+
+    @abstractmethod
+    def write(self, frames: Dict[str, pd.DataFrame], columns: Optional[Dict[str, List[str]]] = None) -> None:
+        """
+        :param frames: Dictionary mapping worksheet name to its DataFrame
+        :param columns: Dictionary mapping worksheet name to the only columns that changed since the last write.
+                        Sinks that can update columns in place only write these; others write everything.
+        """
+
+
+class SheetsSink(OutputSink):
+    name = OutputSinkType.SHEETS.value
+
+    def __init__(self, spreadsheet_name: str = DEFAULT_SPREADSHEET_NAME, incremental: bool = False):
+        self.spreadsheet_name = spreadsheet_name
+        self.sheets_writer = get_sheets_writer(incremental=incremental)
+
+    def prepare(self) -> None:
+        self.sheets_writer.authorize()
+
+    def write(self, frames: Dict[str, pd.DataFrame], columns: Optional[Dict[str, List[str]]] = None) -> None:
+        if columns is None:
+            self.sheets_writer.write_dataframes(frames, self.spreadsheet_name)
+        else:
+            self.sheets_writer.write_columns(frames, columns, self.spreadsheet_name)
+
+
+class FileSink(OutputSink):
+    """
+    Sink writing one file per worksheet to a local directory. Files are replaced atomically.
+    """
+
+    suffix: str
+
+    def __init__(self, directory: Optional[str] = None):
+        self.directory = directory or get_account_storage_dir(EXPORTS_DIR_NAME)
+
+    def prepare(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+
+    @abstractmethod
+    def write_file(self, frame: pd.DataFrame, path: str) -> None:
+        pass
+
+    def write(self, frames: Dict[str, pd.DataFrame], columns: Optional[Dict[str, List[str]]] = None) -> None:
+        for worksheet_name, frame in frames.items():
+            path = os.path.join(self.directory, to_file_name(worksheet_name) + self.suffix)
+            temp_path = path + ".tmp"
+            self.write_file(frame, temp_path)
+            os.replace(temp_path, path)
+        print(f"Wrote {len(frames)} {self.name} file(s) to {self.directory}")
+
+
+class CsvSink(FileSink):
+    name = OutputSinkType.CSV.value
+    suffix = CSV_FILE_SUFFIX
+
+    def write_file(self, frame: pd.DataFrame, path: str) -> None:
+        frame.to_csv(path, index=False)
+
+
+class ParquetSink(FileSink):
+    name = OutputSinkType.PARQUET.value
+    suffix = PARQUET_FILE_SUFFIX
+
+    def write_file(self, frame: pd.DataFrame, path: str) -> None:
+        frame.to_parquet(path, index=False)
+
+
+class SqliteSink(OutputSink):
+    """
+    Sink writing every worksheet to a table of one SQLite database, replacing the table on each export.
+    """
+
+    name = OutputSinkType.SQLITE.value
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(get_account_storage_dir(EXPORTS_DIR_NAME), SQLITE_EXPORT_FILE_NAME)
+
+    def prepare(self) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+    def write(self, frames: Dict[str, pd.DataFrame], columns: Optional[Dict[str, List[str]]] = None) -> None:
+        # One transaction, so readers never see some tables from this export and some from the last one
+        with closing(sqlite3.connect(self.path)) as connection, connection:
+            for worksheet_name, frame in frames.items():
+                frame.to_sql(worksheet_name, connection, if_exists="replace", index=False)
+        print(f"Wrote {len(frames)} table(s) to {self.path}")
+
+
+def create_output_sinks(
+    sink_types: Iterable[OutputSinkType],
+    spreadsheet_name: str = DEFAULT_SPREADSHEET_NAME,
+    incremental: bool = False,
+) -> List[OutputSink]:
+    """
+    Create the sinks selected for an export.
+    :param sink_types: Sinks to write to
+    :param spreadsheet_name: Spreadsheet written by the Sheets sink
+    :param incremental: Boolean to control whether the Sheets sink only writes changed cells
+    :return: List of sinks
+    """
+    sinks = []
+    for sink_type in dict.fromkeys(OutputSinkType(sink_type) for sink_type in sink_types):
+        if sink_type == OutputSinkType.SHEETS:
+            sinks.append(SheetsSink(spreadsheet_name, incremental))
+        elif sink_type == OutputSinkType.CSV:
+            sinks.append(CsvSink())
+        elif sink_type == OutputSinkType.PARQUET:
+            sinks.append(ParquetSink())
+        elif sink_type == OutputSinkType.SQLITE:
+            sinks.append(SqliteSink())
+    return sinks
+
+
+def write_to_sinks(
+    sinks: List[OutputSink],
+    frames: Dict[str, pd.DataFrame],
+    columns: Optional[Dict[str, List[str]]] = None,
+) -> None:
+    """
+    Write the same frames to every sink concurrently, without copying them. A failing sink doesn't stop
+    the others; failures are raised once every sink is done.
+    :param sinks: Sinks to write to
+    :param frames: Dictionary mapping worksheet name to the DataFrame written to it
+    :param columns: Dictionary mapping worksheet name to the only columns that changed, if not all of them
+    """
+
+    def write_to_sink(sink: OutputSink) -> None:
+        with track_stage(sink.name):
+            sink.write(frames, columns)
+
+    with ThreadPoolExecutor(max_workers=max(len(sinks), 1)) as executor:
+        futures = {
+            sink.name: executor.submit(copy_context().run, write_to_sink, sink) for sink in sinks
+        }
+    failures = {name: future.exception() for name, future in futures.items() if future.exception()}
+    for name, error in failures.items():
+        print(f"Writing to {name} failed: {error!r}")
+    if failures:
+        raise RuntimeError(f"Failed to write to sink(s): {', '.join(failures)}")
@@ -1,53 +1,205 @@
-from datetime import datetime
-from functools import cache
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 
-from src.constants.additional_columns import ColumnNames
-from src.constants.common import DataFrameMergeType, MONTHS_IN_QUARTER, PANDAS_ERROR_COERCE
+from src.constants.additional_columns import ColumnNames, DividendWindow
+from src.constants.common import (
+    CATEGORY_DTYPE,
+    DataFrameMergeType,
+    FLOAT_DTYPE,
+    MONTHS_IN_QUARTER,
+    NANOSECOND_DTYPE,
+    PANDAS_ERROR_COERCE,
+)
 from src.constants.robinhood import (
+    CATEGORICAL_API_FIELDS,
+    PAID_DIVIDEND_STATES,
+    CryptoDataKeys,
     RobinhoodApiData,
     RobinhoodDividendStatus,
     RobinhoodCategories,
     MONTHLY_DIVIDEND_TICKERS,
 )
-from src.external_services.robinhood import get_dividends, get_stock_fundamentals
+from src.external_services.robinhood import (
+    get_dividends_since,
+    get_stock_fundamentals,
+)
+from src.local_storage.dividend_store import DividendStore
+from src.run_cache import run_cached
+
+# Declared type of each API field, used to give ingested columns their final dtype
+API_FIELD_TYPES = {column.value.name: column.value.type for column in RobinhoodApiData}
+
+
+def to_typed_column(field: str, values: List[Any]) -> Any:
+    """
+    Convert the raw values of one API field to an array of its declared type: float64 for numbers,
+    tz-aware UTC datetimes for dates and categoricals for low-cardinality fields.
+    Undeclared fields are kept as they are.
+    """
+    if field in CATEGORICAL_API_FIELDS:
+        return pd.array(values, dtype=CATEGORY_DTYPE)
+    field_type = API_FIELD_TYPES.get(field)
+    if field_type is float:
+        return pd.to_numeric(
+            np.asarray(values, dtype=object), errors=PANDAS_ERROR_COERCE
+        ).astype(FLOAT_DTYPE, copy=False)
+    if field_type is datetime:
+        return pd.to_datetime(values, utc=True)
+    return values
+
+
+def records_to_dataframe(
+    records: Iterable[Dict[str, Any]], leading_columns: Optional[Dict[str, List[Any]]] = None
+) -> pd.DataFrame:
+    """
+    Build a DataFrame column by column from API records, converting every field to its final dtype
+    on the way in instead of parsing object columns after the fact.
+    :param records: API records, one per row. Fields missing from a record become NaN.
+    :param leading_columns: Columns placed before the record fields, e.g. the keys the records were listed under
+    :return: DataFrame with one column per field, in order of first appearance
+    """
+    records = list(records)
+    columns = dict(leading_columns or {})
+    for field in dict.fromkeys(field for record in records for field in record):
+        columns[field] = to_typed_column(field, [record.get(field) for record in records])
+    return pd.DataFrame(columns)
+
+
+def crypto_positions_to_dataframe(positions: List[Dict[str, Any]]) -> pd.DataFrame:
+    """
+    Parse crypto positions into one row per currency in a single vectorized pass. The average buy price
+    spans every lot in the position's cost bases, not just the first one.
+    :param positions: Crypto position records
+    :return: DataFrame with the ticker, name, average buy price and quantity of each position
+    """
+    ticker = RobinhoodApiData.TICKER.value.name
+    cost_basis_columns = [CryptoDataKeys.DIRECT_COST_BASIS.value, CryptoDataKeys.DIRECT_QUANTITY.value]
+    currency_code = f"{CryptoDataKeys.CURRENCY}.{CryptoDataKeys.TICKER_CODE}"
+    currency_name = f"{CryptoDataKeys.CURRENCY}.{CryptoDataKeys.NAME}"
+
+    holdings = pd.json_normalize(positions).reindex(
+        columns=[currency_code, currency_name, CryptoDataKeys.QUANTITY.value]
+    )
+    portfolio = pd.DataFrame(
+        {
+            ticker: holdings[currency_code],
+            RobinhoodApiData.NAME.value.name: holdings[currency_name],
+            RobinhoodApiData.QUANTITY.value.name: to_typed_column(
+                RobinhoodApiData.QUANTITY.value.name, holdings[CryptoDataKeys.QUANTITY.value].tolist()
+            ),
+        }
+    )
+
+    lots = pd.json_normalize(
+        [position for position in positions if position.get(CryptoDataKeys.COST_BASES)],
+        record_path=CryptoDataKeys.COST_BASES.value,
+        meta=[[CryptoDataKeys.CURRENCY.value, CryptoDataKeys.TICKER_CODE.value]],
+    ).reindex(columns=cost_basis_columns + [currency_code])
+    lots[cost_basis_columns] = lots[cost_basis_columns].apply(pd.to_numeric, errors=PANDAS_ERROR_COERCE)
+    cost_bases = lots.groupby(currency_code)[cost_basis_columns].sum()
+    average_buy_prices = (
+        cost_bases[CryptoDataKeys.DIRECT_COST_BASIS] / cost_bases[CryptoDataKeys.DIRECT_QUANTITY]
+    ).replace([np.inf, -np.inf], np.nan)
+    # Positions without a cost basis, e.g. received rather than bought, cost nothing
+    portfolio.insert(
+        2,
+        RobinhoodApiData.AVG_BUY_PRICE.value.name,
+        portfolio[ticker].map(average_buy_prices).fillna(0).astype(FLOAT_DTYPE),
+    )
+    return portfolio
+
+
+def sync_dividend_ledger() -> List[Dict[str, Any]]:
+    """
+    Bring the local dividend ledger up to date and return all of its records.
+    Only records payable on or after the stored high-water mark (or the oldest pending record) are fetched.
+    """
+    store = DividendStore()
+    cutoff_date = store.get_sync_cutoff()
+    print(f"Syncing dividend ledger from {cutoff_date or 'the beginning'}")
+    store.upsert(get_dividends_since(cutoff_date))
+    return store.get_all()
 
 
-@cache
 def get_dividend_history() -> pd.DataFrame:
-    dividends = get_dividends()
-    df = pd.DataFrame(dividends)
+    """
+    Get the account's dividend history, parsed once into its final dtypes: tz-aware UTC dates,
+    float amounts and categorical state. The frame is sorted and indexed by instrument and payable date.
+    It is cached for the rest of the run and shared between callers, so its arrays are read-only:
+    derive new frames from it instead of modifying it in place.
+    """
+    # A shallow copy shares the cached arrays, which are read-only, but not the cached frame's columns or index
+    return load_dividend_history().copy(deep=False)
+
+
+@run_cached
+def load_dividend_history() -> pd.DataFrame:
+    """
+    Sync the dividend ledger and build the dividend history of the current account, once per run.
+    """
+    df = records_to_dataframe(sync_dividend_ledger())
 
     # Filter out voided dividends
     df = df[
         df[RobinhoodApiData.DVD_STATUS.value.name]
         != RobinhoodDividendStatus.VOIDED.value
     ]
+    return to_read_only(
+        df.set_index(
+            [RobinhoodApiData.INSTRUMENT.value.name, RobinhoodApiData.PAYABLE_DATE.value.name]
+        ).sort_index()
+    )
+
+
+def to_read_only(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Copy a DataFrame into arrays marked as non-writeable, so writing to it in place raises
+    instead of changing data shared with other callers. Frames derived from it get writeable arrays of their own.
+    """
+    # Copied so that every column is held by an array of its own rather than a view of a shared one
+    df = df.copy()
+    for _, column in df.items():
+        if column.dtype == CATEGORY_DTYPE:
+            values = column.array.codes
+        elif isinstance(column.dtype, pd.DatetimeTZDtype):
+            values = column.array.asi8
+        else:
+            values = column.to_numpy()
+        # Column arrays are views of the arrays pandas writes into
+        (values if values.base is None else values.base).flags.writeable = False
     return df
 
 
-def add_latest_dividend_information(portfolio: pd.DataFrame) -> pd.DataFrame:
+def get_dividends_paid_to_date() -> pd.DataFrame:
     """
-    Get dividend history of the account and keep only one row containing the latest dividend information for each holding.
+    Total paid or reinvested dividends per instrument over the account's whole history.
+    :return: DataFrame with an instrument column and the amount paid to date
     """
     dividend_df = get_dividend_history()
-
-    # Convert payable date column to datetime
-    dividend_df[RobinhoodApiData.PAYABLE_DATE.value.name] = pd.to_datetime(
-        dividend_df[RobinhoodApiData.PAYABLE_DATE.value.name]
+    is_paid = dividend_df[RobinhoodApiData.DVD_STATUS.value.name].isin(PAID_DIVIDEND_STATES)
+    paid_df = (
+        dividend_df.loc[is_paid, RobinhoodApiData.DVD_AMOUNT.value.name]
+        .groupby(level=RobinhoodApiData.INSTRUMENT.value.name, observed=True)
+        .sum()
+        .rename(RobinhoodApiData.TOTAL_DVD_AMT_PAID.value.name)
     )
+    paid_df.index = paid_df.index.astype(str)
+    return paid_df.reset_index()
 
-    # Sort by latest payable date
-    dividend_df = dividend_df.sort_values(
-        by=RobinhoodApiData.PAYABLE_DATE.value.name, ascending=False
-    )
 
-    # Group by ticker name
-    dividend_groups = dividend_df.groupby(
-        by=RobinhoodApiData.INSTRUMENT.value.name, as_index=False
-    )
-    dividend_df = dividend_groups.first()
+def add_latest_dividend_information(portfolio: pd.DataFrame) -> pd.DataFrame:
+    """
+    Get dividend history of the account and keep only one row containing the latest dividend information for each holding.
+    """
+    # History is sorted by payable date within each instrument, so the last row is the latest dividend
+    dividend_df = get_dividend_history().groupby(
+        level=RobinhoodApiData.INSTRUMENT.value.name, observed=True
+    ).last()
+    dividend_df.index = dividend_df.index.astype(str)
+    dividend_df = dividend_df.reset_index()
 
     # Merge into portfolio
     portfolio = portfolio.merge(
@@ -56,6 +208,14 @@ def add_latest_dividend_information(portfolio: pd.DataFrame) -> pd.DataFrame:
         on=RobinhoodApiData.INSTRUMENT.value.name,
     )
 
+    # Holdings built natively don't carry the amount paid to date, so derive it from the dividend history
+    if RobinhoodApiData.TOTAL_DVD_AMT_PAID.value.name not in portfolio.columns:
+        portfolio = portfolio.merge(
+            get_dividends_paid_to_date(),
+            how=DataFrameMergeType.LEFT.value,
+            on=RobinhoodApiData.INSTRUMENT.value.name,
+        )
+
     # Replace NaN with 0 for dividend columns
     for column in RobinhoodApiData:
         if (
@@ -77,9 +237,7 @@ def add_latest_dividend_information(portfolio: pd.DataFrame) -> pd.DataFrame:
             RobinhoodApiData.DVD_RATE.value.name,
             RobinhoodApiData.LAST_DIVIDEND.value.name,
         ],
-    ].apply(
-        lambda x: x.astype(float) * MONTHS_IN_QUARTER
-    )
+    ] * MONTHS_IN_QUARTER
 
     return portfolio
 
@@ -89,7 +247,14 @@ def add_fundamentals_information(portfolio: pd.DataFrame) -> pd.DataFrame:
     Add stock fundamentals to the portfolio dataframe.
     """
     tickers = list(portfolio[RobinhoodApiData.TICKER.value.name])
-    fundamentals = get_stock_fundamentals(tickers)
+    fields = [RobinhoodApiData.INSTRUMENT.value.name] + [
+        column.value.name
+        for column in RobinhoodApiData
+        if column.value.category == RobinhoodCategories.FUNDAMENTALS.value
+    ]
+    # Holdings may already carry some of these, e.g. the instrument URL
+    fields = [field for field in fields if field not in portfolio.columns]
+    fundamentals = get_stock_fundamentals(tickers, fields=fields)
 
     df = pd.DataFrame(fundamentals)
     portfolio = portfolio.merge(
@@ -101,80 +266,74 @@ def add_fundamentals_information(portfolio: pd.DataFrame) -> pd.DataFrame:
     return portfolio
 
 
-@cache
-def get_last_year_and_ytd_dividend():
+def get_default_dividend_windows(today: datetime) -> Tuple[DividendWindow, ...]:
     """
-    Function to get the total dividends received in the previous year and YTD.
+    Windows for the dividends paid in the last full calendar year and YTD.
     """
-    dividend_df = get_dividend_history()
-    # Remove future dividend payments and convert pay date to datetime
-    dividend_df = dividend_df.dropna(subset=[RobinhoodApiData.PAID_AT_DATE.value.name])
-    dividend_df[RobinhoodApiData.PAID_AT_DATE.value.name] = pd.to_datetime(
-        dividend_df[RobinhoodApiData.PAID_AT_DATE.value.name]
+    return (
+        DividendWindow(
+            column_name=ColumnNames.LAST_YEAR_DVD.value.name,
+            start=datetime(today.year - 1, 1, 1, tzinfo=timezone.utc),
+            end=datetime(today.year - 1, 12, 31, tzinfo=timezone.utc),
+        ),
+        DividendWindow(
+            column_name=ColumnNames.YTD_DVD.value.name,
+            start=datetime(today.year, 1, 1, tzinfo=timezone.utc),
+            end=today,
+        ),
     )
-    # Convert pay date to be timezone-naive
-    dividend_df[RobinhoodApiData.PAID_AT_DATE.value.name] = dividend_df[
-        RobinhoodApiData.PAID_AT_DATE.value.name
-    ].dt.tz_localize(None)
-
-    # Convert the amount column to float
-    dividend_df[RobinhoodApiData.DVD_AMOUNT.value.name] = pd.to_numeric(
-        dividend_df[RobinhoodApiData.DVD_AMOUNT.value.name], errors=PANDAS_ERROR_COERCE
+
+
+def aggregate_dividends_by_window(
+    dividend_df: pd.DataFrame, windows: Tuple[DividendWindow, ...]
+) -> pd.DataFrame:
+    """
+    Calculate the total dividends paid per instrument in every window with a single grouped pass.
+    Each payment is assigned to all windows its pay date falls in, so the cost of the groupby
+    doesn't grow with the number of windows.
+    :param dividend_df: Dividend history indexed by instrument, as returned by get_dividend_history
+    :param windows: Pay date windows with tz-aware bounds, inclusive at both ends
+    :return: Wide DataFrame with an instrument column and one total column per window
+    """
+    # Unpaid dividends have no pay date (NaT), which never falls inside a window
+    paid_at = dividend_df[RobinhoodApiData.PAID_AT_DATE.value.name].values.astype(NANOSECOND_DTYPE)
+    amounts = dividend_df[RobinhoodApiData.DVD_AMOUNT.value.name].to_numpy(
+        dtype=float, na_value=0
     )
-    # Group by holding and sort by recent pay dates
-    dividend_df = dividend_df.sort_values(
-        by=[
-            RobinhoodApiData.INSTRUMENT.value.name,
-            RobinhoodApiData.PAID_AT_DATE.value.name,
-        ],
-        ascending=[True, False],
+    starts = np.array(
+        [pd.Timestamp(window.start).tz_convert(timezone.utc).tz_localize(None) for window in windows],
+        dtype=NANOSECOND_DTYPE,
+    )
+    ends = np.array(
+        [pd.Timestamp(window.end).tz_convert(timezone.utc).tz_localize(None) for window in windows],
+        dtype=NANOSECOND_DTYPE,
     )
 
-    def filter_by_pay_date(start_date: datetime, end_date: datetime, column_name: str) -> pd.DataFrame:
-        """
-        Filter by dividend pay date and calculate the total amount paid.
-        :param start_date: Start date for filtering
-        :param end_date: End date for filtering
-        :param column_name: Column name to rename 'amount' to
-        :return: Dataframe containing sum of dividends paid in the timeframe provided
-        """
-        filtered_df = dividend_df[
-            (dividend_df[RobinhoodApiData.PAID_AT_DATE.value.name] >= start_date)
-            & (dividend_df[RobinhoodApiData.PAID_AT_DATE.value.name] <= end_date)
-        ]
-        # Group by ticker and calculate the total dividends for each period
-        totals_df = (
-            filtered_df.groupby(RobinhoodApiData.INSTRUMENT.value.name)[
-                RobinhoodApiData.DVD_AMOUNT.value.name
-            ]
-            .sum()
-            .reset_index()
-        )
-        totals_df.rename(
-            columns={
-                RobinhoodApiData.DVD_AMOUNT.value.name: column_name
-            },
-            inplace=True,
-        )
-        return totals_df
+    in_window = (paid_at[:, None] >= starts) & (paid_at[:, None] <= ends)
+    window_amounts = pd.DataFrame(
+        in_window * amounts[:, None],
+        columns=[window.column_name for window in windows],
+        index=dividend_df.index.get_level_values(RobinhoodApiData.INSTRUMENT.value.name),
+    )
+    totals_df = window_amounts.groupby(
+        level=RobinhoodApiData.INSTRUMENT.value.name, observed=True
+    ).sum()
+    totals_df.index = totals_df.index.astype(str)
+    return totals_df.reset_index()
 
 
-    # Dates to filter out dividend payments
-    today = datetime.today()
-    start_of_current_year = datetime(today.year, 1, 1)
-    start_of_last_year = datetime(today.year - 1, 1, 1)
-    end_of_last_year = datetime(today.year - 1, 12, 31)
+def get_dividend_window_totals(windows: Tuple[DividendWindow, ...]) -> pd.DataFrame:
+    """
+    Function to get the total dividends received per instrument in each of the given windows.
+    """
+    return aggregate_dividends_by_window(get_dividend_history(), windows)
 
-    # Filter for dividends paid in the last full calendar year
-    last_year_dividends_df = filter_by_pay_date(start_of_last_year, end_of_last_year, column_name=ColumnNames.LAST_YEAR_DVD.value.name)
-    # Filter for dividends paid YTD
-    ytd_dividends_df = filter_by_pay_date(start_of_current_year, today, column_name=ColumnNames.YTD_DVD.value.name)
 
-    # Merge the two totals
-    total_dividends = pd.merge(
-        last_year_dividends_df,
-        ytd_dividends_df,
-        on=RobinhoodApiData.INSTRUMENT.value.name,
-        how=DataFrameMergeType.OUTER,
-    ).fillna(0)
-    return total_dividends
+@run_cached
+def get_last_year_and_ytd_dividend() -> pd.DataFrame:
+    """
+    Function to get the total dividends received in the previous year and YTD.
+    """
+    return get_dividend_window_totals(
+        get_default_dividend_windows(datetime.now(timezone.utc))
+    )
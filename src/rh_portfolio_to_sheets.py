@@ -3,54 +3,102 @@ File containing the logic of exporting a Robinhood portfolio to Google Sheets.
 """
 
 import pandas as pd
-from typing import Dict
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from typing import Dict, List, Optional
 
-from src.external_services.google_sheets import write_to_sheets
 from src.external_services.robinhood import (
     get_rh_portfolio,
-    get_crypto_portfolio,
+    get_crypto_positions,
+    get_crypto_prices,
+    get_latest_prices,
+    login,
 )
+from src.external_services.robinhood_accounts import get_current_account, use_account
 from src.constants.robinhood import (
+    RobinhoodAccount,
     RobinhoodApiData,
     RobinhoodProductTypes,
 )
-from src.constants.additional_columns import CalculatedColumnManager, ColumnNames
+from src.constants.additional_columns import (
+    CalculatedColumnManager,
+    ColumnNames,
+)
 from src.constants.report import (
     BASE_SHEET_HEADERS,
+    CRYPTO_SHEET_HEADERS,
     FUNDAMENTALS_HEADERS,
     DIVIDEND_HEADERS,
+    MARKET_HEADERS,
 )
+from src.constants.common import CATEGORY_DTYPE
 from src.constants.gsheets import (
+    DEFAULT_SPREADSHEET_NAME,
     RH_STOCK_DUMP_SHEET_NAME,
     RH_ETF_DUMP_SHEET_NAME,
     RH_CRYPTO_DUMP_SHEET_NAME,
 )
+from src.constants.pipeline import (
+    DEFAULT_MAX_CONCURRENT_ACCOUNTS,
+    DEFAULT_MAX_STAGE_WORKERS,
+    DiversityScope,
+    PipelineStage,
+)
+from src.constants.metrics import METRICS_PIPELINE_NAME, PRICES_ONLY_PIPELINE_NAME
+from src.constants.sinks import DEFAULT_OUTPUT_SINKS
+from src.constants.storage import LOCAL_STORAGE_DIR_ENV_VAR, CachedPortfolio, SnapshotPortfolio
 from src.rh_data_util import (
     add_latest_dividend_information,
     add_fundamentals_information,
+    crypto_positions_to_dataframe,
+    get_dividend_history,
     get_last_year_and_ytd_dividend,
+    records_to_dataframe,
 )
+from src.local_storage.portfolio_cache import PortfolioCache
+from src.local_storage.snapshot_archive import SnapshotArchive
+from src.metrics import collect_run_metrics, track_stage
+from src.output_sinks import create_output_sinks, write_to_sinks
+from src.run_cache import use_run_cache
+from src.stage_graph import StageGraph
 
 
 def get_rh_portfolio_as_df(is_live=False, write_mock=False) -> pd.DataFrame:
     portfolio_dict = get_rh_portfolio(is_live=is_live, write_to_mock=write_mock)
-    # Transpose to get all attributes as the columns
-    portfolio_df = pd.DataFrame(portfolio_dict).transpose()
-    # Add indexes as a separate column
-    portfolio_df = portfolio_df.reset_index(names=RobinhoodApiData.TICKER.value.name)
+    # Holdings are keyed by ticker, which becomes the first column
+    return records_to_dataframe(
+        portfolio_dict.values(),
+        leading_columns={RobinhoodApiData.TICKER.value.name: list(portfolio_dict)},
+    )
 
-    return portfolio_df
+
+def get_held_crypto_prices(portfolio: pd.DataFrame) -> Dict[str, float]:
+    is_held = portfolio[RobinhoodApiData.QUANTITY.value.name] > 0
+    return get_crypto_prices(portfolio.loc[is_held, RobinhoodApiData.TICKER.value.name])
 
 
 def get_crypto_portfolio_as_df(is_live=False) -> pd.DataFrame:
-    crypto_portfolio = get_crypto_portfolio(is_live)
-    portfolio_df = pd.DataFrame(crypto_portfolio)
-    portfolio_df = portfolio_df.sort_values(
-        by=ColumnNames.TOTAL.value.label, ascending=False
+    """
+    Get crypto holdings with their cost, current market value and unrealized profit or loss.
+    """
+    portfolio_df = crypto_positions_to_dataframe(get_crypto_positions(is_live))
+    prices = get_held_crypto_prices(portfolio_df)
+    portfolio_df[RobinhoodApiData.PRICE.value.name] = (
+        portfolio_df[RobinhoodApiData.TICKER.value.name].map(prices).astype(float)
     )
+
+    custom_columns = CalculatedColumnManager(portfolio_df)
+    custom_columns.add_total_column()
+    custom_columns.add_market_value_column()
+    custom_columns.add_unrealized_pnl_column()
     return portfolio_df
 
 
+def prepare_crypto_portfolio_for_export(portfolio: pd.DataFrame) -> pd.DataFrame:
+    portfolio = portfolio.sort_values(by=ColumnNames.TOTAL.value.name, ascending=False)
+    return portfolio.rename(columns=CRYPTO_SHEET_HEADERS)
+
+
 def get_spreadsheet_column_headers() -> Dict[str, str]:
     """
     Function to select the column headers to be printed in the sheet.
@@ -59,6 +107,9 @@ def get_spreadsheet_column_headers() -> Dict[str, str]:
     headers = BASE_SHEET_HEADERS.copy()
     headers.update(FUNDAMENTALS_HEADERS)
     headers.update(DIVIDEND_HEADERS)
+    # Written by full exports too, so a price-only refresh has columns to update. They add three columns to the
+    # stock and ETF tabs, placed last so the columns before them keep their positions in the sheet.
+    headers.update(MARKET_HEADERS)
 
     return headers
 
@@ -85,71 +136,329 @@ def select_columns_to_export(portfolio: pd.DataFrame) -> pd.DataFrame:
 
 
 def add_extra_information(portfolio: pd.DataFrame) -> pd.DataFrame:
+    """
+    Enrich holdings with fundamentals, dividends and the calculated columns that don't depend on
+    how the portfolio is later split into tabs.
+    """
     # Get additional information
     print("Getting fundamentals data")
-    portfolio = add_fundamentals_information(portfolio)
+    with track_stage("fundamentals"):
+        portfolio = add_fundamentals_information(portfolio)
 
     print("Getting dividend data")
-    portfolio = add_latest_dividend_information(portfolio)
+    with track_stage("latest_dividend"):
+        portfolio = add_latest_dividend_information(portfolio)
 
     # Calculated columns
     print("Adding columns for additional calculated information")
-    custom_columns = CalculatedColumnManager(portfolio)
-    custom_columns.add_total_column()
-    custom_columns.add_diversity_column()
-    custom_columns.add_projected_dividend_column()
-    portfolio = custom_columns.add_dividend_payout_columns(
-        get_last_year_and_ytd_dividend()
-    )
+    with track_stage("calculated_columns"):
+        custom_columns = CalculatedColumnManager(portfolio)
+        custom_columns.add_total_column()
+        custom_columns.add_market_value_column()
+        custom_columns.add_unrealized_pnl_column()
+        custom_columns.add_projected_dividend_column()
+        portfolio = custom_columns.add_dividend_payout_columns(
+            get_last_year_and_ytd_dividend()
+        )
     return portfolio
 
 
-def write_required_columns_to_sheets(portfolio: pd.DataFrame, worksheet_name: str):
-    print("Adding additional columns and information")
-    portfolio = add_extra_information(portfolio)
+def prepare_portfolio_for_export(
+    portfolio: pd.DataFrame, diversity_total: Optional[float] = None
+) -> pd.DataFrame:
+    """
+    Reduce an enriched holdings DataFrame to the columns printed in the sheet.
+    :param portfolio: DataFrame of enriched holdings
+    :param diversity_total: Denominator for the diversity column. Defaults to the total of these holdings.
+    :return: DataFrame ready to be written
+    """
+    print("Adding diversity column")
+    CalculatedColumnManager(portfolio).add_diversity_column(diversity_total)
 
     print("Sorting values by total invested")
     portfolio = portfolio.sort_values(by=ColumnNames.TOTAL.value.name, ascending=False)
 
     print("Dropping columns that are not required")
-    portfolio = select_columns_to_export(portfolio)
+    with track_stage("column_selection"):
+        return select_columns_to_export(portfolio)
 
-    write_to_sheets(portfolio, worksheet_name)
+
+def filter_by_product_type(portfolio: pd.DataFrame, is_etf: bool) -> pd.DataFrame:
+    """
+    Function to split the portfolio into stocks and ETFs.
+    :param portfolio: DataFrame of holdings
+    :param is_etf: Boolean to control whether ETFs or everything else is kept
+    :return: DataFrame
+    """
+    is_etp = (
+        portfolio[RobinhoodApiData.TYPE.value.name] == RobinhoodProductTypes.ETP.value
+    )
+    return portfolio[is_etp if is_etf else ~is_etp].copy()
 
 
-def export_rh_portfolio_to_sheets(is_live, write_mock) -> None:
+def build_export_graph(
+    is_live,
+    write_mock,
+    max_workers=DEFAULT_MAX_STAGE_WORKERS,
+    incremental=False,
+    diversity_scope=DiversityScope.TAB,
+    archive_snapshots=True,
+    spreadsheet_name=DEFAULT_SPREADSHEET_NAME,
+    sinks=DEFAULT_OUTPUT_SINKS,
+    prices_only=False,
+    cache_for_prices_only=False,
+) -> StageGraph:
+    """
+    Build the stage graph for an export. Stages only wait on the data they consume,
+    so independent network calls (dividends, crypto, output authorization) overlap.
+    :param is_live: Boolean to control whether portfolio data is fetched from Robinhood or mock file
+    :param write_mock: Boolean to control whether portfolio data is written to mock file
+    :param max_workers: Maximum number of stages running at the same time
+    :param incremental: Boolean to control whether only changed cells are written to the sheet
+    :param diversity_scope: Whether diversity is relative to each tab or to the whole portfolio
+    :param archive_snapshots: Boolean to control whether the exported portfolios are appended to the local archive
+    :param spreadsheet_name: Name of the spreadsheet the portfolios are written to
+    :param sinks: Output sinks the portfolios are written to
+    :param prices_only: Boolean to control whether only the prices of the last full export's holdings are refreshed,
+                        writing just the columns that depend on them
+    :param cache_for_prices_only: Boolean to control whether a full export caches the portfolio for later
+                                  prices-only exports
+    :return: StageGraph
+    """
+
+    def get_holdings(_login):
+        print("Getting RH portfolio as dataframe")
+        portfolio_df = get_rh_portfolio_as_df(is_live, write_mock)
+        print("Replace NaN with 0 across DF")
+        # Categorical columns can't hold 0, so their missing values are left as they are
+        categorical_columns = portfolio_df.select_dtypes(CATEGORY_DTYPE).columns
+        return portfolio_df.fillna(dict.fromkeys(portfolio_df.columns.drop(categorical_columns), 0))
+
+    def enrich_portfolio(holdings, _dividend_history, _dividend_totals):
+        print("Adding additional columns and information")
+        return add_extra_information(holdings)
+
+    def refresh_portfolio_prices(_login):
+        print("Getting latest prices of the cached portfolio")
+        portfolio = PortfolioCache().load(CachedPortfolio.ENRICHED)
+        prices = get_latest_prices(portfolio[RobinhoodApiData.TICKER.value.name].tolist())
+        CalculatedColumnManager(portfolio).update_price_columns(prices)
+        return portfolio
+
+    def refresh_crypto_prices(_login):
+        print("Getting latest prices of the cached crypto portfolio")
+        portfolio = PortfolioCache().load(CachedPortfolio.CRYPTO)
+        CalculatedColumnManager(portfolio).update_price_columns(get_held_crypto_prices(portfolio))
+        return portfolio
+
+    def cache_portfolio(portfolio, crypto_portfolio):
+        print("Caching portfolio for price-only refreshes")
+        portfolio_cache = PortfolioCache()
+        portfolio_cache.save(CachedPortfolio.ENRICHED, portfolio)
+        portfolio_cache.save(CachedPortfolio.CRYPTO, crypto_portfolio)
+
+    def get_diversity_total(portfolio):
+        if diversity_scope == DiversityScope.PORTFOLIO:
+            return portfolio[ColumnNames.TOTAL.value.name].sum()
+        return None
+
+    def prepare_stocks(portfolio):
+        print("Preparing stock portfolio")
+        return prepare_portfolio_for_export(
+            filter_by_product_type(portfolio, is_etf=False), get_diversity_total(portfolio)
+        )
+
+    def prepare_etfs(portfolio):
+        print("Preparing ETF portfolio")
+        return prepare_portfolio_for_export(
+            filter_by_product_type(portfolio, is_etf=True), get_diversity_total(portfolio)
+        )
+
+    def write_outputs(stock_portfolio, etf_portfolio, crypto_portfolio, output_sinks):
+        print(f"Writing stock, ETF and crypto portfolios to {', '.join(sink.name for sink in output_sinks)}")
+        frames = {
+            RH_STOCK_DUMP_SHEET_NAME: stock_portfolio,
+            RH_ETF_DUMP_SHEET_NAME: etf_portfolio,
+            RH_CRYPTO_DUMP_SHEET_NAME: crypto_portfolio,
+        }
+        columns = dict.fromkeys(frames, list(MARKET_HEADERS.values())) if prices_only else None
+        write_to_sinks(output_sinks, frames, columns)
+
+    def archive_snapshots_locally(stock_portfolio, etf_portfolio, crypto_portfolio):
+        print("Archiving portfolio snapshots")
+        SnapshotArchive().append(
+            {
+                SnapshotPortfolio.STOCK: stock_portfolio,
+                SnapshotPortfolio.ETF: etf_portfolio,
+                SnapshotPortfolio.CRYPTO: crypto_portfolio,
+            }
+        )
+
+    def prepare_outputs():
+        output_sinks = create_output_sinks(sinks, spreadsheet_name, incremental)
+        for sink in output_sinks:
+            sink.prepare()
+        return output_sinks
+
+    graph = StageGraph(max_workers=max_workers)
+    graph.add_stage(PipelineStage.LOGIN, login)
+    graph.add_stage(PipelineStage.PREPARE_OUTPUTS, prepare_outputs)
+    if prices_only:
+        portfolio_cache = PortfolioCache()
+        missing = [portfolio.value for portfolio in CachedPortfolio if not portfolio_cache.is_cached(portfolio)]
+        if missing:
+            raise RuntimeError(
+                f"Prices-only export found no cached {', '.join(missing)} portfolio in {portfolio_cache.directory}. "
+                "Run a full export with cache_for_prices_only first, with a local storage directory that outlives "
+                f"the run, e.g. {LOCAL_STORAGE_DIR_ENV_VAR} set to persistent storage on Lambda."
+            )
+        # Holdings, fundamentals and dividends come from the last full export; only prices are fetched
+        graph.add_stage(
+            PipelineStage.ENRICHED_PORTFOLIO, refresh_portfolio_prices, (PipelineStage.LOGIN,)
+        )
+        graph.add_stage(
+            PipelineStage.CRYPTO_HOLDINGS, refresh_crypto_prices, (PipelineStage.LOGIN,)
+        )
+    else:
+        graph.add_stage(PipelineStage.HOLDINGS, get_holdings, (PipelineStage.LOGIN,))
+        graph.add_stage(
+            PipelineStage.DIVIDEND_HISTORY,
+            lambda _login: get_dividend_history(),
+            (PipelineStage.LOGIN,),
+        )
+        graph.add_stage(
+            PipelineStage.DIVIDEND_TOTALS,
+            lambda _dividend_history: get_last_year_and_ytd_dividend(),
+            (PipelineStage.DIVIDEND_HISTORY,),
+        )
+        graph.add_stage(
+            PipelineStage.ENRICHED_PORTFOLIO,
+            enrich_portfolio,
+            (
+                PipelineStage.HOLDINGS,
+                PipelineStage.DIVIDEND_HISTORY,
+                PipelineStage.DIVIDEND_TOTALS,
+            ),
+        )
+        graph.add_stage(
+            PipelineStage.CRYPTO_HOLDINGS,
+            lambda _login: get_crypto_portfolio_as_df(is_live),
+            (PipelineStage.LOGIN,),
+        )
+        if cache_for_prices_only:
+            graph.add_stage(
+                PipelineStage.CACHE_PORTFOLIO,
+                cache_portfolio,
+                (PipelineStage.ENRICHED_PORTFOLIO, PipelineStage.CRYPTO_HOLDINGS),
+            )
+    graph.add_stage(
+        PipelineStage.STOCK_PORTFOLIO, prepare_stocks, (PipelineStage.ENRICHED_PORTFOLIO,)
+    )
+    graph.add_stage(
+        PipelineStage.ETF_PORTFOLIO, prepare_etfs, (PipelineStage.ENRICHED_PORTFOLIO,)
+    )
+    graph.add_stage(
+        PipelineStage.CRYPTO_PORTFOLIO,
+        prepare_crypto_portfolio_for_export,
+        (PipelineStage.CRYPTO_HOLDINGS,),
+    )
+    graph.add_stage(
+        PipelineStage.WRITE_OUTPUTS,
+        write_outputs,
+        (
+            PipelineStage.STOCK_PORTFOLIO,
+            PipelineStage.ETF_PORTFOLIO,
+            PipelineStage.CRYPTO_PORTFOLIO,
+            PipelineStage.PREPARE_OUTPUTS,
+        ),
+    )
+    if archive_snapshots:
+        graph.add_stage(
+            PipelineStage.ARCHIVE_SNAPSHOTS,
+            archive_snapshots_locally,
+            (
+                PipelineStage.STOCK_PORTFOLIO,
+                PipelineStage.ETF_PORTFOLIO,
+                PipelineStage.CRYPTO_PORTFOLIO,
+            ),
+        )
+    return graph
+
+
+def export_rh_portfolio_to_sheets(
+    is_live,
+    write_mock,
+    max_workers=DEFAULT_MAX_STAGE_WORKERS,
+    incremental=False,
+    diversity_scope=DiversityScope.TAB,
+    archive_snapshots=True,
+    spreadsheet_name=DEFAULT_SPREADSHEET_NAME,
+    sinks=DEFAULT_OUTPUT_SINKS,
+    prices_only=False,
+    cache_for_prices_only=False,
+) -> None:
     """
     Driver function to get user's portfolio from Robinhood and write it to a Google sheet.
     :param is_live: Boolean to control whether portfolio data is fetched from Robinhood or mock file
     :param write_mock: Boolean to control whether portfolio data is written to mock file
+    :param max_workers: Maximum number of pipeline stages running concurrently
+    :param incremental: Boolean to control whether only changed cells are written to the sheet
+    :param diversity_scope: Whether diversity is relative to each tab or to the whole portfolio
+    :param archive_snapshots: Boolean to control whether the exported portfolios are appended to the local archive
+    :param spreadsheet_name: Name of the spreadsheet the portfolios are written to
+    :param sinks: Output sinks the portfolios are written to, e.g. Sheets and Parquet
+    :param prices_only: Boolean to control whether only the prices of the last full export's holdings are refreshed
+    :param cache_for_prices_only: Boolean to control whether a full export caches the portfolio for later
+                                  prices-only exports
     :return:
     """
-    print("Getting RH portfolio as dataframe")
-    portfolio_df = get_rh_portfolio_as_df(is_live, write_mock)
-
-    print("Replace NaN with 0 across DF")
-    portfolio_df = portfolio_df.fillna(0)
-
-    print("Filter data based on portfolio type - stocks, ETFs")
-    stock_portfolio_df = portfolio_df[
-        portfolio_df[RobinhoodApiData.TYPE.value.name]
-        != RobinhoodProductTypes.ETP.value
-    ]
-    etf_portfolio_df = portfolio_df[
-        portfolio_df[RobinhoodApiData.TYPE.value.name]
-        == RobinhoodProductTypes.ETP.value
-    ]
-
-    print("Writing stock portfolio to sheets")
-    write_required_columns_to_sheets(
-        stock_portfolio_df, worksheet_name=RH_STOCK_DUMP_SHEET_NAME
-    )
+    account = get_current_account()
+    pipeline_name = PRICES_ONLY_PIPELINE_NAME if prices_only else METRICS_PIPELINE_NAME
+    with collect_run_metrics(pipeline_name, account_name=account.name if account else None), use_run_cache():
+        build_export_graph(
+            is_live,
+            write_mock,
+            max_workers=max_workers,
+            incremental=incremental,
+            diversity_scope=diversity_scope,
+            archive_snapshots=archive_snapshots,
+            spreadsheet_name=spreadsheet_name,
+            sinks=sinks,
+            prices_only=prices_only,
+            cache_for_prices_only=cache_for_prices_only,
+        ).run()
 
-    print("Writing ETF portfolio to sheets")
-    write_required_columns_to_sheets(
-        etf_portfolio_df, worksheet_name=RH_ETF_DUMP_SHEET_NAME
-    )
 
-    crypto_portfolio_df = get_crypto_portfolio_as_df(is_live)
-    print("Writing Crypto portfolio to sheets")
-    write_to_sheets(crypto_portfolio_df, worksheet_name=RH_CRYPTO_DUMP_SHEET_NAME)
+def export_accounts_to_sheets(
+    accounts: List[RobinhoodAccount],
+    max_concurrent_accounts=DEFAULT_MAX_CONCURRENT_ACCOUNTS,
+    **export_options,
+) -> None:
+    """
+    Export several Robinhood accounts, each to its own spreadsheet. Every account gets its own
+    Robinhood session, local storage and metrics, and a failing account doesn't stop the others.
+    :param accounts: Accounts to export, e.g. from load_accounts
+    :param max_concurrent_accounts: Maximum number of accounts exported at the same time, to stay
+                                    clear of Robinhood's rate limits
+    :param export_options: Keyword arguments passed to export_rh_portfolio_to_sheets
+    :return:
+    """
+
+    def export_account(account: RobinhoodAccount) -> None:
+        with use_account(account):
+            print(f"Exporting account {account.name} to {account.spreadsheet_name}")
+            export_rh_portfolio_to_sheets(
+                True, False, spreadsheet_name=account.spreadsheet_name, **export_options
+            )
+
+    with ThreadPoolExecutor(max_workers=max_concurrent_accounts) as executor:
+        futures = {
+            account.name: executor.submit(copy_context().run, export_account, account)
+            for account in accounts
+        }
+    failures = {name: future.exception() for name, future in futures.items() if future.exception()}
+    for name, error in failures.items():
+        print(f"Exporting account {name} failed: {error!r}")
+    if failures:
+        raise RuntimeError(f"Failed to export account(s): {', '.join(failures)}")
+
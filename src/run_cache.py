@@ -0,0 +1,51 @@
+"""
+Caches that only live for one export run. Anything derived from the account's data is cached here rather than
+per process, so a warm Lambda invocation syncs and rebuilds it instead of reusing the previous run's.
+"""
+
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Context variable rather than a global, so accounts exported concurrently each get their own cache.
+# Stages run in copies of the run's context, so they all share the run's dictionary.
+_run_cache: ContextVar[Optional[Dict[Any, Any]]] = ContextVar("run_cache", default=None)
+_run_cache_lock = threading.Lock()
+
+
+@contextmanager
+def use_run_cache() -> Iterator[None]:
+    """
+    Cache the results of run-cached functions called inside the block, and drop them when it exits.
+    """
+    token = _run_cache.set({})
+    try:
+        yield
+    finally:
+        _run_cache.reset(token)
+
+
+def run_cached(func: Callable[..., T]) -> Callable[..., T]:
+    """
+    Decorator caching a function's result, keyed by its arguments, for the rest of the current run.
+    Outside of a run the function isn't cached.
+    """
+
+    @wraps(func)
+    def wrapper(*args: Any) -> T:
+        cache = _run_cache.get()
+        if cache is None:
+            return func(*args)
+        key = (func.__qualname__, args)
+        with _run_cache_lock:
+            if key in cache:
+                return cache[key]
+        result = func(*args)
+        with _run_cache_lock:
+            return cache.setdefault(key, result)
+
+    return wrapper
@@ -0,0 +1,117 @@
+"""
+Minimal dependency-graph executor used to run the export pipeline's stages concurrently.
+"""
+
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from contextvars import copy_context
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Tuple
+
+from src.constants.pipeline import DEFAULT_MAX_STAGE_WORKERS
+from src.metrics import record_rows, track_stage
+
+
+@dataclass(frozen=True)
+class Stage:
+    """
+    A unit of work in the pipeline.
+    :param name: Unique stage name
+    :param func: Callable invoked with the results of its dependencies, positionally and in declared order
+    :param dependencies: Names of the stages that must finish before this one starts
+    """
+
+    name: str
+    func: Callable[..., Any]
+    dependencies: Tuple[str, ...] = ()
+
+
+class StageGraph:
+    """
+    Runs a set of stages on a bounded thread pool, starting each stage as soon as all of its dependencies are done.
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_MAX_STAGE_WORKERS):
+        self.max_workers = max_workers
+        self.stages: Dict[str, Stage] = {}
+
+    def add_stage(
+        self, name: str, func: Callable[..., Any], dependencies: Tuple[str, ...] = ()
+    ) -> None:
+        if name in self.stages:
+            raise ValueError(f"Stage '{name}' is already defined")
+        self.stages[name] = Stage(name=name, func=func, dependencies=tuple(dependencies))
+
+    def validate(self) -> None:
+        """
+        Check that every dependency exists and that the graph has no cycles.
+        """
+        for stage in self.stages.values():
+            missing = [dep for dep in stage.dependencies if dep not in self.stages]
+            if missing:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown stages: {missing}")
+
+        visited, in_progress = set(), set()
+
+        def visit(name: str, path: List[str]) -> None:
+            if name in visited:
+                return
+            if name in in_progress:
+                raise ValueError(f"Cycle detected in stage graph: {' -> '.join(path + [name])}")
+            in_progress.add(name)
+            for dep in self.stages[name].dependencies:
+                visit(dep, path + [name])
+            in_progress.remove(name)
+            visited.add(name)
+
+        for name in self.stages:
+            visit(name, [])
+
+    @staticmethod
+    def _run_stage(stage: Stage, args: List[Any]) -> Any:
+        """
+        Run one stage inside its metrics scope. Stages returning a table also report its row count.
+        """
+        with track_stage(str(stage.name)):
+            result = stage.func(*args)
+            shape = getattr(result, "shape", None)
+            if shape:
+                record_rows(shape[0])
+        return result
+
+    def run(self) -> Dict[str, Any]:
+        """
+        Execute all stages and return a dictionary mapping stage name to its result.
+        The first stage failure cancels everything not yet started and is re-raised.
+        """
+        self.validate()
+        results: Dict[str, Any] = {}
+        remaining = dict(self.stages)
+        running: Dict[Future, str] = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+
+            def submit_ready_stages() -> None:
+                for name, stage in list(remaining.items()):
+                    if all(dep in results for dep in stage.dependencies):
+                        args = [results[dep] for dep in stage.dependencies]
+                        # Stages see the caller's context, e.g. the active account and metrics run
+                        running[
+                            executor.submit(copy_context().run, self._run_stage, stage, args)
+                        ] = name
+                        del remaining[name]
+
+            submit_ready_stages()
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    error = future.exception()
+                    if error is not None:
+                        for pending in running:
+                            pending.cancel()
+                        print(f"Stage '{name}' failed: {error}")
+                        raise error
+                    results[name] = future.result()
+                submit_ready_stages()
+
+        return results